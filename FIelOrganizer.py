@@ -1,21 +1,19 @@
 import sys
 import os
-import json
-import re
 import subprocess
 import requests
 import shutil
-import glob
+import time
+from itertools import groupby
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton, QFileDialog,
     QListWidget, QLabel, QTextEdit, QMessageBox, QHBoxLayout, QComboBox, QLineEdit,
     QSplitter, QTreeView, QFileSystemModel, QMenu, QAction, QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView, QCheckBox, QDialog, QProgressBar,
-    QMainWindow, QDockWidget, QInputDialog, QGroupBox, QSpinBox
+    QMainWindow, QDockWidget, QInputDialog, QGroupBox, QSpinBox, QListWidgetItem
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QIcon, QPalette, QColor
 from langchain_core.prompts import PromptTemplate
-from langchain_ollama.llms import OllamaLLM
 
 # Import secure storage
 try:
@@ -25,6 +23,24 @@ except ImportError:
     SECURE_STORAGE_AVAILABLE = False
     print("Warning: cryptography package not available. API keys will not be encrypted.")
 
+from scan_engine import ScanProgress, ScanCountCache
+from scan_index import ScanIndex, KIND_FILE
+from scan_watcher import FolderWatcher
+from watch_sync import ChangeBatch, apply_changes
+from structure_cache import StructureCache, render_tree, estimate_tokens
+from sequence_engine import group_names, SequenceManifest, revalidate_manifests
+from file_index import FileIndex, resolve_name
+from classification_cache import ClassificationCache
+from rule_engine import compile_rules
+from batch_planner import BatchPlanner, request_tokens
+from llm_stream import stream_classification, parse_classification, AnswerError
+from llm_providers import OpenRouterLLM, LMStudioLLM, MistralLLM, OllamaAdapter
+from endpoint_pool import EndpointPool, split_urls, pooled
+from retry_policy import RetryPolicy, FailureLedger, is_answer_error
+import http_pool
+import rate_limiter
+from model_warmup import ModelWarmer, timing_summary
+
 # Allowed file extensions based on the prompt template
 ALLOWED_EXTENSIONS_VFX = {'.exr', '.dpx', '.tif', '.png', '.mov', '.mxf', '.avi', '.psd', '.ai', '.jpg', '.mp4', '.docx', '.pdf', '.xlsx', '.pptx', '.wav', '.mp3', '.aiff', '.nk', '.aep', '.prproj', '.drp', '.xml', '.edl', '.json', '.txt', '.aaf',
     '.fbx', '.obj', '.max', '.c4d', '.abc', '.blend', '.ma', '.mb', '.3ds', '.stl', '.ply', '.gltf', '.glb', '.usd', '.usda', '.usdc', '.usdz', '.xsi', '.lwo', '.lws', '.bgeo', '.bgeo.sc', '.vdb', '.prt', '.rib', '.ass', '.ifc', '.dae', '.igs', '.iges', '.step', '.stp', '.x3d', '.wrl', '.vrml', '.dxf', '.dwg', '.skp', '.sldprt', '.sldasm', '.objf', '.fbx7', '.3mf', '.amf', '.c4d', '.max', '.abc'}
@@ -58,98 +74,6 @@ MISTRAL_MODELS = [
     "mistral-large-latest"
 ]
 
-class OpenRouterLLM:
-    """Simple OpenRouter API wrapper for compatibility with Ollama interface"""
-    
-    def __init__(self, model, api_key):
-        self.model = model
-        self.api_key = api_key
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
-    
-    def invoke(self, prompt):
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://github.com/your-repo",  # Optional
-            "X-Title": "AI File Organizer"  # Optional
-        }
-        
-        data = {
-            "model": self.model,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.1,
-            "max_tokens": 4000
-        }
-        
-        try:
-            response = requests.post(self.base_url, headers=headers, json=data, timeout=60)
-            response.raise_for_status()
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"OpenRouter API Error: {e}")
-        except KeyError as e:
-            raise Exception(f"Unexpected response format from OpenRouter: {e}")
-
-# LM Studio API wrapper
-class LMStudioLLM:
-    """LM Studio API wrapper for compatibility with Ollama/OpenRouter interface"""
-
-    def __init__(self, model, base_url="http://localhost:1234/v1"):
-        self.model = model
-        self.base_url = base_url.rstrip('/') + '/chat/completions'
-
-    def invoke(self, prompt):
-        headers = {
-            "Content-Type": "application/json"
-        }
-
-        data = {
-            "model": self.model,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.1,
-            "max_tokens": 4000
-        }
-
-        try:
-            response = requests.post(self.base_url, headers=headers, json=data, timeout=60)
-            response.raise_for_status()
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"LM Studio API Error: {e}")
-        except KeyError as e:
-            raise Exception(f"Unexpected response format from LM Studio: {e}")
-
-# Mistral models for dropdown selection
-class MistralLLM:
-    """Simple Mistral API wrapper for compatibility with Ollama/OpenRouter interface"""
-    def __init__(self, model, api_key):
-        self.model = model
-        self.api_key = api_key
-        self.base_url = "https://api.mistral.ai/v1/chat/completions"
-
-    def invoke(self, prompt):
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": self.model,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
-        }
-        response = requests.post(self.base_url, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
-        # Mistral returns choices[0]['message']['content']
-        return result['choices'][0]['message']['content']
-
 # Load prompt templates from Markdown files
 
 def load_prompt_from_md(md_path):
@@ -165,11 +89,24 @@ PROMPT_TEMPLATE_SPHERE = load_prompt_from_md(os.path.join(os.path.dirname(__file
 # Refactor FileClassifierApp to inherit QMainWindow for dockable panels
 class FileClassifierApp(QMainWindow):
     BATCH_SIZE = 15
+    REVALIDATE_SEQUENCES = True  # re-list sequence folders once before moving/copying
+    # Coalesced watcher batches as ChangeBatches, emitted from the watcher thread
+    fs_changes = pyqtSignal(object)
+    # Warm-up results, emitted from the warm-up threads
+    model_warmed = pyqtSignal(str)
 
     def __init__(self):
         super().__init__()  # Ensure the QMainWindow base class is initialized first
         self.setGeometry(200, 200, 1000, 600)
         self.setWindowTitle("AI File Organizer")
+        # Rendered project trees, reused across batches until the destination changes
+        self.structure_cache = StructureCache(self.get_folder_structure)
+        self.file_index = FileIndex()
+        # Opened on the first classification that uses it
+        self.classification_cache = None
+        # Backoff for failed requests, and the files the last run could not classify (Retry Failed)
+        self.retry_policy = RetryPolicy()
+        self.failed_files = []
 
         # --- Apply dark orange theme and custom styles globally ---
         dark_palette = QPalette()
@@ -370,9 +307,13 @@ class FileClassifierApp(QMainWindow):
         # Ollama specific settings
         self.ollama_settings = QWidget()
         ollama_layout = QVBoxLayout()
-        ollama_layout.addWidget(QLabel("Ollama Server URL:"))
+        ollama_layout.addWidget(QLabel("Ollama Server URL(s):"))
         self.ollama_url_input = QLineEdit("http://localhost:11434")
+        self.ollama_url_input.setToolTip("Several servers, separated by commas, share the batches")
         ollama_layout.addWidget(self.ollama_url_input)
+        self.unload_on_exit_checkbox = QCheckBox("Unload Model on Exit")
+        self.unload_on_exit_checkbox.setToolTip("Free the server's memory when closing; leave off for a shared Ollama server")
+        ollama_layout.addWidget(self.unload_on_exit_checkbox)
         self.ollama_settings.setLayout(ollama_layout)
         ai_setup_layout.addWidget(self.ollama_settings)
           # OpenRouter specific settings
@@ -426,8 +367,9 @@ class FileClassifierApp(QMainWindow):
         # LM Studio specific settings
         self.lmstudio_settings = QWidget()
         lmstudio_layout = QVBoxLayout()
-        lmstudio_layout.addWidget(QLabel("LM Studio Server URL:"))
+        lmstudio_layout.addWidget(QLabel("LM Studio Server URL(s):"))
         self.lmstudio_url_input = QLineEdit("http://localhost:1234/v1")
+        self.lmstudio_url_input.setToolTip("Several servers, separated by commas, share the batches")
         lmstudio_layout.addWidget(self.lmstudio_url_input)
         self.lmstudio_settings.setLayout(lmstudio_layout)
         self.lmstudio_settings.setVisible(False)  # Initially hidden
@@ -440,15 +382,26 @@ class FileClassifierApp(QMainWindow):
         
         # Add batch size control
         batch_row = QHBoxLayout()
-        batch_row.addWidget(QLabel("Batch Size:"))
+        batch_row.addWidget(QLabel("Max Batch Size:"))
         self.batch_size_spin = QSpinBox()
         self.batch_size_spin.setMinimum(1)
-        self.batch_size_spin.setMaximum(100)
-        self.batch_size_spin.setValue(15)
-        self.batch_size_spin.setToolTip("Number of files to send to the AI per batch")
+        self.batch_size_spin.setMaximum(500)
+        self.batch_size_spin.setValue(100)
+        self.batch_size_spin.setToolTip("Most files sent to the AI per batch; batches are packed to fit the model's token budget")
         batch_row.addWidget(self.batch_size_spin)
         ai_setup_layout.addLayout(batch_row)
 
+        # Token budget used to pack batches
+        context_row = QHBoxLayout()
+        context_row.addWidget(QLabel("Context Tokens:"))
+        self.context_tokens_spin = QSpinBox()
+        self.context_tokens_spin.setRange(0, 1000000)
+        self.context_tokens_spin.setSingleStep(1024)
+        self.context_tokens_spin.setSpecialValueText("Auto")
+        self.context_tokens_spin.setToolTip("Context window of the model; Auto uses the provider's usual limit")
+        context_row.addWidget(self.context_tokens_spin)
+        ai_setup_layout.addLayout(context_row)
+
         # Add folder structure depth control
         depth_row = QHBoxLayout()
         depth_row.addWidget(QLabel("Folder Structure Depth:"))
@@ -459,6 +412,20 @@ class FileClassifierApp(QMainWindow):
         self.folder_depth_spin.setToolTip("How many levels deep to show the folder structure to the AI")
         depth_row.addWidget(self.folder_depth_spin)
         ai_setup_layout.addLayout(depth_row)
+
+        # Reuse earlier answers for the same file, template, structure and model
+        self.use_cache_checkbox = QCheckBox("Use Classification Cache")
+        self.use_cache_checkbox.setChecked(True)
+        self.use_cache_checkbox.setToolTip("Files classified before with the same structure, project folders and model skip the AI")
+        ai_setup_layout.addWidget(self.use_cache_checkbox)
+        self.use_rules_checkbox = QCheckBox("Use Local Rules")
+        self.use_rules_checkbox.setChecked(True)
+        self.use_rules_checkbox.setToolTip("Camera files and file types the structure's rules decide are classified without the AI")
+        ai_setup_layout.addWidget(self.use_rules_checkbox)
+        self.stream_checkbox = QCheckBox("Stream Responses")
+        self.stream_checkbox.setChecked(True)
+        self.stream_checkbox.setToolTip("Show each classified file as soon as the AI has written it, instead of after the whole answer")
+        ai_setup_layout.addWidget(self.stream_checkbox)
         
         ai_setup_group.setLayout(ai_setup_layout)
         self.right_layout.addWidget(ai_setup_group)
@@ -508,6 +475,14 @@ class FileClassifierApp(QMainWindow):
         self.add_folder_btn.clicked.connect(self.add_folder)
         btn_layout.addWidget(self.add_folder_btn)
 
+        # Watch added folders and apply new/deleted files incrementally
+        self.watch_folders_checkbox = QCheckBox("Watch Folders")
+        self.watch_folders_checkbox.setToolTip("Keep added folders in sync as files are created, deleted or renamed")
+        self.watch_folders_checkbox.toggled.connect(self.on_watch_toggled)
+        btn_layout.addWidget(self.watch_folders_checkbox)
+        self.folder_watcher = None
+        self.fs_changes.connect(self._apply_fs_changes)
+
         self.clear_btn = QPushButton(icon_clear, "Clear List")
         self.clear_btn.clicked.connect(self.clear_list)
         btn_layout.addWidget(self.clear_btn)
@@ -521,6 +496,12 @@ class FileClassifierApp(QMainWindow):
         self.classify_btn.clicked.connect(self.classify_files)
         btn_layout.addWidget(self.classify_btn)
 
+        self.retry_failed_btn = QPushButton("Retry Failed")
+        self.retry_failed_btn.setToolTip("Classify again only the files the last run could not classify")
+        self.retry_failed_btn.clicked.connect(self.retry_failed_files)
+        self.retry_failed_btn.setEnabled(False)
+        btn_layout.addWidget(self.retry_failed_btn)
+
         self.right_layout.addLayout(btn_layout)
         # Progress bar for folder scanning/import
         self.progress_bar = QProgressBar()
@@ -616,6 +597,11 @@ class FileClassifierApp(QMainWindow):
         # --- Output/log panel ---
         self.output_box = QTextEdit()
         self.output_box.setReadOnly(True)
+
+        # Load the picked local model ahead of the first batch, and keep it loaded for the session
+        self.model_warmer = ModelWarmer(self.model_warmed.emit)
+        self.model_warmed.connect(self.output_box.append)
+        self.model_dropdown.currentTextChanged.connect(self.on_model_changed)
         output_dock = QDockWidget("Log / Output", self)
         output_dock.setObjectName("OutputDock")
         output_dock.setWidget(self.output_box)
@@ -771,11 +757,12 @@ class FileClassifierApp(QMainWindow):
                 self.output_box.append(f"Failed to load Mistral models: {e}")
         elif provider == "LM Studio":
             try:
-                lmstudio_url = self.lmstudio_url_input.text().strip()
-                if not lmstudio_url:
+                lmstudio_urls = split_urls(self.lmstudio_url_input.text())
+                if not lmstudio_urls:
                     raise ValueError("Please enter a valid LM Studio server URL")
+                lmstudio_url = lmstudio_urls[0]
 
-                # Fetch models from LM Studio API
+                # Fetch models from LM Studio API (the first server; all of them should serve the same models)
                 models_url = lmstudio_url.rstrip('/') + '/models'
                 response = requests.get(models_url, timeout=5)
                 response.raise_for_status()
@@ -799,6 +786,16 @@ class FileClassifierApp(QMainWindow):
                 self.model_dropdown.addItem("Error fetching models")
                 self.output_box.append(f"Failed to fetch LM Studio models: {e}")
 
+    def on_model_changed(self, model_name):
+        """Start loading a local model as soon as it is picked, so the first batch does not wait for it"""
+        if self.provider_dropdown.currentText() not in ("Ollama", "LM Studio"):
+            return
+        try:
+            llm = self.get_llm_instance()
+        except ValueError:
+            return  # no valid model or server URL yet
+        self.model_warmer.warm(llm)
+
     def get_llm_instance(self):
         """Get the appropriate LLM instance based on selected provider"""
         provider = self.provider_dropdown.currentText()
@@ -806,10 +803,11 @@ class FileClassifierApp(QMainWindow):
         if not model_name or model_name.startswith("Error") or model_name == "No models found":
             raise ValueError("No valid model selected")
         if provider == "Ollama":
-            ollama_url = self.ollama_url_input.text().strip()
-            if not ollama_url:
+            ollama_urls = split_urls(self.ollama_url_input.text())
+            if not ollama_urls:
                 raise ValueError("Please enter a valid Ollama server URL")
-            return OllamaLLM(model=model_name, base_url=ollama_url)
+            # format="json" makes Ollama constrain the answer to a JSON object; several servers share the batches
+            return pooled([OllamaAdapter(model=model_name, base_url=url) for url in ollama_urls])
         elif provider == "OpenRouter":
             api_key = self.openrouter_api_key_input.text().strip()
             if not api_key:
@@ -825,18 +823,18 @@ class FileClassifierApp(QMainWindow):
             self._mistral_password = api_key
             return MistralLLM(model=model_name, api_key=api_key)
         elif provider == "LM Studio":
-            lmstudio_url = self.lmstudio_url_input.text().strip()
-            if not lmstudio_url:
+            lmstudio_urls = split_urls(self.lmstudio_url_input.text())
+            if not lmstudio_urls:
                 raise ValueError("Please enter a valid LM Studio server URL")
-            return LMStudioLLM(model=model_name, base_url=lmstudio_url)
+            return pooled([LMStudioLLM(model=model_name, base_url=url) for url in lmstudio_urls])
         else:
             raise ValueError(f"Unknown provider: {provider}")
 
     def add_files(self):
         files, _ = QFileDialog.getOpenFileNames(self, "Select Files")
         for f in files:
-            if f not in self.get_all_files():
-                self.file_list_widget.addItem(f)
+            if f not in self.file_index:
+                self._add_list_item(f)
 
     def add_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Folder")
@@ -844,104 +842,138 @@ class FileClassifierApp(QMainWindow):
             self._add_folder_recursive(folder)
 
     def _add_folder_recursive(self, folder):
-        import re
-        from collections import defaultdict, deque
-        seq_dict = defaultdict(list)
-        visited = set()
-        queue = deque([folder])
-        total_dirs = 0
-        # First pass: count total dirs for progress
-        self.set_info("Counting dirs...")
-        temp_queue = deque([folder])
-        while temp_queue:
-            current = temp_queue.popleft()
-            if current in visited:
-                continue
-            visited.add(current)
-            try:
-                entries = [os.path.join(current, f) for f in os.listdir(current)]
-            except Exception:
-                continue
-            for entry in entries:
-                if os.path.isdir(entry):
-                    temp_queue.append(entry)
-            total_dirs += 1
-        # Reset for actual scan
-        visited.clear()
-        queue = deque([folder])
-        processed_dirs = 0
+        # Incremental: the scan index only re-lists directories whose mtime
+        # changed since this folder was last scanned. Progress is estimated from
+        # discovered vs completed dirs, seeded with the last scan's count.
+        scan_counts = ScanCountCache()
+        progress = ScanProgress(cached=scan_counts.get([folder]))
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         self.set_info("Scanning folder(s)...")
-        while queue:
-            current = queue.popleft()
-            if current in visited:
-                continue
-            visited.add(current)
-            try:
-                entries = [os.path.join(current, f) for f in os.listdir(current)]
-            except Exception:
-                continue
-            for entry in entries:
-                if os.path.isdir(entry):
-                    queue.append(entry)
-                elif os.path.isfile(entry):
-                    fname = os.path.basename(entry)
-                    match = re.match(r"(.+?)([._-])?(\d{3,4})(\.[^.]+)$", fname)
-                    if match:
-                        prefix, sep, frame, ext = match.groups()
-                        key = f"{prefix}{sep if sep else ''}####{ext}"
-                        seq_dict[key].append(fname)
+        def on_dir(current, dir_progress):
+            self.progress_bar.setValue(int(dir_progress.fraction() * 100))
+            QApplication.processEvents()
+            self.set_info(f"Scanning: {current}")
+        scan_index = ScanIndex()
+        try:
+            scan_index.update([folder], progress=progress, progress_callback=on_dir)
+            # Sequences are grouped per directory; the index yields entries directory by directory
+            existing = set(self.get_all_files())
+            entries = scan_index.iter_entries([folder])
+            for dir_path, rows in groupby(entries, key=lambda row: row[0]):
+                names = [row[1] for row in rows if row[2] == KIND_FILE]
+                singles, sequences = group_names(names)
+                # Add only one representative per sequence, and all non-sequence files;
+                # sequences carry their frame manifest so moves never re-glob
+                paths = [os.path.join(dir_path, fname) for fname in singles]
+                reps = [(self._list_entry(path), path, None) for path in paths]
+                reps.extend((self._sequence_entry(dir_path, seq.key), os.path.join(dir_path, seq.key), SequenceManifest(dir_path, seq))
+                            for seq in sequences)
+                for rep, path, manifest in reps:
+                    if rep not in existing:
+                        existing.add(rep)
+                        self._add_list_item(rep, path, manifest)
                     else:
-                        seq_dict[fname].append(fname)
-            processed_dirs += 1
-            if total_dirs > 0:
-                progress = int((processed_dirs / total_dirs) * 100)
-                self.progress_bar.setValue(progress)
-                QApplication.processEvents()
-                self.set_info(f"Scanning: {current}")
-        # Add only one representative per sequence, and all non-sequence files
-        for key, files in seq_dict.items():
-            if len(files) > 1 and '####' in key:
-                rep = key
-            else:
-                rep = files[0]
-            if rep not in self.get_all_files():
-                self.file_list_widget.addItem(rep)
+                        # Same row text from another folder: keep the path so lookups see the duplicate
+                        self.file_index.add(path, manifest)
+        finally:
+            scan_index.close()
+        scan_counts.set([folder], progress.summary())
         self.progress_bar.setVisible(False)
         self.set_info("Folder scan complete.")
+        if self.watch_folders_checkbox.isChecked():
+            self._watch_root(folder)
 
     def clear_list(self):
         self.file_list_widget.clear()
+        self.file_index.clear()
         self.output_box.clear()
 
+    # --- Watch mode ---
+    def _watch_root(self, root):
+        """Watch a folder added to the list so new/deleted files are applied incrementally"""
+        if self.folder_watcher is None:
+            # A batch's disk work (listings, manifests, index refresh) runs on the watcher thread
+            self.folder_watcher = FolderWatcher(lambda changes: self.fs_changes.emit(ChangeBatch.from_changes(changes)),
+                                                debounce=2.0)
+        # Folders created inside a watched root are already covered by its watch
+        if self.folder_watcher.watched_root(root) is None:
+            mode = self.folder_watcher.add_root(root)
+            self.output_box.append(f"Watching {root} ({mode})")
+
+    def on_watch_toggled(self, checked):
+        if not checked and self.folder_watcher is not None:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+
+    def _apply_fs_changes(self, batch):
+        """Apply one watcher ChangeBatch (prepared on the watcher thread) to the selected files list"""
+        if self.folder_watcher is None:
+            return
+
+        def remove_rows(entry):
+            items = self.file_list_widget.findItems(entry, Qt.MatchExactly)
+            for item in items:
+                self.file_list_widget.takeItem(self.file_list_widget.row(item))
+            return len(items)
+
+        added, removed = apply_changes(batch, set(self.get_all_files()), self.file_index, self._list_entry,
+                                       self._sequence_entry, self._add_list_item, remove_rows)
+        if added or removed:
+            self.output_box.append(f"Watcher: +{added} / -{removed} entries in Selected Files")
+
+    def _classification_context(self, project_root):
+        """ClassificationCache context of the prompt classify_files builds for project_root"""
+        if os.path.isdir(project_root):
+            project_structure = self.structure_cache.get(project_root, self.folder_depth_spin.value()).text
+        else:
+            project_structure = "(Project folder does not exist or is not accessible)"
+        template = PROMPT_TEMPLATE_KENT if self.structure_dropdown.currentText() == "KENT" else PROMPT_TEMPLATE_SPHERE
+        return ClassificationCache.context(template, project_structure, self.provider_dropdown.currentText(), self.model_dropdown.currentText())
+
+    def _add_list_item(self, text, path=None, manifest=None):
+        """Add a Selected Files row and index the full path (and sequence manifest) it stands for"""
+        self.file_index.add(path or text, manifest)
+        item = QListWidgetItem(text)
+        if manifest is not None:
+            item.setToolTip(f"{manifest.dir_path}\n{manifest.sequence.label()}")
+        self.file_list_widget.addItem(item)
+
+    def _remove_list_item(self, item):
+        for path in self.file_index.paths(item.text()):
+            self.file_index.discard(path)
+        self.file_list_widget.takeItem(self.file_list_widget.row(item))
+
+    def _revalidate_sequences(self, names):
+        """Refresh the manifests of the given sequence rows with one listing per directory"""
+        if not self.REVALIDATE_SEQUENCES:
+            return
+        manifests = [self.file_index.manifest(name) for name in names if '####' in name]
+        changed = revalidate_manifests([m for m in manifests if m is not None])
+        if changed:
+            self.output_box.append(f"{changed} sequence(s) changed on disk since they were scanned")
+
+    def _list_entry(self, path):
+        """Selected Files entry for a file path (this app lists bare file names)"""
+        return os.path.basename(path)
+
+    def _sequence_entry(self, dir_path, key):
+        return key
+
     def get_all_files(self):
         return [self.file_list_widget.item(i).text() for i in range(self.file_list_widget.count())]
 
-    def get_folder_structure(self, root_path, max_depth=6, prefix=""):
-        """Recursively build a tree-like string of the folder structure up to max_depth, including only folders (no files)."""
-        lines = []
-        def _walk(path, depth, prefix):
-            if depth > max_depth:
-                return
-            try:
-                entries = sorted(os.listdir(path))
-            except Exception:
-                return
-            # Only include directories
-            dirs = [entry for entry in entries if os.path.isdir(os.path.join(path, entry))]
-            for i, entry in enumerate(dirs):
-                full_path = os.path.join(path, entry)
-                is_last = (i == len(dirs) - 1)
-                branch = "└── " if is_last else "├── "
-                lines.append(f"{prefix}{branch}{entry}")
-                extension = "    " if is_last else "│   "
-                _walk(full_path, depth + 1, prefix + extension)
-        _walk(root_path, 1, "")
-        return "\n".join(lines)
-
-    def classify_files(self):
-        files = self.get_all_files()
+    def get_folder_structure(self, root_path, max_depth=6, dir_mtimes=None):
+        """Build a tree-like string of the folder structure up to max_depth, including only folders (no files).
+
+        If dir_mtimes is a dict, the mtime of every listed directory is recorded in it.
+        """
+        return render_tree(root_path, max_depth=max_depth, dir_mtimes=dir_mtimes)
+
+    def classify_files(self, checked=False, files=None):
+        """Classify the files in the list, or only files when given (Retry Failed)"""
+        retrying = files is not None
+        files = files if retrying else self.get_all_files()
         if not files:
             QMessageBox.warning(self, "No files selected", "Please add files or folders first.")
             return
@@ -962,119 +994,207 @@ class FileClassifierApp(QMainWindow):
             QMessageBox.warning(self, "No valid files", "All selected files have invalid extensions.")
             return
 
+        all_results = []  # Collect (src, dst) tuples for all batches
+        if retrying:
+            # The rows of the last run stay; the retried files are added below them
+            all_results = [(self.results_table.item(row, 0).text(), self.results_table.item(row, 1).text())
+                           for row in range(self.results_table.rowCount())]
+        project_root = self.project_folder_input.text().strip()
+        if not project_root.endswith("/"):
+            project_root += "/"
+
+        def add_decided(files, decided):
+            """Add results for files whose folder is already known and return the rest"""
+            for f in files:
+                folder = decided.get(os.path.basename(f))
+                if folder is not None:
+                    full_destination = os.path.normpath(os.path.join(project_root, folder.lstrip('/'), os.path.basename(f))).replace('\\', '/')
+                    for full_src_path in self.file_index.paths(f) or [f]:
+                        all_results.append((full_src_path, full_destination))
+            return [f for f in files if os.path.basename(f) not in decided] if decided else files
+
+        # --- Local rules: camera files and file types the structure template decides ---
+        if self.use_rules_checkbox.isChecked():
+            template = PROMPT_TEMPLATE_KENT if self.structure_dropdown.currentText() == "KENT" else PROMPT_TEMPLATE_SPHERE
+            local, _ = compile_rules(template).classify(os.path.basename(f) for f in valid_files)
+            self.output_box.append(f"Rule engine: {len(local)}/{len(valid_files)} files classified locally ({len(local) / len(valid_files):.0%})")
+            valid_files = add_decided(valid_files, local)
+
+        # --- Classification cache: files answered before skip the AI ---
+        use_cache = self.use_cache_checkbox.isChecked()
+        if use_cache and valid_files:
+            if self.classification_cache is None:
+                self.classification_cache = ClassificationCache()
+            cached = self.classification_cache.get_many(self._classification_context(project_root),
+                                                        [os.path.basename(f) for f in valid_files])
+            self.output_box.append(f"Classification cache: {len(cached)} hits, {len(valid_files) - len(cached)} misses")
+            valid_files = add_decided(valid_files, cached)
+
         # --- Batching logic ---
         batch_size = self.batch_size_spin.value() if hasattr(self, 'batch_size_spin') else self.BATCH_SIZE
-        total_files = len(valid_files)
-        num_batches = (total_files + batch_size - 1) // batch_size
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
-        processed_files = 0
-        self.results_table.setRowCount(0)  # Clear previous results
+        if not retrying:
+            self.results_table.setRowCount(0)  # Clear previous results
 
-        all_results = []  # Collect (src, dst) tuples for all batches
-        for batch_idx in range(num_batches):
-            batch_files = valid_files[batch_idx * batch_size : (batch_idx + 1) * batch_size]
+        # Get actual project structure
+        folder_depth = self.folder_depth_spin.value()
+        if os.path.isdir(project_root):
+            snapshot = self.structure_cache.get(project_root, folder_depth)
+            project_structure = snapshot.text
+            if valid_files:
+                self.output_box.append(f"Project structure: {snapshot.dir_count} folders, ~{snapshot.tokens} tokens")
+        else:
+            project_structure = "(Project folder does not exist or is not accessible)"
+        structure_choice = self.structure_dropdown.currentText()
+        template = PROMPT_TEMPLATE_KENT if structure_choice == "KENT" else PROMPT_TEMPLATE_SPHERE
+        template = template.replace('{project_root}', project_root).replace('{project_structure}', project_structure)
+
+        # Batches are packed by tokens (Max Batch Size only caps the file count) and cut as they
+        # are sent, so a truncated or slow answer shrinks the next ones; names missing from an
+        # answer are queued once more
+        planner = BatchPlanner.for_provider(self.provider_dropdown.currentText(), self.context_tokens_spin.value(),
+                                            max_files=batch_size)
+        fixed_tokens = estimate_tokens(template)
+        queue = list(valid_files)
+        names = [os.path.basename(f) for f in queue]
+        retried = set()
+        position = 0
+        batch_idx = -1
+        stream = self.stream_checkbox.isChecked()
+        # Halves of failed batches (with the names already streamed), sent before the queue goes on
+        splits = []
+        failures = FailureLedger()
+        http_stats = http_pool.stats()
+        # Requests wait here for the provider's rate limit instead of running into its 429s
+        provider, model = self.provider_dropdown.currentText(), self.model_dropdown.currentText()
+        rate_limiter.set_limits(provider, model, self.requests_per_minute_spin.value() or None,
+                                self.tokens_per_minute_spin.value() or None)
+        limiter = rate_limiter.limiter_for(provider, model)
+        try:
+            # The LLM clients hold no per-call state, so one is used for all batches
+            llm = self.get_llm_instance()
+        except Exception as e:
+            self.set_info("")
+            self.progress_bar.setVisible(False)
+            self.output_box.append(f"Error: {e}")
+            return
+
+        def add_classified(fname, folder, batch_index, show=False):
+            """Add the rows for one answered name; show puts them in the table right away"""
+            # Files of this batch first, then all files in the list
+            src_paths = resolve_name(fname, batch_index, self.file_index)
+            if len(src_paths) > 1:
+                self.output_box.append(f"{fname} names {len(src_paths)} files in different folders; each gets its own row")
+            full_path = os.path.join(project_root, folder.lstrip('/'))
+            full_destination = os.path.join(full_path, fname)
+            full_destination = os.path.normpath(full_destination).replace('\\', '/')
+            # If not found, just use the filename (AI may hallucinate extra files)
+            for full_src_path in src_paths or [fname]:
+                self.output_box.append(f"{full_src_path} -> {full_destination}")
+                all_results.append((full_src_path, full_destination))
+                if show:
+                    self._append_result_row(full_src_path, full_destination)
+            QApplication.processEvents()  # Update UI after each row
+
+        while splits or position < len(queue):
+            batch_idx += 1
+            if splits:
+                batch_files, streamed = splits.pop()
+            else:
+                end = planner.next_batch(names, position, fixed_tokens)
+                batch_files = queue[position:end]
+                position = end
+                streamed = set()
             formatted_filenames = "\n".join([os.path.basename(f) for f in batch_files])
-            self.set_info(f"Sending batch {batch_idx+1}/{num_batches} to AI for classification...")
-            self.progress_bar.setValue(int((processed_files / total_files) * 100))
+            self.set_info(f"Sending batch {batch_idx+1} ({len(batch_files)} files) to AI for classification...")
+            self.progress_bar.setValue(int((position / len(queue)) * 100))
             QApplication.processEvents()
 
-            # Get destination project folder from input
-            project_root = self.project_folder_input.text().strip()
-            if not project_root.endswith("/"):
-                project_root += "/"
-            # Get actual project structure
-            folder_depth = self.folder_depth_spin.value()
-            if os.path.isdir(project_root):
-                project_structure = self.get_folder_structure(project_root, max_depth=folder_depth)
-            else:
-                project_structure = "(Project folder does not exist or is not accessible)"
-            structure_choice = self.structure_dropdown.currentText()
-            if structure_choice == "KENT":
-                prompt = PROMPT_TEMPLATE_KENT.replace('{file_list}', formatted_filenames).replace('{project_root}', project_root).replace('{project_structure}', project_structure)
-            else:
-                prompt = PROMPT_TEMPLATE_SPHERE.replace('{file_list}', formatted_filenames).replace('{project_root}', project_root).replace('{project_structure}', project_structure)
+            prompt = template.replace('{file_list}', formatted_filenames)
+            batch_index = FileIndex(path for f in batch_files for path in self.file_index.paths(f))
+            latency = 0.0
+
+            def on_pair(fname, folder):
+                # Rows reach the table while the model is still writing the rest of the answer
+                if fname not in streamed:
+                    streamed.add(fname)
+                    add_classified(fname, folder, batch_index, show=True)
+
+            tokens = request_tokens(prompt, [os.path.basename(f) for f in batch_files])
+
+            def send():
+                # Timed per attempt, so backoff and rate limit waits do not count as a slow answer
+                nonlocal latency
+                limiter.acquire(tokens, should_stop=lambda: QApplication.processEvents())
+                started = time.monotonic()
+                response = stream_classification(llm, prompt, on_pair) if stream else llm.invoke(prompt)
+                latency = time.monotonic() - started
+                return response
+
+            def on_retry(attempt, wait, error):
+                self.output_box.append(f"Batch {batch_idx+1}: {error}; retry {attempt}/{self.retry_policy.max_attempts - 1} in {wait:.1f}s")
 
             try:
-                llm = self.get_llm_instance()
-                self.set_info(f"Waiting for AI response for batch {batch_idx+1}/{num_batches}...")
-                response = llm.invoke(prompt)
-                self.set_info(f"Processing AI response for batch {batch_idx+1}/{num_batches}...")
+                self.set_info(f"Waiting for AI response for batch {batch_idx+1} ({len(batch_files)} files)...")
+                # The stop check is polled during backoff waits; it only keeps the window responsive
+                response = self.retry_policy.call(send, on_retry=on_retry, should_stop=lambda: QApplication.processEvents())
+                self.set_info(f"Processing AI response for batch {batch_idx+1}...")
                 self.output_box.append(f"Raw AI response for batch {batch_idx+1}:\n{response}")
-                match = re.search(r'\{{[\s\S]*\}}', response)
-                classification = None
-                json_str = None
-                if match:
-                    json_str = match.group(0)
-                    self.output_box.append(f"[DEBUG] Extracted JSON string:\n{json_str}")
-                    try:
-                        classification = json.loads(json_str)
-                    except Exception as e:
-                        self.output_box.append(f"[DEBUG] Exception in json.loads (regex-extracted): {e}\nJSON string was:\n{json_str}")
-                else:
-                    self.output_box.append(f"[DEBUG] Regex failed to match JSON. Attempting to extract JSON code block.")
-                    cleaned_response = response.strip()
-                    json_block = None
-                    lines = cleaned_response.splitlines()
-                    start_idx = None
-                    end_idx = None
-                    # Find code block with ```json or ```
-                    for i, line in enumerate(lines):
-                        if line.strip().startswith('```json') or line.strip() == '```':
-                            start_idx = i
-                            break
-                    if start_idx is not None:
-                        # Find the next ``` after start_idx
-                        for j in range(start_idx + 1, len(lines)):
-                            if lines[j].strip() == '```':
-                                end_idx = j
-                                break
-                        if end_idx is not None:
-                            json_block = '\n'.join(lines[start_idx + 1:end_idx]).strip()
-                    # Fallback: try to extract from first { to last }
-                    if not json_block:
-                        json_start = cleaned_response.find('{')
-                        json_end = cleaned_response.rfind('}')
-                        if json_start != -1 and json_end != -1 and json_end > json_start:
-                            json_block = cleaned_response[json_start:json_end+1]
-                    if json_block:
-                        try:
-                            classification = json.loads(json_block)
-                            json_str = json_block
-                            self.output_box.append(f"[DEBUG] Successfully parsed extracted JSON block.")
-                        except Exception as e:
-                            self.output_box.append(f"[DEBUG] Exception in json.loads (extracted block): {e}\nExtracted block was:\n{json_block}")
-                    else:
-                        self.output_box.append(f"[DEBUG] Could not find a JSON block in the response.")
-                if classification and isinstance(classification, dict):
-                    for fname, folder in classification.items():
-                        # Try to find the full path for the file in this batch
-                        full_src_path = None
-                        for f in batch_files:
-                            if os.path.basename(f) == fname:
-                                full_src_path = f
-                                break
-                        # If not found in batch, try all files in the list
-                        if not full_src_path:
-                            for f in self.get_all_files():
-                                if os.path.basename(f) == fname:
-                                    full_src_path = f
-                                    break
-                        # If still not found, just use the filename (AI may hallucinate extra files)
-                        if not full_src_path:
-                            full_src_path = fname
-                        full_path = os.path.join(project_root, folder.lstrip('/'))
-                        full_destination = os.path.join(full_path, fname)
-                        full_destination = os.path.normpath(full_destination).replace('\\', '/')
-                        self.output_box.append(f"{full_src_path} -> {full_destination}")
-                        all_results.append((full_src_path, full_destination))
-                        QApplication.processEvents()  # Update UI after each row
-                elif classification is not None:
-                    self.output_box.append(f"[DEBUG] JSON loaded but not a dict. Type: {type(classification)}. Value: {classification}")
+                classification = parse_classification(response)
+                if classification is None:
+                    planner.record(latency, truncated=True)
+                    raise AnswerError("no JSON object in the answer")
+                if use_cache:
+                    # Only names that were asked for; anything else the model invents is not cached
+                    asked = {os.path.basename(f) for f in batch_files}
+                    self.classification_cache.put_many(self._classification_context(project_root),
+                                                       {k: v for k, v in classification.items() if k in asked})
+                for fname, folder in classification.items():
+                    if fname not in streamed:
+                        add_classified(fname, folder, batch_index)
+                # A cut-off answer leaves names out; the planner shrinks the next batches
+                missing = [f for f in batch_files if os.path.basename(f) not in classification]
+                planner.record(latency, truncated=bool(missing))
+                # A name left out again after its second chance is given up on
+                failures.record([f for f in missing if f in retried], "left out of the answer")
+                missing = [f for f in missing if f not in retried]
+                if missing:
+                    self.output_box.append(f"{len(missing)} file(s) missing from the answer to batch {batch_idx+1}; sending them again")
+                    retried.update(missing)
+                    queue.extend(missing)
+                    names.extend(os.path.basename(f) for f in missing)
             except Exception as e:
                 self.set_info("")
+                if len(batch_files) > 1 and is_answer_error(e):
+                    # One bad name should not sink the rest: each half goes on its own (first half next).
+                    # Throttling and server errors would only be sent twice over, so those files are kept instead
+                    self.output_box.append(f"Batch {batch_idx+1} failed ({e}); sending its {len(batch_files)} files in two halves")
+                    half = len(batch_files) // 2
+                    splits.extend([(batch_files[half:], streamed), (batch_files[:half], streamed)])
+                    continue
+                failures.record(batch_files, e)
                 self.output_box.append(f"Error in batch {batch_idx+1}: {e}")
-                continue
+
+        http_summary = http_pool.reuse_summary(http_stats)
+        if http_summary:
+            self.output_box.append(http_summary)
+        if isinstance(llm, EndpointPool):
+            self.output_box.append(llm.summary())
+        model_time = timing_summary(llm)
+        if model_time:
+            self.output_box.append(model_time)
+        rate_summary = limiter.summary()
+        if rate_summary:
+            self.output_box.append(rate_summary)
+        self.failed_files = failures.files()
+        self.retry_failed_btn.setText(f"Retry Failed ({len(self.failed_files)})" if self.failed_files else "Retry Failed")
+        self.retry_failed_btn.setEnabled(bool(self.failed_files))
+        if self.failed_files:
+            self.output_box.append(f"{len(self.failed_files)} file(s) could not be classified; Retry Failed sends only those again")
+        if planner.batches:
+            self.output_box.append(f"Batch planner: {planner.batches} batches, {planner.truncation_rate:.0%} truncated, "
+                                   f"budget scale {planner.scale:.2f}")
 
         # Now populate the table in one go
         self.results_table.setSortingEnabled(False)
@@ -1091,6 +1211,20 @@ class FileClassifierApp(QMainWindow):
         self.progress_bar.setVisible(False)
         self.set_info("Classification complete.")
 
+    def retry_failed_files(self):
+        """Send only the files the last run could not classify"""
+        if self.failed_files:
+            self.classify_files(files=self.failed_files)
+
+    def _append_result_row(self, src, dst):
+        """Add one (src, dst) row to the results table while a batch is still being answered"""
+        self.results_table.setSortingEnabled(False)
+        row = self.results_table.rowCount()
+        self.results_table.insertRow(row)
+        self.results_table.setItem(row, 0, QTableWidgetItem(src))
+        self.results_table.setItem(row, 1, QTableWidgetItem(dst))
+        self.results_table.setCellWidget(row, 2, QCheckBox())
+
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
@@ -1104,8 +1238,8 @@ class FileClassifierApp(QMainWindow):
                 if os.path.isdir(path):
                     self._add_folder_recursive(path)
                 elif os.path.isfile(path):
-                    if path not in self.get_all_files():
-                        self.file_list_widget.addItem(path)
+                    if path not in self.file_index:
+                        self._add_list_item(path)
             event.acceptProposedAction()
         else:
             event.ignore()
@@ -1113,8 +1247,8 @@ class FileClassifierApp(QMainWindow):
     def on_file_browser_double_click(self, index):
         path = self.file_model.filePath(index)
         if os.path.isfile(path):
-            if path not in self.get_all_files():
-                self.file_list_widget.addItem(path)
+            if path not in self.file_index:
+                self._add_list_item(path)
         elif os.path.isdir(path):
             self._add_folder_recursive(path)
 
@@ -1154,8 +1288,8 @@ class FileClassifierApp(QMainWindow):
             if os.path.isdir(path):
                 self._add_folder_recursive(path)
             elif os.path.isfile(path):
-                if path not in self.get_all_files():
-                    self.file_list_widget.addItem(path)
+                if path not in self.file_index:
+                    self._add_list_item(path)
 
     def get_selected_results(self):
         selected = []
@@ -1178,6 +1312,7 @@ class FileClassifierApp(QMainWindow):
         self.progress_bar.setValue(0)
         
         # Build list of all files to move (expanding sequences)
+        self._revalidate_sequences([src for src, _ in selected])
         all_files_to_move = []
         for src, dst in selected:
             src_files = self.expand_sequence_files(src)
@@ -1243,6 +1378,7 @@ class FileClassifierApp(QMainWindow):
         self.progress_bar.setValue(0)
         
         # Build list of all files to copy (expanding sequences)
+        self._revalidate_sequences([src for src, _ in selected])
         all_files_to_copy = []
         for src, dst in selected:
             src_files = self.expand_sequence_files(src)
@@ -1298,24 +1434,24 @@ class FileClassifierApp(QMainWindow):
 
     def find_full_path(self, fname):
         """Find the full path of a file, handling both individual files and sequences"""
-        # First, try exact match for individual files
-        for i in range(self.file_list_widget.count()):
-            item_text = self.file_list_widget.item(i).text()
-            if os.path.basename(item_text) == fname:
-                return item_text
-        
-        # If no exact match, try to handle sequences (files with #### pattern)
-        if '####' in fname:
-            # This is a sequence pattern, find the directory and actual files
-            sequence_base = fname.replace('####', '*')
-            for i in range(self.file_list_widget.count()):
-                item_text = self.file_list_widget.item(i).text()
-                item_dir = os.path.dirname(item_text)
-                # Look for files matching the sequence pattern in the same directory
-                pattern = os.path.join(item_dir, sequence_base)
-                matching_files = glob.glob(pattern)
-                if matching_files:
-                    return matching_files  # Return list of files for sequences
+        # Look the path or bare name up in the Selected Files index
+        paths = self.file_index.paths(fname)
+        if len(paths) > 1:
+            # Files from different folders would land on one destination; never pick one silently
+            self.output_box.append(f"Warning: {fname} is ambiguous, {len(paths)} selected files have that name: {', '.join(paths)}")
+            return None
+        if paths:
+            # Sequences expand from the manifest captured at scan time
+            manifest = self.file_index.manifest(paths[0])
+            if manifest is None:
+                return paths[0]
+            return manifest.paths() if manifest.sequence.count else None
+
+        # A path to a sequence that is not in the list is listed once
+        if '####' in fname and os.path.isabs(fname):
+            manifest = SequenceManifest.for_key(os.path.dirname(fname), os.path.basename(fname))
+            if manifest.sequence.count:
+                return manifest.paths()
         
         # If not found, try current working directory
         if os.path.exists(fname):
@@ -1368,6 +1504,9 @@ class FileClassifierApp(QMainWindow):
             checkbox.setChecked(not checkbox.isChecked())
 
     def closeEvent(self, event):
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+        self.model_warmer.close(unload=self.unload_on_exit_checkbox.isChecked())
         # Save window and dock state
         with open(self.settings_path, 'wb') as f:
             f.write(self.saveState())
@@ -1415,7 +1554,7 @@ class FileClassifierApp(QMainWindow):
                 
                 # Get current project structure
                 if os.path.isdir(project_root):
-                    project_structure = self.get_folder_structure(project_root, max_depth=6)
+                    project_structure = self.structure_cache.get(project_root, 6).text
                 else:
                     project_structure = "(Project folder does not exist or is not accessible)"
                   # Compose prompt_refine with user_msg as feedback and project structure
@@ -1481,7 +1620,7 @@ class FileClassifierApp(QMainWindow):
         
         # Get current project structure
         if os.path.isdir(project_root):
-            project_structure = self.get_folder_structure(project_root, max_depth=6)
+            project_structure = self.structure_cache.get(project_root, 6).text
         else:
             project_structure = "(Project folder does not exist or is not accessible)"
         
@@ -1622,7 +1761,7 @@ class FileClassifierApp(QMainWindow):
         """Remove selected files from the file_list_widget."""
         selected_items = self.file_list_widget.selectedItems()
         for item in selected_items:
-            self.file_list_widget.takeItem(self.file_list_widget.row(item))
+            self._remove_list_item(item)
 
     def set_info(self, msg):
         """Set the info label text."""
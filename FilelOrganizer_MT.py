@@ -3,23 +3,23 @@
 
 import sys
 import os
-import json
-import re
 import subprocess
 import requests
 import shutil
-import glob
+import time
+import threading
+import asyncio
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton, QFileDialog,
     QListWidget, QLabel, QTextEdit, QMessageBox, QHBoxLayout, QComboBox, QLineEdit,
     QSplitter, QTreeView, QFileSystemModel, QMenu, QAction, QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView, QCheckBox, QDialog, QProgressBar,
-    QMainWindow, QDockWidget, QInputDialog, QGroupBox, QSpinBox
+    QMainWindow, QDockWidget, QInputDialog, QGroupBox, QSpinBox, QListWidgetItem
 )
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QObject
 from PyQt5.QtGui import QIcon, QPalette, QColor
 from langchain_core.prompts import PromptTemplate
-from langchain_ollama.llms import OllamaLLM
-from FIelOrganizer import OpenRouterLLM, MistralLLM, LMStudioLLM  # added missing imports for LLM providers
 
 # Import secure storage
 try:
@@ -29,6 +29,24 @@ except ImportError:
     SECURE_STORAGE_AVAILABLE = False
     print("Warning: cryptography package not available. API keys will not be encrypted.")
 
+from scan_engine import ScanProgress, ScanCountCache
+from scan_index import ScanIndex, KIND_FILE
+from scan_watcher import FolderWatcher
+from watch_sync import ChangeBatch, apply_changes
+from structure_cache import StructureCache, render_tree, estimate_tokens
+from sequence_engine import group_names, SequenceManifest, revalidate_manifests
+from file_index import FileIndex, resolve_name
+from classification_cache import ClassificationCache
+from rule_engine import compile_rules
+from batch_planner import BatchPlanner, request_tokens
+from llm_stream import stream_classification, astream_classification, parse_classification, AnswerError
+from llm_providers import OpenRouterLLM, LMStudioLLM, MistralLLM, OllamaAdapter
+from endpoint_pool import EndpointPool, split_urls, pooled
+from retry_policy import RetryPolicy, FailureLedger, is_answer_error, status_code
+import http_pool
+import rate_limiter
+from model_warmup import ModelWarmer, timing_summary
+
 # Allowed file extensions based on the prompt template
 ALLOWED_EXTENSIONS_VFX = {'.exr', '.dpx', '.tif', '.png', '.mov', '.mxf', '.avi', '.psd', '.ai', '.jpg', '.mp4', '.docx', '.pdf', '.xlsx', '.pptx', '.wav', '.mp3', '.aiff', '.nk', '.aep', '.prproj', '.drp', '.xml', '.edl', '.json', '.txt', '.aaf',
     '.fbx', '.obj', '.max', '.c4d', '.abc', '.blend', '.ma', '.mb', '.3ds', '.stl', '.ply', '.gltf', '.glb', '.usd', '.usda', '.usdc', '.usdz', '.xsi', '.lwo', '.lws', '.bgeo', '.bgeo.sc', '.vdb', '.prt', '.rib', '.ass', '.ifc', '.dae', '.igs', '.iges', '.step', '.stp', '.x3d', '.wrl', '.vrml', '.dxf', '.dwg', '.skp', '.sldprt', '.sldasm', '.objf', '.fbx7', '.3mf', '.amf', '.c4d', '.max', '.abc'}
@@ -79,7 +97,9 @@ class FileClassifierWorker(QThread):
     finished = pyqtSignal()
     error = pyqtSignal(str)
 
-    def __init__(self, valid_files, batch_size, project_root, folder_depth, structure_choice, get_llm_instance, get_folder_structure, prompt_kent, prompt_sphere):
+    def __init__(self, valid_files, batch_size, project_root, folder_depth, structure_choice, get_llm_instance, get_project_structure, prompt_kent, prompt_sphere,
+                 concurrency=1, ordered=True, classification_cache=None, provider="", model="", use_rules=True, planner=None,
+                 stream=False, retry_policy=None, use_async=False):
         super().__init__()
         self.valid_files = valid_files
         self.batch_size = batch_size
@@ -87,119 +107,362 @@ class FileClassifierWorker(QThread):
         self.folder_depth = folder_depth
         self.structure_choice = structure_choice
         self.get_llm_instance = get_llm_instance
-        self.get_folder_structure = get_folder_structure
+        self.get_project_structure = get_project_structure
         self.prompt_kent = prompt_kent
         self.prompt_sphere = prompt_sphere
+        # Batches in flight at once, and whether batch_result follows batch order or completion order;
+        # the window halves when the provider throttles (429) and grows back by one per answered batch
+        self.concurrency = max(1, concurrency)
+        self._window = self.concurrency
+        self.ordered = ordered
+        # Optional ClassificationCache; provider and model are part of its key
+        self.classification_cache = classification_cache
+        self.provider = provider
+        self.model = model
+        # Classify what the template's camera and extension rules decide without asking the LLM
+        self.use_rules = use_rules
+        # Batches are cut by token budget; batch_size caps the files per batch
+        self.planner = planner or BatchPlanner.for_provider(provider, max_files=batch_size)
+        # Emit each answered file as soon as its pair of the JSON is complete (ahead of batch order)
+        self.stream = stream
+        # Failed requests are retried with backoff and unusable answers split; what still fails is kept here
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.failures = FailureLedger()
+        # Drive the batches from one asyncio event loop (ainvoke/astream) instead of a thread per batch
+        self.use_async = use_async
         self._is_running = True
+        self._lock = threading.Lock()
+        self._last_snapshot = None
 
     def run(self):
         try:
-            total_files = len(self.valid_files)
-            num_batches = (total_files + self.batch_size - 1) // self.batch_size
-            all_results = []
-            for batch_idx in range(num_batches):
-                if not self._is_running:
-                    break
-                batch_files = self.valid_files[batch_idx * self.batch_size : (batch_idx + 1) * self.batch_size]
-                formatted_filenames = "\n".join([os.path.basename(f) for f in batch_files])
-                percent = int(((batch_idx + 1) / num_batches) * 100) if num_batches > 0 else 100
-                self.progress_update.emit(percent, f"Sending batch {batch_idx+1}/{num_batches} to AI for classification...")
-                # Get actual project structure
-                if os.path.isdir(self.project_root):
-                    project_structure = self.get_folder_structure(self.project_root, max_depth=self.folder_depth)
-                else:
-                    project_structure = "(Project folder does not exist or is not accessible)"
-                if self.structure_choice == "KENT":
-                    prompt = self.prompt_kent.replace('{file_list}', formatted_filenames).replace('{project_root}', self.project_root).replace('{project_structure}', project_structure)
-                else:
-                    prompt = self.prompt_sphere.replace('{file_list}', formatted_filenames).replace('{project_root}', self.project_root).replace('{project_structure}', project_structure)
-                try:
-                    llm = self.get_llm_instance()
-                    self.progress_update.emit(percent, f"Waiting for AI response for batch {batch_idx+1}/{num_batches}...")
-                    response = llm.invoke(prompt)
-                    self.log_message.emit(f"Raw AI response for batch {batch_idx+1}:\n{response}")
-                    match = re.search(r'\{{[\s\S]*\}}', response)
-                    classification = None
-                    json_str = None
-                    if match:
-                        json_str = match.group(0)
-                        self.log_message.emit(f"[DEBUG] Extracted JSON string:\n{json_str}")
-                        try:
-                            classification = json.loads(json_str)
-                        except Exception as e:
-                            self.log_message.emit(f"[DEBUG] Exception in json.loads (regex-extracted): {e}\nJSON string was:\n{json_str}")
-                    else:
-                        self.log_message.emit(f"[DEBUG] Regex failed to match JSON. Attempting to extract JSON code block.")
-                        cleaned_response = response.strip()
-                        json_block = None
-                        lines = cleaned_response.splitlines()
-                        start_idx = None
-                        end_idx = None
-                        for i, line in enumerate(lines):
-                            if line.strip().startswith('```json') or line.strip() == '```':
-                                start_idx = i
-                                break
-                        if start_idx is not None:
-                            for j in range(start_idx + 1, len(lines)):
-                                if lines[j].strip() == '```':
-                                    end_idx = j
-                                    break
-                            if end_idx is not None:
-                                json_block = '\n'.join(lines[start_idx + 1:end_idx]).strip()
-                        if not json_block:
-                            json_start = cleaned_response.find('{')
-                            json_end = cleaned_response.rfind('}')
-                            if json_start != -1 and json_end != -1 and json_end > json_start:
-                                json_block = cleaned_response[json_start:json_end+1]
-                        if json_block:
-                            try:
-                                classification = json.loads(json_block)
-                                json_str = json_block
-                                self.log_message.emit(f"[DEBUG] Successfully parsed extracted JSON block.")
-                            except Exception as e:
-                                self.log_message.emit(f"[DEBUG] Exception in json.loads (extracted block): {e}\nExtracted block was:\n{json_block}")
+            # Built once per run so resolving classified names stays linear in the file count
+            file_index = FileIndex(self.valid_files)
+            files = self.valid_files
+            # Rule matches and cache hits skip the network and reach the results table before any batch is sent
+            if self.use_rules and files:
+                local, _ = compile_rules(self._template()).classify(os.path.basename(f) for f in files)
+                self.log_message.emit(f"Rule engine: {len(local)}/{len(files)} files classified locally ({len(local) / len(files):.0%})")
+                files = self._emit_decided(files, local)
+            if self.classification_cache is not None and files:
+                context = self._cache_context(self._project_structure())
+                cached = self.classification_cache.get_many(context, (os.path.basename(f) for f in files))
+                self.log_message.emit(f"Classification cache: {len(cached)} hits, {len(files) - len(cached)} misses")
+                files = self._emit_decided(files, cached)
+            # Batches are cut from the queue as they are sent, so answers that came back
+            # truncated or slow shrink the next ones; names missing from an answer are queued once more
+            queue = list(files)
+            names = [os.path.basename(f) for f in queue]
+            retried = set()
+            fixed_tokens = estimate_tokens(self._template().replace('{project_root}', self.project_root)
+                                           .replace('{project_structure}', self._project_structure()))
+            # The LLM clients post with requests and hold no per-call state (an EndpointPool over several
+            # servers locks its own), so one is shared by all batches
+            llm = self.get_llm_instance()
+            if self.use_async:
+                # Batches run as tasks on a loop of their own; run_coroutine_threadsafe hands back
+                # the same futures the thread pool does, so the loop below serves both modes
+                pool = None
+                loop = asyncio.new_event_loop()
+                loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+                loop_thread.start()
+            else:
+                pool = ThreadPoolExecutor(max_workers=self.concurrency)
+            pending = {}  # future -> batch index
+            done = {}  # batch index -> results waiting for an earlier batch (ordered delivery)
+            position = next_batch = next_emit = completed = done_files = 0
+            try:
+                while self._is_running and (position < len(queue) or pending):
+                    while position < len(queue) and len(pending) < self._window:
+                        end = self.planner.next_batch(names, position, fixed_tokens)
+                        if pool is None:
+                            future = asyncio.run_coroutine_threadsafe(
+                                self._aclassify_batch(llm, next_batch, queue[position:end], file_index), loop)
                         else:
-                            self.log_message.emit(f"[DEBUG] Could not find a JSON block in the response.")
-                    batch_results = []
-                    if classification and isinstance(classification, dict):
-                        for fname, folder in classification.items():
-                            full_src_path = None
-                            for f in batch_files:
-                                if os.path.basename(f) == fname:
-                                    full_src_path = f
-                                    break
-                            if not full_src_path:
-                                for f in self.valid_files:
-                                    if os.path.basename(f) == fname:
-                                        full_src_path = f
-                                        break
-                            if not full_src_path:
-                                full_src_path = fname
-                            full_path = os.path.join(self.project_root, folder.lstrip('/'))
-                            full_destination = os.path.join(full_path, fname)
-                            full_destination = os.path.normpath(full_destination).replace('\\', '/')
-                            self.log_message.emit(f"{full_src_path} -> {full_destination}")
-                            batch_results.append((full_src_path, full_destination))
-                    elif classification is not None:
-                        self.log_message.emit(f"[DEBUG] JSON loaded but not a dict. Type: {type(classification)}. Value: {classification}")
-                    self.batch_result.emit(batch_results)
-                except Exception as e:
-                    self.error.emit(f"Error in batch {batch_idx+1}: {e}")
-                    continue
-            self.progress_update.emit(100, "Classification complete.")
+                            future = pool.submit(self._classify_batch, llm, next_batch, queue[position:end], file_index)
+                        pending[future] = next_batch
+                        position = end
+                        next_batch += 1
+                    self.progress_update.emit(int(done_files / len(queue) * 100),
+                                              f"Waiting for AI responses: {completed}/{next_batch} batches done, {len(pending)} in flight...")
+                    # The timeout keeps stop() responsive while requests are outstanding
+                    finished, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        batch_idx = pending.pop(future)
+                        completed += 1
+                        batch_results, batch_files, missing = future.result()
+                        done_files += len(batch_files)
+                        # A name left out again after its second chance is given up on
+                        self.failures.record([f for f in missing if f in retried], "left out of the answer")
+                        missing = [f for f in missing if f not in retried]
+                        if missing:
+                            self.log_message.emit(f"{len(missing)} file(s) missing from the answer to batch {batch_idx+1}; sending them again")
+                            retried.update(missing)
+                            queue.extend(missing)
+                            names.extend(os.path.basename(f) for f in missing)
+                        if self.ordered:
+                            done[batch_idx] = batch_results
+                            while next_emit in done:
+                                self.batch_result.emit(done.pop(next_emit))
+                                next_emit += 1
+                        else:
+                            self.batch_result.emit(batch_results)
+            finally:
+                # After stop(), requests still in flight are abandoned instead of awaited
+                if pool is None:
+                    for future in pending:
+                        future.cancel()
+                    asyncio.run_coroutine_threadsafe(self._aclose(), loop).result()
+                    loop.call_soon_threadsafe(loop.stop)
+                    loop_thread.join()
+                    loop.close()
+                else:
+                    pool.shutdown(wait=self._is_running, cancel_futures=True)
+            # Deliver whatever completed behind a batch that never came back
+            for batch_idx in sorted(done):
+                self.batch_result.emit(done[batch_idx])
+            if self.failures:
+                self.log_message.emit(f"{len(self.failures)} file(s) could not be classified; Retry Failed sends only those again")
+            if isinstance(llm, EndpointPool):
+                self.log_message.emit(llm.summary())
+            model_time = timing_summary(llm)
+            if model_time:
+                self.log_message.emit(model_time)
+            rate_summary = rate_limiter.limiter_for(self.provider, self.model).summary()
+            if rate_summary:
+                self.log_message.emit(rate_summary)
+            if self.planner.batches:
+                self.log_message.emit(f"Batch planner: {self.planner.batches} batches, {self.planner.truncation_rate:.0%} truncated, "
+                                      f"budget scale {self.planner.scale:.2f}")
+            if self._is_running:
+                self.progress_update.emit(100, "Classification complete.")
+            else:
+                self.progress_update.emit(int(done_files / max(len(queue), 1) * 100), f"Classification stopped after {completed}/{next_batch} batches.")
         except Exception as e:
             self.error.emit(str(e))
         self.finished.emit()
 
+    def _project_structure(self):
+        """Project structure text for the prompt (cached; re-rendered only if the destination changed)"""
+        if not os.path.isdir(self.project_root):
+            return "(Project folder does not exist or is not accessible)"
+        snapshot = self.get_project_structure(self.project_root, self.folder_depth)
+        with self._lock:
+            if snapshot is not self._last_snapshot:
+                self.log_message.emit(f"Project structure: {snapshot.dir_count} folders, ~{snapshot.tokens} tokens")
+                self._last_snapshot = snapshot
+        return snapshot.text
+
+    def _template(self):
+        return self.prompt_kent if self.structure_choice == "KENT" else self.prompt_sphere
+
+    def _cache_context(self, project_structure):
+        return ClassificationCache.context(self._template(), project_structure, self.provider, self.model)
+
+    def _emit_decided(self, files, decided):
+        """Emit the files whose folder is already known ({basename: folder}) and return the rest"""
+        if not decided:
+            return files
+        self.batch_result.emit([(f, self._destination(os.path.basename(f), decided[os.path.basename(f)]))
+                                for f in files if os.path.basename(f) in decided])
+        return [f for f in files if os.path.basename(f) not in decided]
+
+    def _destination(self, fname, folder):
+        full_path = os.path.join(self.project_root, folder.lstrip('/'))
+        return os.path.normpath(os.path.join(full_path, fname)).replace('\\', '/')
+
+    def _rows(self, fname, folder, batch_index, file_index):
+        """(src, dst) rows for one answered name"""
+        # Files of this batch first, then the whole run; unknown names are kept as given
+        src_paths = resolve_name(fname, batch_index, file_index)
+        if len(src_paths) > 1:
+            self.log_message.emit(f"{fname} names {len(src_paths)} files in different folders; each gets its own row")
+        full_destination = self._destination(fname, folder)
+        rows = []
+        for full_src_path in src_paths or [fname]:
+            self.log_message.emit(f"{full_src_path} -> {full_destination}")
+            rows.append((full_src_path, full_destination))
+        return rows
+
+    def _classify_batch(self, llm, batch_idx, batch_files, file_index, streamed=None):
+        """Send one batch to the LLM; runs on the worker's pool.
+
+        Returns (src, dst) pairs, the batch files and the files the answer
+        left out. A batch whose answer holds no JSON is split in half and each
+        half sent on its own, so one bad name cannot sink the rest. A request
+        that still fails after the retry policy (throttling, server or
+        connection errors) is not split, since halves would only double the
+        traffic; its files go to the failure ledger, as do files whose answer
+        fails alone. Pairs already emitted while streaming are not returned
+        again.
+        """
+        if not self._is_running:
+            return [], batch_files, []
+        streamed = set() if streamed is None else streamed
+        try:
+            return self._send_batch(llm, batch_idx, batch_files, file_index, streamed)
+        except Exception as e:
+            if not self._split(e, batch_idx, batch_files):
+                return [], batch_files, []
+            half = len(batch_files) // 2
+            parts = [self._classify_batch(llm, batch_idx, part, file_index, streamed)
+                     for part in (batch_files[:half], batch_files[half:])]
+            return self._join_parts(parts, batch_files)
+
+    async def _aclassify_batch(self, llm, batch_idx, batch_files, file_index, streamed=None):
+        """_classify_batch on the worker's event loop; the two halves of a failed batch are sent together"""
+        if not self._is_running:
+            return [], batch_files, []
+        streamed = set() if streamed is None else streamed
+        try:
+            return await self._asend_batch(llm, batch_idx, batch_files, file_index, streamed)
+        except Exception as e:
+            if not self._split(e, batch_idx, batch_files):
+                return [], batch_files, []
+            half = len(batch_files) // 2
+            parts = await asyncio.gather(*(self._aclassify_batch(llm, batch_idx, part, file_index, streamed)
+                                           for part in (batch_files[:half], batch_files[half:])))
+            return self._join_parts(parts, batch_files)
+
+    def _split(self, error, batch_idx, batch_files):
+        """Whether a failed batch is worth sending in two halves (its answer was unusable); if not, its files go to the failure ledger"""
+        if len(batch_files) > 1 and self._is_running and is_answer_error(error):
+            self.log_message.emit(f"Batch {batch_idx+1} failed ({error}); sending its {len(batch_files)} files in two halves")
+            return True
+        self.failures.record(batch_files, error)
+        self.error.emit(f"Error in batch {batch_idx+1}: {error}")
+        return False
+
+    @staticmethod
+    def _join_parts(parts, batch_files):
+        batch_results, missing = [], []
+        for part_results, _, part_missing in parts:
+            batch_results.extend(part_results)
+            missing.extend(part_missing)
+        return batch_results, batch_files, missing
+
+    def _batch_prompt(self, batch_files):
+        """(prompt, project structure) for one batch"""
+        formatted_filenames = "\n".join([os.path.basename(f) for f in batch_files])
+        project_structure = self._project_structure()
+        prompt = self._template().replace('{file_list}', formatted_filenames).replace('{project_root}', self.project_root).replace('{project_structure}', project_structure)
+        return prompt, project_structure
+
+    def _pair_emitter(self, streamed, batch_index, file_index):
+        """on_pair callback emitting each streamed pair once"""
+        def on_pair(fname, folder):
+            if fname not in streamed:
+                streamed.add(fname)
+                self.batch_result.emit(self._rows(fname, folder, batch_index, file_index))
+        return on_pair
+
+    def _retry_logger(self, batch_idx):
+        def on_retry(attempt, wait, error):
+            self.log_message.emit(f"Batch {batch_idx+1}: {error}; retry {attempt}/{self.retry_policy.max_attempts - 1} in {wait:.1f}s")
+            if status_code(error) == 429:
+                with self._lock:
+                    self._window = max(1, self._window // 2)
+                    window = self._window
+                self.log_message.emit(f"{self.provider} is throttling requests; at most {window} batch(es) in flight until it recovers")
+        return on_retry
+
+    def _send_batch(self, llm, batch_idx, batch_files, file_index, streamed):
+        """One request for batch_files, retried per retry_policy; raises if it fails or the answer holds no JSON"""
+        prompt, project_structure = self._batch_prompt(batch_files)
+        batch_index = FileIndex(batch_files)
+        on_pair = self._pair_emitter(streamed, batch_index, file_index)
+        limiter = rate_limiter.limiter_for(self.provider, self.model)
+        tokens = request_tokens(prompt, [os.path.basename(f) for f in batch_files])
+        latency = 0.0
+
+        def send():
+            # Timed per attempt, so backoff and rate limit waits do not count as a slow answer
+            nonlocal latency
+            limiter.acquire(tokens, should_stop=lambda: not self._is_running)
+            started = time.monotonic()
+            response = stream_classification(llm, prompt, on_pair) if self.stream else llm.invoke(prompt)
+            latency = time.monotonic() - started
+            return response
+
+        response = self.retry_policy.call(send, on_retry=self._retry_logger(batch_idx), should_stop=lambda: not self._is_running)
+        return self._read_answer(response, latency, batch_idx, batch_files, batch_index, file_index, streamed, project_structure)
+
+    async def _asend_batch(self, llm, batch_idx, batch_files, file_index, streamed):
+        """_send_batch with llm.ainvoke()/astream() on the worker's event loop"""
+        prompt, project_structure = self._batch_prompt(batch_files)
+        batch_index = FileIndex(batch_files)
+        on_pair = self._pair_emitter(streamed, batch_index, file_index)
+        limiter = rate_limiter.limiter_for(self.provider, self.model)
+        tokens = request_tokens(prompt, [os.path.basename(f) for f in batch_files])
+        latency = 0.0
+
+        async def send():
+            nonlocal latency
+            await limiter.aacquire(tokens, should_stop=lambda: not self._is_running)
+            started = time.monotonic()
+            response = await astream_classification(llm, prompt, on_pair) if self.stream else await llm.ainvoke(prompt)
+            latency = time.monotonic() - started
+            return response
+
+        response = await self.retry_policy.acall(send, on_retry=self._retry_logger(batch_idx), should_stop=lambda: not self._is_running)
+        return self._read_answer(response, latency, batch_idx, batch_files, batch_index, file_index, streamed, project_structure)
+
+    def _read_answer(self, response, latency, batch_idx, batch_files, batch_index, file_index, streamed, project_structure):
+        """(src, dst) pairs, batch files and missing files from one answer; raises if it holds no JSON"""
+        self.log_message.emit(f"Raw AI response for batch {batch_idx+1}:\n{response}")
+        classification = parse_classification(response)
+        if classification is None:
+            self.planner.record(latency, truncated=True)
+            raise AnswerError("no JSON object in the answer")
+        if self.classification_cache is not None:
+            # Only names that were asked for; anything else the model invents is not cached
+            asked = {os.path.basename(f) for f in batch_files}
+            self.classification_cache.put_many(self._cache_context(project_structure),
+                                               {k: v for k, v in classification.items() if k in asked})
+        batch_results = []
+        for fname, folder in classification.items():
+            if fname not in streamed:
+                batch_results.extend(self._rows(fname, folder, batch_index, file_index))
+        # A cut-off answer leaves names out; the planner shrinks the next batches
+        missing = [f for f in batch_files if os.path.basename(f) not in classification]
+        self.planner.record(latency, truncated=bool(missing))
+        with self._lock:
+            self._window = min(self.concurrency, self._window + 1)
+        return batch_results, batch_files, missing
+
+    @staticmethod
+    async def _aclose():
+        """Let cancelled batches unwind, then close the loop's HTTP clients and stream readers"""
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await http_pool.aclose_clients()
+        await asyncio.get_running_loop().shutdown_asyncgens()
+
     def stop(self):
         self._is_running = False
 
+    @property
+    def stopped(self):
+        return not self._is_running
+
 # --- FileClassifierApp class (full implementation, adapted from FIelOrganizer.py) ---
 class FileClassifierApp(QMainWindow):
+    REVALIDATE_SEQUENCES = True  # re-list sequence folders once before moving/copying
+
+    # Coalesced watcher batches as ChangeBatches, emitted from the watcher thread
+    fs_changes = pyqtSignal(object)
+    # Warm-up results, emitted from the warm-up threads
+    model_warmed = pyqtSignal(str)
+
     # --- UI setup (adapted from FIelOrganizer.py) ---
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.setWindowTitle("AI File Organizer MT")
+        # Rendered project trees, reused across batches until the destination changes
+        self.structure_cache = StructureCache(self.get_folder_structure)
+        self.file_index = FileIndex()
+        # Opened on the first classification that uses it
+        self.classification_cache = None
         self.setGeometry(200, 200, 1000, 600)
         
         # Apply dark orange theme
@@ -371,6 +634,14 @@ class FileClassifierApp(QMainWindow):
         self.remove_selected_btn.clicked.connect(self.remove_selected_files)
         self.classify_btn = QPushButton(icon_classify, "Classify Files")
         self.classify_btn.clicked.connect(self.classify_files)
+        self.stop_btn = QPushButton("Stop")
+        self.stop_btn.setToolTip("Stop sending batches; requests already in flight are abandoned")
+        self.stop_btn.clicked.connect(self.stop_classification)
+        self.stop_btn.setEnabled(False)
+        self.retry_failed_btn = QPushButton("Retry Failed")
+        self.retry_failed_btn.setToolTip("Classify again only the files the last run could not classify")
+        self.retry_failed_btn.clicked.connect(self.retry_failed_files)
+        self.retry_failed_btn.setEnabled(False)
         # Progress bar for classification in Selected Files panel
         self.progress_bar = QProgressBar()
         self.progress_bar.setVisible(False)
@@ -414,6 +685,13 @@ class FileClassifierApp(QMainWindow):
         top_btn_layout = QHBoxLayout()
         top_btn_layout.addWidget(self.add_files_btn)
         top_btn_layout.addWidget(self.add_folder_btn)
+        # Watch added folders and apply new/deleted files incrementally
+        self.watch_folders_checkbox = QCheckBox("Watch Folders")
+        self.watch_folders_checkbox.setToolTip("Keep added folders in sync as files are created, deleted or renamed")
+        self.watch_folders_checkbox.toggled.connect(self.on_watch_toggled)
+        top_btn_layout.addWidget(self.watch_folders_checkbox)
+        self.folder_watcher = None
+        self.fs_changes.connect(self._apply_fs_changes)
         selected_layout.addLayout(top_btn_layout)
         # File list
         selected_layout.addWidget(self.file_list_widget)
@@ -426,7 +704,13 @@ class FileClassifierApp(QMainWindow):
         selected_layout.addWidget(self.progress_bar)
         # Bottom: Classify Files (larger)
         self.classify_btn.setMinimumHeight(self.classify_btn.sizeHint().height() * 2)
-        selected_layout.addWidget(self.classify_btn)
+        classify_row = QHBoxLayout()
+        classify_row.addWidget(self.classify_btn, 3)
+        self.stop_btn.setMinimumHeight(self.classify_btn.minimumHeight())
+        classify_row.addWidget(self.stop_btn, 1)
+        self.retry_failed_btn.setMinimumHeight(self.classify_btn.minimumHeight())
+        classify_row.addWidget(self.retry_failed_btn, 1)
+        selected_layout.addLayout(classify_row)
         # Selected files dock
         selected_files_dock = QDockWidget("Selected Files", self)
         selected_files_dock.setObjectName("SelectedFilesDock")
@@ -462,9 +746,13 @@ class FileClassifierApp(QMainWindow):
         # Ollama settings
         self.ollama_settings = QWidget()
         ollama_layout = QVBoxLayout()
-        ollama_layout.addWidget(QLabel("Ollama Server URL:"))
+        ollama_layout.addWidget(QLabel("Ollama Server URL(s):"))
         self.ollama_url_input = QLineEdit("http://localhost:11434")
+        self.ollama_url_input.setToolTip("Several servers, separated by commas, share the batches")
         ollama_layout.addWidget(self.ollama_url_input)
+        self.unload_on_exit_checkbox = QCheckBox("Unload Model on Exit")
+        self.unload_on_exit_checkbox.setToolTip("Free the server's memory when closing; leave off for a shared Ollama server")
+        ollama_layout.addWidget(self.unload_on_exit_checkbox)
         self.ollama_settings.setLayout(ollama_layout)
         ai_setup_layout.addWidget(self.ollama_settings)
         
@@ -495,8 +783,9 @@ class FileClassifierApp(QMainWindow):
         # LM Studio specific settings
         self.lmstudio_settings = QWidget()
         lmstudio_layout = QVBoxLayout()
-        lmstudio_layout.addWidget(QLabel("LM Studio Server URL:"))
+        lmstudio_layout.addWidget(QLabel("LM Studio Server URL(s):"))
         self.lmstudio_url_input = QLineEdit("http://localhost:1234/v1")
+        self.lmstudio_url_input.setToolTip("Several servers, separated by commas, share the batches")
         lmstudio_layout.addWidget(self.lmstudio_url_input)
         self.lmstudio_settings.setLayout(lmstudio_layout)
         self.lmstudio_settings.setVisible(False)  # Initially hidden
@@ -509,14 +798,62 @@ class FileClassifierApp(QMainWindow):
         
         # Batch size control
         batch_row = QHBoxLayout()
-        batch_row.addWidget(QLabel("Batch Size:"))
+        batch_row.addWidget(QLabel("Max Batch Size:"))
         self.batch_size_spin = QSpinBox()
         self.batch_size_spin.setMinimum(1)
-        self.batch_size_spin.setMaximum(100)
-        self.batch_size_spin.setValue(15)
-        self.batch_size_spin.setToolTip("Number of files to send to the AI per batch")
+        self.batch_size_spin.setMaximum(500)
+        self.batch_size_spin.setValue(100)
+        self.batch_size_spin.setToolTip("Most files sent to the AI per batch; batches are packed to fit the model's token budget")
         batch_row.addWidget(self.batch_size_spin)
         ai_setup_layout.addLayout(batch_row)
+
+        # Token budget used to pack batches
+        context_row = QHBoxLayout()
+        context_row.addWidget(QLabel("Context Tokens:"))
+        self.context_tokens_spin = QSpinBox()
+        self.context_tokens_spin.setRange(0, 1000000)
+        self.context_tokens_spin.setSingleStep(1024)
+        self.context_tokens_spin.setSpecialValueText("Auto")
+        self.context_tokens_spin.setToolTip("Context window of the model; Auto uses the provider's usual limit")
+        context_row.addWidget(self.context_tokens_spin)
+        ai_setup_layout.addLayout(context_row)
+
+        # Provider rate limits; the provider's rate-limit headers and 429s adjust them during a run
+        rate_row = QHBoxLayout()
+        rate_row.addWidget(QLabel("Rate Limit:"))
+        self.requests_per_minute_spin = QSpinBox()
+        self.requests_per_minute_spin.setRange(0, 100000)
+        self.requests_per_minute_spin.setSpecialValueText("Auto")
+        self.requests_per_minute_spin.setSuffix(" req/min")
+        self.requests_per_minute_spin.setToolTip("Requests per minute allowed by the provider for this model; Auto uses its usual limit")
+        rate_row.addWidget(self.requests_per_minute_spin)
+        self.tokens_per_minute_spin = QSpinBox()
+        self.tokens_per_minute_spin.setRange(0, 100000000)
+        self.tokens_per_minute_spin.setSingleStep(10000)
+        self.tokens_per_minute_spin.setSpecialValueText("Auto")
+        self.tokens_per_minute_spin.setSuffix(" tokens/min")
+        self.tokens_per_minute_spin.setToolTip("Tokens per minute allowed by the provider for this model; Auto uses its usual limit")
+        rate_row.addWidget(self.tokens_per_minute_spin)
+        ai_setup_layout.addLayout(rate_row)
+
+        # Concurrent batch requests
+        concurrency_row = QHBoxLayout()
+        concurrency_row.addWidget(QLabel("Parallel Requests:"))
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setMinimum(1)
+        self.concurrency_spin.setMaximum(64)
+        self.concurrency_spin.setValue(4)
+        self.concurrency_spin.setToolTip("Number of batches sent to the AI at the same time")
+        concurrency_row.addWidget(self.concurrency_spin)
+        self.ordered_results_checkbox = QCheckBox("In Order")
+        self.ordered_results_checkbox.setChecked(True)
+        self.ordered_results_checkbox.setToolTip("Show results in batch order (unchecked: as each batch completes)")
+        concurrency_row.addWidget(self.ordered_results_checkbox)
+        self.async_checkbox = QCheckBox("Async")
+        self.async_checkbox.setChecked(http_pool.HTTPX_AVAILABLE)
+        self.async_checkbox.setToolTip("Send the parallel requests from one asyncio event loop instead of a thread each (needs httpx)")
+        concurrency_row.addWidget(self.async_checkbox)
+        ai_setup_layout.addLayout(concurrency_row)
         
         # Folder structure depth control
         depth_row = QHBoxLayout()
@@ -528,6 +865,20 @@ class FileClassifierApp(QMainWindow):
         self.folder_depth_spin.setToolTip("How many levels deep to show the folder structure to the AI")
         depth_row.addWidget(self.folder_depth_spin)
         ai_setup_layout.addLayout(depth_row)
+
+        # Reuse earlier answers for the same file, template, structure and model
+        self.use_cache_checkbox = QCheckBox("Use Classification Cache")
+        self.use_cache_checkbox.setChecked(True)
+        self.use_cache_checkbox.setToolTip("Files classified before with the same structure, project folders and model skip the AI")
+        ai_setup_layout.addWidget(self.use_cache_checkbox)
+        self.use_rules_checkbox = QCheckBox("Use Local Rules")
+        self.use_rules_checkbox.setChecked(True)
+        self.use_rules_checkbox.setToolTip("Camera files and file types the structure's rules decide are classified without the AI")
+        ai_setup_layout.addWidget(self.use_rules_checkbox)
+        self.stream_checkbox = QCheckBox("Stream Responses")
+        self.stream_checkbox.setChecked(True)
+        self.stream_checkbox.setToolTip("Show each classified file as soon as the AI has written it, ahead of batch order")
+        ai_setup_layout.addWidget(self.stream_checkbox)
         
         ai_setup_group.setLayout(ai_setup_layout)
         # Create separate AI Setup dock
@@ -643,6 +994,11 @@ class FileClassifierApp(QMainWindow):
         # Output/log panel
         self.output_box = QTextEdit()
         self.output_box.setReadOnly(True)
+
+        # Load the picked local model ahead of the first batch, and keep it loaded for the session
+        self.model_warmer = ModelWarmer(self.model_warmed.emit)
+        self.model_warmed.connect(self.output_box.append)
+        self.model_dropdown.currentTextChanged.connect(self.on_model_changed)
         
         # Add right panel dock (controls)
         right_panel_dock = QDockWidget("Controls", self)
@@ -683,6 +1039,9 @@ class FileClassifierApp(QMainWindow):
         
         # Initialize worker
         self.worker = None
+        # Files the last run could not classify (Retry Failed)
+        self.failed_files = []
+        self._http_stats = (0, 0)
         
         # Initialize batch constant
         self.BATCH_SIZE = 15
@@ -692,8 +1051,10 @@ class FileClassifierApp(QMainWindow):
         
         # Load Mistral key
         self.load_mistral_key()    # --- File classification logic (refactored for threading) ---
-    def classify_files(self):
-        files = self.get_all_files()
+    def classify_files(self, checked=False, files=None):
+        """Classify the files in the list, or only files when given (Retry Failed)"""
+        retrying = files is not None
+        files = files if retrying else self.get_all_files()
         if not files:
             QMessageBox.warning(self, "No files selected", "Please add files or folders first.")
             return
@@ -736,18 +1097,35 @@ class FileClassifierApp(QMainWindow):
         structure_choice = self.structure_dropdown.currentText()
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
-        self.results_table.setRowCount(0)
-        self._all_results_mt = []        # Start worker thread
+        # On Retry Failed the rows of the last run stay and the retried files are added below them
+        if not retrying:
+            self.results_table.setRowCount(0)
+            self._all_results_mt = []
+        if self.use_cache_checkbox.isChecked() and self.classification_cache is None:
+            self.classification_cache = ClassificationCache()
+        rate_limiter.set_limits(provider, self.model_dropdown.currentText(),
+                                self.requests_per_minute_spin.value() or None, self.tokens_per_minute_spin.value() or None)
+        # Start worker thread
         self.worker = FileClassifierWorker(
             valid_files, batch_size, project_root, folder_depth, structure_choice,
-            self.get_llm_instance, self.get_folder_structure, PROMPT_TEMPLATE_KENT, PROMPT_TEMPLATE_SPHERE
+            self.get_llm_instance, self.structure_cache.get, PROMPT_TEMPLATE_KENT, PROMPT_TEMPLATE_SPHERE,
+            concurrency=self.concurrency_spin.value(), ordered=self.ordered_results_checkbox.isChecked(),
+            classification_cache=self.classification_cache if self.use_cache_checkbox.isChecked() else None,
+            provider=provider, model=self.model_dropdown.currentText(), use_rules=self.use_rules_checkbox.isChecked(),
+            planner=BatchPlanner.for_provider(provider, self.context_tokens_spin.value(), max_files=batch_size),
+            stream=self.stream_checkbox.isChecked(), use_async=self.async_checkbox.isChecked()
         )
         self.worker.progress_update.connect(self._on_worker_progress)
         self.worker.batch_result.connect(self._on_worker_batch_result)
         self.worker.log_message.connect(self.output_box.append)
         self.worker.error.connect(self._on_worker_error)
         self.worker.finished.connect(self._on_worker_finished)
+        # One kept-alive connection per request in flight; the counts before the run are kept for its summary
+        http_pool.set_pool_size(self.concurrency_spin.value())
+        self._http_stats = http_pool.stats()
         self.classify_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self.retry_failed_btn.setEnabled(False)
         self.worker.start()
         
     def _on_worker_progress(self, percent, message):
@@ -781,12 +1159,32 @@ class FileClassifierApp(QMainWindow):
             return
         self.output_box.append(f"<span style='color:red'>Worker error: {msg}</span>")
 
+    def stop_classification(self):
+        """Ask the running worker to stop after the batches already delivered"""
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.stop_btn.setEnabled(False)
+            self.set_info("Stopping classification...")
+
     def _on_worker_finished(self):
         """Clean up after worker thread completes"""
+        stopped = self.worker is not None and self.worker.stopped
         self.progress_bar.setValue(100)
         self.progress_bar.setVisible(False)
-        self.set_info("Classification complete.")
+        self.set_info("Classification stopped." if stopped else "Classification complete.")
         self.classify_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        http_summary = http_pool.reuse_summary(self._http_stats)
+        if http_summary:
+            self.output_box.append(http_summary)
+        self.failed_files = self.worker.failures.files() if self.worker is not None else []
+        self.retry_failed_btn.setText(f"Retry Failed ({len(self.failed_files)})" if self.failed_files else "Retry Failed")
+        self.retry_failed_btn.setEnabled(bool(self.failed_files))
+
+    def retry_failed_files(self):
+        """Send only the files the last run could not classify"""
+        if self.failed_files:
+            self.classify_files(files=self.failed_files)
 
     # --- File Operations ---
     def move_selected_files(self):
@@ -801,6 +1199,7 @@ class FileClassifierApp(QMainWindow):
         self.progress_bar.setValue(0)
         
         # Build list of all files to move (expanding sequences)
+        self._revalidate_sequences([src for src, _ in selected])
         all_files_to_move = []
         for src, dst in selected:
             src_files = self.expand_sequence_files(src)
@@ -867,6 +1266,7 @@ class FileClassifierApp(QMainWindow):
         self.progress_bar.setValue(0)
         
         # Build list of all files to copy (expanding sequences)
+        self._revalidate_sequences([src for src, _ in selected])
         all_files_to_copy = []
         for src, dst in selected:
             src_files = self.expand_sequence_files(src)
@@ -926,24 +1326,24 @@ class FileClassifierApp(QMainWindow):
         if os.path.isabs(fname) and os.path.exists(fname):
             return fname
         
-        # First, try exact match for individual files
-        for i in range(self.file_list_widget.count()):
-            item_text = self.file_list_widget.item(i).text()
-            if os.path.basename(item_text) == fname:
-                return item_text
-        
-        # If no exact match, try to handle sequences (files with #### pattern)
-        if '####' in fname:
-            # This is a sequence pattern, find the directory and actual files
-            sequence_base = fname.replace('####', '*')
-            for i in range(self.file_list_widget.count()):
-                item_text = self.file_list_widget.item(i).text()
-                item_dir = os.path.dirname(item_text)
-                # Look for files matching the sequence pattern in the same directory
-                pattern = os.path.join(item_dir, sequence_base)
-                matching_files = glob.glob(pattern)
-                if matching_files:
-                    return matching_files  # Return list of files for sequences
+        # Look the path or bare name up in the Selected Files index
+        paths = self.file_index.paths(fname)
+        if len(paths) > 1:
+            # Files from different folders would land on one destination; never pick one silently
+            self.output_box.append(f"Warning: {fname} is ambiguous, {len(paths)} selected files have that name: {', '.join(paths)}")
+            return None
+        if paths:
+            # Sequences expand from the manifest captured at scan time
+            manifest = self.file_index.manifest(paths[0])
+            if manifest is None:
+                return paths[0]
+            return manifest.paths() if manifest.sequence.count else None
+
+        # A path to a sequence that is not in the list is listed once
+        if '####' in fname and os.path.isabs(fname):
+            manifest = SequenceManifest.for_key(os.path.dirname(fname), os.path.basename(fname))
+            if manifest.sequence.count:
+                return manifest.paths()
         
         # If not found, try current working directory
         if os.path.exists(fname):
@@ -962,7 +1362,8 @@ class FileClassifierApp(QMainWindow):
         # Sequence pattern file
         full_path = self.find_full_path(fname)
         if isinstance(full_path, list):
-            return [p for p in full_path if os.path.exists(p)]
+            # Manifest paths were revalidated against the folder listing; no per-frame stat
+            return full_path
         elif full_path and os.path.exists(full_path):
             return [full_path]
         return []
@@ -1018,7 +1419,7 @@ class FileClassifierApp(QMainWindow):
         
         # Get current project structure
         if os.path.isdir(project_root):
-            project_structure = self.get_folder_structure(project_root, max_depth=6)
+            project_structure = self.structure_cache.get(project_root, 6).text
         else:
             project_structure = "(Project folder does not exist or is not accessible)"
         
@@ -1074,13 +1475,18 @@ class FileClassifierApp(QMainWindow):
         """Remove selected files from the file_list_widget."""
         selected_items = self.file_list_widget.selectedItems()
         for item in selected_items:
-            self.file_list_widget.takeItem(self.file_list_widget.row(item))
+            self._remove_list_item(item)
 
     def set_info(self, msg):
         """Set the info label text."""
         self.info_label.setText(msg)
         
     def closeEvent(self, event):
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+        if self.worker is not None:
+            self.worker.stop()
+        self.model_warmer.close(unload=self.unload_on_exit_checkbox.isChecked())
         # Save window and dock state
         with open(self.settings_path, 'wb') as f:
             f.write(self.saveState())
@@ -1168,11 +1574,12 @@ class FileClassifierApp(QMainWindow):
             self.model_dropdown.setEditable(False)
         elif provider == "LM Studio":
             try:
-                lmstudio_url = self.lmstudio_url_input.text().strip()
-                if not lmstudio_url:
+                lmstudio_urls = split_urls(self.lmstudio_url_input.text())
+                if not lmstudio_urls:
                     raise ValueError("Please enter a valid LM Studio server URL")
+                lmstudio_url = lmstudio_urls[0]
 
-                # Fetch models from LM Studio API
+                # Fetch models from LM Studio API (the first server; all of them should serve the same models)
                 models_url = lmstudio_url.rstrip('/') + '/models'
                 response = requests.get(models_url, timeout=5)
                 response.raise_for_status()
@@ -1199,8 +1606,8 @@ class FileClassifierApp(QMainWindow):
     def on_file_browser_double_click(self, index):
         path = self.file_model.filePath(index)
         if os.path.isfile(path):
-            if path not in self.get_all_files():
-                self.file_list_widget.addItem(path)
+            if path not in self.file_index:
+                self._add_list_item(path)
         elif os.path.isdir(path):
             self._add_folder_recursive(path)
             
@@ -1236,8 +1643,8 @@ class FileClassifierApp(QMainWindow):
         """Open file dialog and add selected files to list"""
         files, _ = QFileDialog.getOpenFileNames(self, "Select Files")
         for f in files:
-            if f not in self.get_all_files():
-                self.file_list_widget.addItem(f)
+            if f not in self.file_index:
+                self._add_list_item(f)
 
     def add_folder(self):
         """Open folder dialog and recursively add files"""
@@ -1247,103 +1654,138 @@ class FileClassifierApp(QMainWindow):
 
     def _add_folder_recursive(self, root):
         """Recursively add files from a folder with sequence grouping"""
-        import re
-        from collections import defaultdict, deque
-        seq_dict = defaultdict(list)
-        visited = set()
-        # First pass: count total directories for progress
-        temp_queue = deque([root])
-        total_dirs = 0
-        while temp_queue:
-            current = temp_queue.popleft()
-            if current in visited:
-                continue
-            visited.add(current)
-            try:
-                entries = [os.path.join(current, f) for f in os.listdir(current)]
-            except Exception:
-                continue
-            for entry in entries:
-                if os.path.isdir(entry):
-                    temp_queue.append(entry)
-            total_dirs += 1
-        # Reset and scan
-        visited.clear()
-        queue = deque([root])
-        processed = 0
+        # Incremental: the scan index only re-lists directories whose mtime
+        # changed since this root was last scanned. Progress is estimated from
+        # discovered vs completed dirs, seeded with the last scan's count.
+        scan_counts = ScanCountCache()
+        progress = ScanProgress(cached=scan_counts.get([root]))
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         self.set_info("Scanning folder(s)...")
-        while queue:
-            current = queue.popleft()
-            if current in visited:
-                continue
-            visited.add(current)
-            try:
-                entries = [os.path.join(current, f) for f in os.listdir(current)]
-            except Exception:
-                continue
-            for entry in entries:
-                if os.path.isdir(entry):
-                    queue.append(entry)
-                elif os.path.isfile(entry):
-                    fname = os.path.basename(entry)
-                    match = re.match(r"(.+?)([._-])?(\d{3,4})(\.[^.]+)$", fname)
-                    if match:
-                        prefix, sep, frame, ext = match.groups()
-                        key = f"{prefix}{sep if sep else ''}####{ext}"
-                        seq_dict[key].append(entry)
+        def on_dir(current, dir_progress):
+            self.progress_bar.setValue(int(dir_progress.fraction() * 100))
+            QApplication.processEvents()
+            self.set_info(f"Scanning: {current}")
+        scan_index = ScanIndex()
+        try:
+            scan_index.update([root], progress=progress, progress_callback=on_dir)
+            # Sequences are grouped per directory; the index yields entries directory by directory
+            existing = set(self.get_all_files())
+            entries = scan_index.iter_entries([root])
+            for dir_path, rows in groupby(entries, key=lambda row: row[0]):
+                names = [row[1] for row in rows if row[2] == KIND_FILE]
+                singles, sequences = group_names(names)
+                # Add only one representative per sequence, and all non-sequence files;
+                # sequences carry their frame manifest so moves never re-glob
+                paths = [os.path.join(dir_path, fname) for fname in singles]
+                reps = [(self._list_entry(path), path, None) for path in paths]
+                reps.extend((self._sequence_entry(dir_path, seq.key), os.path.join(dir_path, seq.key), SequenceManifest(dir_path, seq))
+                            for seq in sequences)
+                for rep, path, manifest in reps:
+                    if rep not in existing:
+                        existing.add(rep)
+                        self._add_list_item(rep, path, manifest)
                     else:
-                        seq_dict[fname].append(entry)
-            processed += 1
-            if total_dirs > 0:
-                pct = int((processed/total_dirs)*100)
-                self.progress_bar.setValue(pct)
-                QApplication.processEvents()
-                self.set_info(f"Scanning: {current}")
-        # Add representative entries
-        for key, paths in seq_dict.items():
-            if len(paths) > 1 and '####' in key:
-                dir_path = os.path.dirname(paths[0])
-                rep = os.path.normpath(os.path.join(dir_path, key))
-            else:
-                rep = paths[0]
-            if rep not in self.get_all_files():
-                self.file_list_widget.addItem(rep)
+                        # Same row text from another folder: keep the path so lookups see the duplicate
+                        self.file_index.add(path, manifest)
+        finally:
+            scan_index.close()
+        scan_counts.set([root], progress.summary())
         self.progress_bar.setVisible(False)
         self.set_info("Folder scan complete.")
-        
+        if self.watch_folders_checkbox.isChecked():
+            self._watch_root(root)
+        
+    # --- Watch mode ---
+    def _watch_root(self, root):
+        """Watch a folder added to the list so new/deleted files are applied incrementally"""
+        if self.folder_watcher is None:
+            # A batch's disk work (listings, manifests, index refresh) runs on the watcher thread
+            self.folder_watcher = FolderWatcher(lambda changes: self.fs_changes.emit(ChangeBatch.from_changes(changes)),
+                                                debounce=2.0)
+        # Folders created inside a watched root are already covered by its watch
+        if self.folder_watcher.watched_root(root) is None:
+            mode = self.folder_watcher.add_root(root)
+            self.output_box.append(f"Watching {root} ({mode})")
+
+    def on_watch_toggled(self, checked):
+        if not checked and self.folder_watcher is not None:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+
+    def _apply_fs_changes(self, batch):
+        """Apply one watcher ChangeBatch (prepared on the watcher thread) to the selected files list"""
+        if self.folder_watcher is None:
+            return
+
+        def remove_rows(entry):
+            items = self.file_list_widget.findItems(entry, Qt.MatchExactly)
+            for item in items:
+                self.file_list_widget.takeItem(self.file_list_widget.row(item))
+            return len(items)
+
+        added, removed = apply_changes(batch, set(self.get_all_files()), self.file_index, self._list_entry,
+                                       self._sequence_entry, self._add_list_item, remove_rows)
+        if added or removed:
+            self.output_box.append(f"Watcher: +{added} / -{removed} entries in Selected Files")
+
+    def _add_list_item(self, text, path=None, manifest=None):
+        """Add a Selected Files row and index the full path (and sequence manifest) it stands for"""
+        self.file_index.add(path or text, manifest)
+        item = QListWidgetItem(text)
+        if manifest is not None:
+            item.setToolTip(f"{manifest.dir_path}\n{manifest.sequence.label()}")
+        self.file_list_widget.addItem(item)
+
+    def _remove_list_item(self, item):
+        for path in self.file_index.paths(item.text()):
+            self.file_index.discard(path)
+        self.file_list_widget.takeItem(self.file_list_widget.row(item))
+
+    def _revalidate_sequences(self, names):
+        """Refresh the manifests of the given sequence rows with one listing per directory"""
+        if not self.REVALIDATE_SEQUENCES:
+            return
+        manifests = [self.file_index.manifest(name) for name in names if '####' in name]
+        changed = revalidate_manifests([m for m in manifests if m is not None])
+        if changed:
+            self.output_box.append(f"{changed} sequence(s) changed on disk since they were scanned")
+
+    def _list_entry(self, path):
+        """Selected Files entry for a file path"""
+        return path
+
+    def _sequence_entry(self, dir_path, key):
+        return os.path.normpath(os.path.join(dir_path, key))
+
     def get_all_files(self):
         """Return list of currently selected files"""
         return [self.file_list_widget.item(i).text() for i in range(self.file_list_widget.count())]
 
-    def get_folder_structure(self, path, max_depth=3, prefix=""):
-        """Build a simple folder structure string up to max_depth"""
-        structure = []
-        def walk(p, depth):
-            if depth > max_depth:
-                return
-            try:
-                entries = sorted(os.listdir(p))
-            except Exception:
-                return
-            for e in entries:
-                full = os.path.join(p, e)
-                structure.append(f"{prefix * depth}{e}")
-                if os.path.isdir(full):
-                    walk(full, depth+1)
-        walk(path, 0)
-        return "\n".join(structure)
+    def get_folder_structure(self, path, max_depth=3, dir_mtimes=None):
+        """Build a tree-like string of the folders (no files) up to max_depth (mtimes of listed directories go to dir_mtimes)"""
+        return render_tree(path, max_depth=max_depth, dir_mtimes=dir_mtimes)
+
+    def on_model_changed(self, model_name):
+        """Start loading a local model as soon as it is picked, so the first batch does not wait for it"""
+        if self.provider_dropdown.currentText() not in ("Ollama", "LM Studio"):
+            return
+        try:
+            llm = self.get_llm_instance()
+        except ValueError:
+            return  # no valid model or server URL yet
+        self.model_warmer.warm(llm)
 
     def get_llm_instance(self):
         """Return LLM instance based on selected provider"""
         provider = self.provider_dropdown.currentText()
         model = self.model_dropdown.currentText()
         if provider == "Ollama":
-            url = self.ollama_url_input.text().strip()
-            if not url:
+            urls = split_urls(self.ollama_url_input.text())
+            if not urls:
                 raise ValueError("Please enter a valid Ollama server URL")
-            return OllamaLLM(model=model, base_url=url)
+            # format="json" makes Ollama constrain the answer to a JSON object; several servers share the batches
+            return pooled([OllamaAdapter(model=model, base_url=url) for url in urls])
         elif provider == "OpenRouter":
             api_key = self.openrouter_api_key_input.text().strip()
             return OpenRouterLLM(model, api_key)
@@ -1351,10 +1793,10 @@ class FileClassifierApp(QMainWindow):
             api_key = self.mistral_api_key_input.text().strip()
             return MistralLLM(model, api_key)
         elif provider == "LM Studio":
-            lmstudio_url = self.lmstudio_url_input.text().strip()
-            if not lmstudio_url:
+            lmstudio_urls = split_urls(self.lmstudio_url_input.text())
+            if not lmstudio_urls:
                 raise ValueError("Please enter a valid LM Studio server URL")
-            return LMStudioLLM(model=model, base_url=lmstudio_url)
+            return pooled([LMStudioLLM(model=model, base_url=url) for url in lmstudio_urls])
         else:
             raise ValueError(f"Unknown provider: {provider}")
 
@@ -1387,8 +1829,8 @@ class FileClassifierApp(QMainWindow):
                 self._add_folder_recursive(path)
             elif os.path.isfile(path):
                 # Add individual files
-                if path not in self.get_all_files():
-                    self.file_list_widget.addItem(path)
+                if path not in self.file_index:
+                    self._add_list_item(path)
 
     def set_destination_folder(self, folder):
         """Set the destination project folder"""
@@ -1397,6 +1839,7 @@ class FileClassifierApp(QMainWindow):
     def clear_list(self):
         """Clear all items from the selected files list"""
         self.file_list_widget.clear()
+        self.file_index.clear()
 
     def get_selected_results(self):
         """Return list of (src, dst) for checked rows in results table"""
@@ -1442,7 +1885,7 @@ class FileClassifierApp(QMainWindow):
                 files_str = "\n".join(file_lines)
                 # project structure context
                 if os.path.isdir(project_root):
-                    proj_struct = self.get_folder_structure(project_root, max_depth=6)
+                    proj_struct = self.structure_cache.get(project_root, 6).text
                 else:
                     proj_struct = '(Project folder not accessible)'
                 with open(os.path.join(os.path.dirname(__file__), 'prompt_refine.md'), 'r', encoding='utf-8') as f:
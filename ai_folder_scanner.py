@@ -1,52 +1,168 @@
 import os
-import re
-import json
 import threading
 import time
-from queue import Queue
-from tkinter import Tk, filedialog, Text, Button, Label, END, Scrollbar, RIGHT, Y, LEFT, BOTH, Frame, messagebox, StringVar, OptionMenu
+from tkinter import Tk, filedialog, Text, Button, Label, END, Scrollbar, RIGHT, Y, LEFT, BOTH, Frame, messagebox, StringVar, OptionMenu, IntVar, Spinbox, BooleanVar, Checkbutton
 from tkinterdnd2 import DND_FILES, TkinterDnD
 from tkinter import simpledialog
 from tqdm import tqdm
+from scan_engine import WorkStealingScanner, ScanProgress, ScanCountCache, default_scan_workers
+from scan_index import ScanIndex, KIND_FILE, KIND_DIR
+from scan_watcher import FolderWatcher
+from scan_store import ScanStore, KIND_SEQUENCE
+from sequence_engine import group_names
+from scan_export import NdjsonWriter, JsonArrayWriter, ExternalSorter, merge_export, record_key
 
-# --- Sequence detection regex ---
-SEQUENCE_REGEX = re.compile(r'^(.*?)(\d+)(\.[^.]*)$')
+JSON_OUTPUT = "ai_folder_structure.json"
+NDJSON_OUTPUT = "ai_folder_structure.ndjson"
+
+# --- Sequence grouping ---
+def group_sequences(rows):
+    """Collapse the numbered frames of one directory; rows are (name, kind) pairs.
+
+    Each sequence becomes a single (prefix####.ext, KIND_SEQUENCE, Sequence)
+    row after the remaining entries.
+    """
+    grouped = [row for row in rows if row[1] == KIND_DIR]
+    kinds = {name: kind for name, kind in rows if kind != KIND_DIR}
+    singles, sequences = group_names(kinds)
+    grouped.extend((name, kinds[name]) for name in singles)
+    grouped.extend((seq.key, KIND_SEQUENCE, seq) for seq in sequences)
+    return grouped
+
+def make_record(dir_path, row):
+    """Export record for a grouped row; sequences carry their frame range, count and gaps"""
+    record = {'Path': os.path.join(dir_path, row[0]), 'File': row[0]}
+    if row[1] == KIND_SEQUENCE:
+        record.update(row[2].to_dict())
+    return record
+
+def _entry_rows(entries):
+    return [(entry.name, KIND_DIR if entry.is_dir(follow_symlinks=False) else KIND_FILE) for entry in entries]
 
 # --- Spanning tree scan for large directories ---
-def scan_folders_spanning_tree(folders, progress_callback=None):
-    results = []
-    sequence_map = set()
-    q = Queue()
+def _scan_folders(folders, on_dir, progress_callback=None, workers=None, progress=None):
+    """Walk folders with a pool of work-stealing workers, calling on_dir(dir_path, grouped_rows) per directory"""
+    lock = threading.Lock()
+    count = [0]
+
+    def visit(current, entries):
+        rows = _entry_rows(entries)
+        subdirs = sum(1 for _, kind in rows if kind == KIND_DIR)
+        on_dir(current, group_sequences(rows))
+        with lock:
+            count[0] += len(entries)
+            if progress is not None:
+                progress.dir_done(subdirs, len(entries))
+            # Progress is reported once per directory to keep the workers off the UI
+            if progress_callback and entries:
+                progress_callback(entries[-1].path, count[0])
+
+    WorkStealingScanner(workers=workers).scan(folders, visit)
+
+def scan_folders_streaming(folders, on_records, progress_callback=None, workers=None, progress=None):
+    """Scan folders with a pool of work-stealing workers and hand each directory's records to on_records.
+
+    Sequences are collapsed per directory, so a directory's records are final
+    as soon as it is listed and nothing has to be held until the scan ends.
+    on_records(records) runs on the worker threads and must be thread-safe.
+    If a ScanProgress is given it is updated once per directory, before progress_callback runs.
+    """
+    def on_dir(current, rows):
+        on_records([make_record(current, row) for row in rows])
+    _scan_folders(folders, on_dir, progress_callback, workers=workers, progress=progress)
+
+def scan_folders_store(folders, progress_callback=None, workers=None, progress=None):
+    """Scan folders into a compact ScanStore, collapsing frame sequences"""
+    store = ScanStore()
     for folder in folders:
-        q.put(folder)
-    count = 0
-    while not q.empty():
-        current = q.get()
-        try:
-            with os.scandir(current) as it:
-                for entry in it:
-                    count += 1
-                    if progress_callback:
-                        progress_callback(entry.path, count)
-                    if entry.is_dir(follow_symlinks=False):
-                        results.append({'Path': entry.path, 'File': entry.name})
-                        q.put(entry.path)
-                    else:
-                        m = SEQUENCE_REGEX.match(entry.name)
-                        if m:
-                            prefix, digits, ext = m.groups()
-                            seq_key = f"{prefix}####{ext}"
-                            seq_path = os.path.join(os.path.dirname(entry.path), seq_key)
-                            sequence_map.add((seq_path, seq_key))
-                        else:
-                            results.append({'Path': entry.path, 'File': entry.name})
-        except Exception as e:
-            pass  # Ignore permission errors etc.
-    # Add sequence entries
-    for seq_path, seq_key in sequence_map:
-        results.append({'Path': seq_path, 'File': seq_key})
+        store.add_root(folder)
+    _scan_folders(folders, store.add_entries, progress_callback, workers=workers, progress=progress)
+    store.freeze()
+    return store
+
+def scan_folders_spanning_tree(folders, progress_callback=None, workers=None, progress=None):
+    """Scan folders with a pool of work-stealing workers, collapsing frame sequences"""
+    results = []
+    scan_folders_streaming(folders, results.extend, progress_callback, workers=workers, progress=progress)
     return results
 
+# --- Incremental scan through the persistent index ---
+def iter_indexed_dirs(folders, index, recursive=True):
+    """Yield (dir_path, grouped_rows) for every directory indexed under folders (or for folders only)"""
+    current, rows = None, []
+    for dir_path, name, kind, _, _ in index.iter_entries(folders, recursive=recursive):
+        if dir_path != current:
+            if rows:
+                yield current, group_sequences(rows)
+            current, rows = dir_path, []
+        rows.append((name, kind))
+    if rows:
+        yield current, group_sequences(rows)
+
+def iter_indexed_records(folders, index):
+    """Yield the records of everything indexed under folders, one directory at a time"""
+    for dir_path, rows in iter_indexed_dirs(folders, index):
+        yield [make_record(dir_path, row) for row in rows]
+
+def update_index(folders, index, progress_callback=None, workers=None, progress=None):
+    """Bring the index up to date for folders, reporting progress like the full scan"""
+    count = [0]
+    def on_dir(path, dir_progress):
+        count[0] += 1
+        if progress_callback:
+            progress_callback(path, dir_progress.entries if dir_progress is not None else count[0])
+    return index.update(folders, workers=workers, progress=progress, progress_callback=on_dir)
+
+def scan_folders_indexed_store(folders, progress_callback=None, workers=None, progress=None, index=None):
+    """Same store as scan_folders_store, but only directories whose mtime changed are re-listed"""
+    own_index = index is None
+    if own_index:
+        index = ScanIndex()
+    try:
+        update_index(folders, index, progress_callback, workers=workers, progress=progress)
+        store = ScanStore()
+        for folder in folders:
+            store.add_root(os.path.abspath(folder))
+        for dir_path, rows in iter_indexed_dirs(folders, index):
+            store.add_entries(dir_path, rows)
+        store.freeze()
+        return store
+    finally:
+        if own_index:
+            index.close()
+
+def scan_folders_indexed(folders, progress_callback=None, workers=None, progress=None, index=None):
+    """Same records as scan_folders_spanning_tree, but only directories whose mtime changed are re-listed"""
+    store = scan_folders_indexed_store(folders, progress_callback, workers=workers, progress=progress, index=index)
+    return list(store.iter_records())
+
+def update_export(path, changes, index=None):
+    """Apply one FolderWatcher changes dict to the export at path and return the entry count.
+
+    Only the directories the batch touched are re-listed through the index.
+    Their records, and everything under deleted or new folders, are replaced
+    in one streaming pass over the export; the rest is copied as it is.
+    """
+    own_index = index is None
+    if own_index:
+        index = ScanIndex()
+    sorter = ExternalSorter(key=record_key)
+    try:
+        dirs = index.update_changes(changes)
+        trees = tuple(os.path.join(os.path.abspath(d), '') for d in changes['created_dirs'] + changes['deleted_dirs'])
+        def drop(record):
+            record_path = os.path.abspath(record['Path'])
+            return os.path.dirname(record_path) in dirs or record_path.startswith(trees)
+        for dir_path, rows in iter_indexed_dirs(dirs, index, recursive=False):
+            sorter.add_many([make_record(dir_path, row) for row in rows])
+        for dir_records in iter_indexed_records(changes['created_dirs'], index):
+            sorter.add_many(dir_records)
+        return merge_export(path, sorter.sorted_records(), drop=drop)
+    finally:
+        sorter.cleanup()
+        if own_index:
+            index.close()
+
 # --- UI ---
 class FolderScannerApp:
     def __init__(self, master):
@@ -89,6 +205,28 @@ class FolderScannerApp:
         self.save_mode_dropdown = OptionMenu(self.button_frame, self.save_mode_var, "overwrite", "append")
         self.save_mode_dropdown.config(bg=btn_bg, fg=btn_fg, activebackground="#666666", activeforeground=fg, highlightbackground=bg)
         self.save_mode_dropdown.pack(side="left", padx=10, pady=5)
+        # Export format: one JSON array, or NDJSON streamed while scanning (optionally sorted by Path)
+        self.export_format_var = StringVar(value="json")
+        self.export_format_dropdown = OptionMenu(self.button_frame, self.export_format_var, "json", "ndjson", "ndjson (sorted)")
+        self.export_format_dropdown.config(bg=btn_bg, fg=btn_fg, activebackground="#666666", activeforeground=fg, highlightbackground=bg)
+        self.export_format_dropdown.pack(side="left", padx=10, pady=5)
+        # Full walk or incremental rescan through the persistent scan index
+        self.scan_mode_var = StringVar(value="incremental")
+        self.scan_mode_dropdown = OptionMenu(self.button_frame, self.scan_mode_var, "incremental", "full")
+        self.scan_mode_dropdown.config(bg=btn_bg, fg=btn_fg, activebackground="#666666", activeforeground=fg, highlightbackground=bg)
+        self.scan_mode_dropdown.pack(side="left", padx=10, pady=5)
+        # Scan concurrency (tune per mount: NAS shares like more workers than local disks)
+        self.workers_label = Label(self.button_frame, text="Workers:", bg=bg, fg=fg)
+        self.workers_label.pack(side="left", padx=(10, 0), pady=5)
+        self.workers_var = IntVar(value=default_scan_workers())
+        self.workers_spin = Spinbox(self.button_frame, from_=1, to=128, width=4, textvariable=self.workers_var, bg=entry_bg, fg=fg, buttonbackground=btn_bg, insertbackground=fg)
+        self.workers_spin.pack(side="left", padx=(2, 10), pady=5)
+        # Watch mode: after a scan, apply new/deleted/renamed files incrementally
+        self.watch_var = BooleanVar(value=False)
+        self.watch_check = Checkbutton(self.button_frame, text="Watch", variable=self.watch_var, command=self.on_watch_toggled, bg=bg, fg=fg, selectcolor=entry_bg, activebackground=bg, activeforeground=fg)
+        self.watch_check.pack(side="left", padx=10, pady=5)
+        self.watcher = None
+        self.watch_folders = set()
         # Progress bar below buttons
         self.progress_var = 0
         self.progress_bar = Frame(self.frame, bg="#444444", height=20)
@@ -146,40 +284,32 @@ class FolderScannerApp:
             return
         # Use dropdown value for append/overwrite
         self.append_mode = (self.save_mode_var.get().strip().lower() == 'append')
-        self.update_progress(0, "Counting items...")
+        self.incremental_mode = (self.scan_mode_var.get().strip().lower() == 'incremental')
+        self.watch_mode = bool(self.watch_var.get())
+        self.export_format = self.export_format_var.get().strip().lower()
+        try:
+            self.scan_workers = max(1, int(self.workers_var.get()))
+        except Exception:
+            self.scan_workers = default_scan_workers()
+        self.update_progress(0, "Scanning...")
         self.frame.update()
         threading.Thread(target=self.scan_and_export_with_count, daemon=True).start()
 
     def scan_and_export_with_count(self):
         start_time = time.time()
-        # Count total items for progress bar in background using BFS queue
-        from queue import Queue
-        total_count = [0]
-        def count_items_bfs(folders):
-            q = Queue()
-            for folder in folders:
-                q.put(folder)
-            while not q.empty():
-                current = q.get()
-                try:
-                    with os.scandir(current) as it:
-                        for entry in it:
-                            total_count[0] += 1
-                            if total_count[0] % 100 == 0:
-                                self.update_progress(0, f"Counting: {total_count[0]} items...")
-                            if entry.is_dir(follow_symlinks=False):
-                                q.put(entry.path)
-                except Exception:
-                    pass
-        count_items_bfs(self.folders)
+        # Single pass: the total is estimated while scanning, seeded with the
+        # counts recorded for the previous scan of the same folders
+        folders = list(self.folders)
+        counts = ScanCountCache()
+        progress = ScanProgress(roots=len(folders), cached=counts.get(folders))
         scanned = [0]
         def progress_callback(path, count):
             scanned[0] = count
-            percent = min(1.0, scanned[0] / max(1, total_count[0]))
+            percent = progress.fraction()
             # Layout: left: 'Scanning', center: filename, right: count
             bar_width = self.progress_bar.winfo_width() or 1
             left_text = "Scanning"
-            right_text = f"{scanned[0]:>7} / {total_count[0]:<7} files"
+            right_text = f"{scanned[0]:>7} / ~{progress.estimated_entries():<7} files"
             base_name = os.path.basename(path)
             max_name_len = 32
             if len(base_name) > max_name_len:
@@ -209,25 +339,118 @@ class FolderScannerApp:
             else:
                 self.progress_right.config(text=right_text)
             self.update_progress(percent, "")
-        results = scan_folders_spanning_tree(list(self.folders), progress_callback)
-        results = sorted(results, key=lambda x: x['Path'])
+        total, output_path = self.run_export(folders, progress_callback, progress)
+        counts.set(folders, progress.summary())
+        elapsed = time.time() - start_time
+        self.update_progress(1.0, f"Done. {total} entries saved to {output_path}.")
+        if getattr(self, 'watch_mode', False):
+            self.start_watching(folders)
+        messagebox.showinfo("Done", f"Scan complete. {total} entries saved to {output_path}.\nElapsed time: {elapsed:.2f} seconds.")
+
+    def run_export(self, folders, progress_callback=None, progress=None, incremental=None):
+        """Scan folders and export them in the selected format; returns (entry count, output path)"""
+        export_format = getattr(self, 'export_format', 'json')
+        workers = getattr(self, 'scan_workers', None)
+        if incremental is None:
+            incremental = getattr(self, 'incremental_mode', False)
+        if export_format.startswith('ndjson'):
+            total = self.export_ndjson(folders, sort=(export_format == 'ndjson (sorted)'), progress_callback=progress_callback, progress=progress, incremental=incremental)
+            return total, NDJSON_OUTPUT
+        if incremental:
+            store = scan_folders_indexed_store(folders, progress_callback, workers=workers, progress=progress)
+        else:
+            store = scan_folders_store(folders, progress_callback, workers=workers, progress=progress)
+        return self.export_results(store), JSON_OUTPUT
+
+    def export_results(self, results):
+        """Write results (a ScanStore or a list of records) to ai_folder_structure.json and return the entry count"""
+        if isinstance(results, ScanStore):
+            sorted_records = results.iter_sorted_records
+        else:
+            ordered = sorted(results, key=record_key)
+            sorted_records = lambda: iter(ordered)
         # Append or overwrite logic
-        output_path = "ai_folder_structure.json"
+        output_path = JSON_OUTPUT
         if getattr(self, 'append_mode', False) and os.path.exists(output_path):
             try:
-                with open(output_path, "r", encoding="utf-8") as f:
-                    existing = json.load(f)
-                # Avoid duplicates by using a set of (Path, File)
-                existing_set = set((item['Path'], item['File']) for item in existing)
-                new_results = [item for item in results if (item['Path'], item['File']) not in existing_set]
-                results = existing + new_results
+                # Streamed merge with the existing export, dropping duplicate (Path, File) pairs
+                return merge_export(output_path, sorted_records())
             except Exception:
                 pass  # If error, just use new results
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-        elapsed = time.time() - start_time
-        self.update_progress(1.0, f"Done. {len(results)} entries saved to ai_folder_structure.json.")
-        messagebox.showinfo("Done", f"Scan complete. {len(results)} entries saved to ai_folder_structure.json.\nElapsed time: {elapsed:.2f} seconds.")
+        with JsonArrayWriter(output_path) as writer:
+            for record in sorted_records():
+                writer.write(record)
+        return writer.count
+
+    def export_ndjson(self, folders, sort=False, progress_callback=None, progress=None, incremental=False):
+        """Stream records to ai_folder_structure.ndjson as directories complete and return the entry count.
+
+        Memory stays flat regardless of the archive size. With sort, records go
+        through an external merge sort and come out ordered by Path.
+        """
+        output_path = NDJSON_OUTPUT
+        appending = getattr(self, 'append_mode', False) and os.path.exists(output_path)
+        # Appending always sorts the new records so they merge with the export in one pass
+        sorter = ExternalSorter(key=record_key) if sort or appending else None
+        writer = None if appending else NdjsonWriter(output_path)
+        sink = sorter.add_many if sorter else writer.write_many
+        workers = getattr(self, 'scan_workers', None)
+        try:
+            if incremental:
+                index = ScanIndex()
+                try:
+                    update_index(folders, index, progress_callback, workers=workers, progress=progress)
+                    for dir_records in iter_indexed_records(folders, index):
+                        sink(dir_records)
+                finally:
+                    index.close()
+            else:
+                scan_folders_streaming(folders, sink, progress_callback, workers=workers, progress=progress)
+            if appending:
+                return merge_export(output_path, sorter.sorted_records())
+            if sorter:
+                for record in sorter.sorted_records():
+                    writer.write(record)
+        except Exception:
+            if writer:
+                writer.abort()
+            if sorter:
+                sorter.cleanup()
+            raise
+        writer.close()
+        return writer.count
+
+    # --- Watch mode ---
+    def start_watching(self, folders):
+        """Keep the index and export up to date as files land in the scanned folders"""
+        if self.watcher is None:
+            self.watcher = FolderWatcher(self.on_watch_changes, debounce=2.0)
+        modes = [self.watcher.add_root(folder) for folder in folders]
+        self.watch_folders.update(folders)
+        self.update_progress(1.0, f"Watching {len(self.watch_folders)} folder(s) ({', '.join(sorted(set(modes)))}).")
+
+    def stop_watching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.watch_folders.clear()
+
+    def on_watch_changes(self, changes):
+        # Runs on the watcher thread; one coalesced batch per burst of events.
+        # Only the directories it touched are re-listed and rewritten in the export.
+        added = len(changes['created']) + len(changes['created_dirs'])
+        removed = len(changes['deleted']) + len(changes['deleted_dirs'])
+        output_path = NDJSON_OUTPUT if getattr(self, 'export_format', 'json').startswith('ndjson') else JSON_OUTPUT
+        if os.path.exists(output_path):
+            total = update_export(output_path, changes)
+        else:
+            total, _ = self.run_export(list(self.watch_folders), incremental=True)
+        # Tk widgets are only touched from the main loop
+        self.master.after(0, self.update_progress, 1.0, f"Updated: +{added} / -{removed} changes, {total} entries saved.")
+
+    def on_watch_toggled(self):
+        if not self.watch_var.get():
+            self.stop_watching()
 
 if __name__ == "__main__":
     try:
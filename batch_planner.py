@@ -0,0 +1,104 @@
+# batch_planner.py
+import threading
+
+from structure_cache import estimate_tokens
+
+# (context window, output budget) in tokens assumed per provider; the context
+# can be overridden in the UI when a model is known to take more
+PROVIDER_BUDGETS = {
+    'Ollama': (4096, 2048),  # Ollama's default num_ctx, shared by prompt and answer
+    'LM Studio': (8192, 4000),  # LMStudioLLM asks for max_tokens=4000
+    'OpenRouter': (32768, 4000),  # OpenRouterLLM asks for max_tokens=4000
+    'Mistral': (32768, 4096),
+}
+DEFAULT_BUDGET = (8192, 2048)
+
+# Answer tokens per file beyond its name: the quoted folder path and JSON punctuation
+ANSWER_OVERHEAD_TOKENS = 16
+
+
+def file_tokens(name):
+    """(prompt tokens, answer tokens) one file name costs in a batch"""
+    tokens = estimate_tokens(name)
+    return tokens + 1, tokens + ANSWER_OVERHEAD_TOKENS
+
+
+def request_tokens(prompt, names):
+    """Tokens a request is expected to use: its prompt and the JSON answer for names"""
+    return estimate_tokens(prompt) + sum(file_tokens(name)[1] for name in names)
+
+
+class BatchPlanner:
+    """Packs file names into batches sized by tokens instead of a fixed file count.
+
+    A batch takes files while the prompt (template, project structure and
+    the names so far) fits the context window minus the answer budget, and
+    the expected JSON answer fits the output budget. Both budgets are scaled
+    by a factor that shrinks when a batch comes back truncated or slower
+    than target_latency and recovers after clean batches, so later batches
+    follow what the model actually managed. Batches are planned one at a
+    time; record() may be called from several threads.
+    """
+
+    MIN_SCALE = 0.1
+
+    def __init__(self, context_tokens, output_tokens, max_files=None, target_latency=45.0):
+        self.context_tokens = context_tokens
+        self.output_tokens = min(output_tokens, context_tokens // 2)
+        self.max_files = max_files
+        self.target_latency = target_latency
+        self.scale = 1.0
+        self.batches = 0
+        self.truncated = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_provider(cls, provider, context_tokens=None, max_files=None):
+        """Planner with the provider's budget; context_tokens overrides its context window"""
+        context, output = PROVIDER_BUDGETS.get(provider, DEFAULT_BUDGET)
+        return cls(context_tokens or context, output, max_files=max_files)
+
+    def next_batch(self, names, start, fixed_tokens):
+        """End index of the batch that starts at names[start]; always at least one file"""
+        with self._lock:
+            scale = self.scale
+        prompt_budget = (self.context_tokens - self.output_tokens) * scale - fixed_tokens
+        answer_budget = self.output_tokens * scale
+        prompt = answer = 0
+        end = start
+        while end < len(names):
+            if self.max_files and end - start >= self.max_files:
+                break
+            cost_in, cost_out = file_tokens(names[end])
+            if end > start and (prompt + cost_in > prompt_budget or answer + cost_out > answer_budget):
+                break
+            prompt += cost_in
+            answer += cost_out
+            end += 1
+        return end
+
+    def plan(self, names, fixed_tokens):
+        """Split names into batches at the current scale"""
+        batches = []
+        start = 0
+        while start < len(names):
+            end = self.next_batch(names, start, fixed_tokens)
+            batches.append(names[start:end])
+            start = end
+        return batches
+
+    def record(self, latency, truncated):
+        """Feed back one batch: shrink after a truncated or slow answer, grow back otherwise"""
+        with self._lock:
+            self.batches += 1
+            if truncated:
+                self.truncated += 1
+                self.scale = max(self.MIN_SCALE, self.scale * 0.7)
+            elif latency > self.target_latency:
+                self.scale = max(self.MIN_SCALE, self.scale * 0.85)
+            else:
+                self.scale = min(1.0, self.scale * 1.1)
+
+    @property
+    def truncation_rate(self):
+        return self.truncated / self.batches if self.batches else 0.0
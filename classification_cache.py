@@ -0,0 +1,133 @@
+# classification_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS classifications (
+    context TEXT NOT NULL,
+    name TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (context, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS classifications_used ON classifications(used_at);
+'''
+
+# SQLite limits the number of host parameters per statement
+_CHUNK = 500
+
+
+def text_hash(text):
+    return hashlib.blake2b(text.encode('utf-8', 'surrogateescape'), digest_size=16).hexdigest()
+
+
+def normalize_filename(name):
+    """Cache key for a file: its basename, Unicode-normalized and case-folded"""
+    return unicodedata.normalize('NFC', os.path.basename(name).strip()).casefold()
+
+
+class ClassificationCache:
+    """Persistent map from a classified filename to the destination folder the LLM chose.
+
+    A destination only holds for the prompt it came from, so entries are
+    keyed by a context (hash of the structure template, hash of the rendered
+    project structure, provider and model) plus the normalized filename.
+    Entries not used for max_age_days are dropped, and beyond max_entries the
+    least recently used go first. Safe to share between worker threads.
+    """
+
+    EVICT_EVERY = 1000
+
+    def __init__(self, db_path=None, max_entries=200000, max_age_days=90):
+        if db_path is None:
+            db_path = os.path.join(os.path.expanduser('~'), 'FIelOrganizer_classification_cache.db')
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.evict()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    @staticmethod
+    def context(template, project_structure, provider, model):
+        return '|'.join((text_hash(template), text_hash(project_structure), provider, model))
+
+    def get_many(self, context, names):
+        """Return {name: folder} for the names cached under context; the rest count as misses"""
+        keys = {}
+        for name in names:
+            keys.setdefault(normalize_filename(name), []).append(name)
+        found = {}
+        now = time.time()
+        with self._lock:
+            normalized = list(keys)
+            for i in range(0, len(normalized), _CHUNK):
+                chunk = normalized[i:i + _CHUNK]
+                rows = self.conn.execute(
+                    f'SELECT name, folder FROM classifications WHERE context = ? AND name IN ({",".join("?" * len(chunk))})',
+                    [context, *chunk]
+                ).fetchall()
+                for key, folder in rows:
+                    for name in keys[key]:
+                        found[name] = folder
+                if rows:
+                    self.conn.executemany('UPDATE classifications SET used_at = ? WHERE context = ? AND name = ?',
+                                          [(now, context, key) for key, _ in rows])
+            self.conn.commit()
+            self.hits += len(found)
+            self.misses += sum(len(v) for v in keys.values()) - len(found)
+        return found
+
+    def put_many(self, context, classification):
+        """Store {name: folder} pairs under context"""
+        now = time.time()
+        rows = [(context, normalize_filename(name), folder, now, now)
+                for name, folder in classification.items() if isinstance(folder, str)]
+        if not rows:
+            return
+        with self._lock:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO classifications (context, name, folder, created_at, used_at) VALUES (?, ?, ?, ?, ?)', rows)
+            self.conn.commit()
+            self._puts += len(rows)
+            evict = self._puts >= self.EVICT_EVERY
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop entries older than max_age_days, then the least recently used beyond max_entries"""
+        with self._lock:
+            self._puts = 0
+            if self.max_age_days:
+                self.conn.execute('DELETE FROM classifications WHERE used_at < ?', (time.time() - self.max_age_days * 86400,))
+            if self.max_entries:
+                # used_at of the max_entries-th most recent entry; everything used before it goes
+                row = self.conn.execute('SELECT used_at FROM classifications ORDER BY used_at DESC LIMIT 1 OFFSET ?',
+                                        (self.max_entries - 1,)).fetchone()
+                if row is not None:
+                    self.conn.execute('DELETE FROM classifications WHERE used_at < ?', row)
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute('DELETE FROM classifications')
+            self.conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM classifications').fetchone()[0]
@@ -0,0 +1,268 @@
+# endpoint_pool.py
+import re
+import time
+import threading
+
+from retry_policy import status_code
+
+
+def split_urls(text):
+    """Server URLs in a URL field: one, or several separated by commas, semicolons or spaces"""
+    return [url for url in re.split(r'[\s,;]+', text.strip()) if url]
+
+
+def is_node_failure(error):
+    """Whether the server itself failed (unreachable, timed out or a 5xx), so another server may answer"""
+    status = status_code(error)
+    return status is None or status >= 500
+
+
+class CircuitBreaker:
+    """Keeps requests away from a failing server.
+
+    After failure_threshold failures in a row the breaker opens and the
+    server gets no requests for cooldown seconds; then a single trial
+    request is let through (half-open), which closes the breaker on success
+    or opens it again on failure. Not thread-safe; EndpointPool locks it.
+    """
+
+    def __init__(self, failure_threshold=3, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0  # in a row
+        self.opened_at = None
+        self.opened = 0  # times opened, for the summary
+        self._trial = False
+
+    def state(self, now):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if now - self.opened_at >= self.cooldown else "open"
+
+    def available(self, now):
+        """Whether a request may be sent now"""
+        state = self.state(now)
+        return state == "closed" or (state == "half-open" and not self._trial)
+
+    def start(self, now):
+        if self.state(now) == "half-open":
+            self._trial = True
+
+    def abandon(self):
+        """The request was given up before it finished: neither success nor failure"""
+        self._trial = False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def failure(self, now):
+        self.failures += 1
+        self._trial = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.state(now) != "open":
+                self.opened += 1
+            self.opened_at = now
+
+
+class Endpoint:
+    """One server of an EndpointPool and what was observed of it"""
+
+    def __init__(self, llm, breaker):
+        self.llm = llm
+        self.url = llm.base_url
+        self.breaker = breaker
+        self.outstanding = 0
+        self.latency = None  # moving average of answer times, seconds
+        self.requests = 0
+        self.failures = 0
+        self.last_used = 0.0
+
+
+class EndpointPool:
+    """Several servers of one provider behind the provider wrappers' interface.
+
+    Each request goes to the server expected to answer first: by default
+    the one whose average answer time times its requests in flight (plus
+    this one) is lowest, so slower hosts get fewer batches; with
+    strategy="least_outstanding" simply the one with the fewest requests in
+    flight. Servers not yet measured are tried first, and ties go to the
+    least recently used. A request that fails because its server did
+    (connection lost, timeout, 5xx) is sent straight to the next server
+    instead of failing the batch; CircuitBreaker keeps the failed server
+    out until it answers a trial request again. Thread-safe, and usable
+    from an event loop.
+    """
+
+    LATENCY_SMOOTHING = 0.3
+
+    def __init__(self, llms, strategy="latency", failure_threshold=3, cooldown=30.0):
+        if not llms:
+            raise ValueError("EndpointPool needs at least one server")
+        self.endpoints = [Endpoint(llm, CircuitBreaker(failure_threshold, cooldown)) for llm in llms]
+        self.strategy = strategy
+        self.provider = llms[0].provider
+        self.model = llms[0].model
+        self._lock = threading.Lock()
+
+    def _score(self, endpoint):
+        latency = endpoint.latency or 0.0
+        if self.strategy == "least_outstanding":
+            return endpoint.outstanding, latency, endpoint.last_used
+        return (endpoint.outstanding + 1) * latency, endpoint.outstanding, endpoint.last_used
+
+    def _acquire(self, tried):
+        """Endpoint for the next request (not one of tried), or None when all were tried"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in tried]
+            if not candidates:
+                return None
+            available = [e for e in candidates if e.breaker.available(now)]
+            if available:
+                endpoint = min(available, key=self._score)
+            else:
+                # Every server left is ejected; probe the one ejected longest ago rather than fail outright
+                endpoint = min(candidates, key=lambda e: e.breaker.opened_at)
+            endpoint.breaker.start(now)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            endpoint.last_used = now
+            return endpoint
+
+    def _release(self, endpoint, started, error=None, abandoned=False):
+        now = time.monotonic()
+        with self._lock:
+            endpoint.outstanding -= 1
+            if abandoned:
+                endpoint.breaker.abandon()
+            elif error is None:
+                elapsed = now - started
+                endpoint.latency = elapsed if endpoint.latency is None else \
+                    endpoint.latency + self.LATENCY_SMOOTHING * (elapsed - endpoint.latency)
+                endpoint.breaker.success()
+            elif is_node_failure(error):
+                endpoint.failures += 1
+                endpoint.breaker.failure(now)
+            else:
+                # The server answered; the request itself was refused
+                endpoint.breaker.success()
+
+    def invoke(self, prompt):
+        tried = []
+        error = None  # the last server's failure, raised once every server was tried
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise error
+            started = time.monotonic()
+            try:
+                result = endpoint.llm.invoke(prompt)
+            except Exception as e:
+                self._release(endpoint, started, e)
+                if not is_node_failure(e):
+                    raise
+                error = e
+                tried.append(endpoint)
+                continue
+            self._release(endpoint, started)
+            return result
+
+    def stream(self, prompt):
+        """Yield the answer in chunks; a server failing before its first chunk is replaced by the next"""
+        tried = []
+        error = None
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise error
+            started = time.monotonic()
+            error = None
+            sent = False
+            upstream = endpoint.llm.stream(prompt)
+            try:
+                for chunk in upstream:
+                    sent = True
+                    yield chunk
+            except Exception as e:
+                error = e
+            except BaseException:
+                # The consumer stopped reading (GeneratorExit): the answer never finished, so nothing is recorded
+                upstream.close()
+                self._release(endpoint, started, abandoned=True)
+                raise
+            # Success only once the whole answer was read
+            self._release(endpoint, started, error)
+            if error is None:
+                return
+            # Part of an answer cannot be continued elsewhere; the caller's retry sends it again
+            if sent or not is_node_failure(error):
+                raise error
+            tried.append(endpoint)
+
+    async def ainvoke(self, prompt):
+        tried = []
+        error = None
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise error
+            started = time.monotonic()
+            try:
+                result = await endpoint.llm.ainvoke(prompt)
+            except Exception as e:
+                self._release(endpoint, started, e)
+                if not is_node_failure(e):
+                    raise
+                error = e
+                tried.append(endpoint)
+                continue
+            self._release(endpoint, started)
+            return result
+
+    async def astream(self, prompt):
+        """stream() on the running event loop"""
+        tried = []
+        error = None
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise error
+            started = time.monotonic()
+            error = None
+            sent = False
+            upstream = endpoint.llm.astream(prompt)
+            try:
+                async for chunk in upstream:
+                    sent = True
+                    yield chunk
+            except Exception as e:
+                error = e
+            except BaseException:
+                # Closed or cancelled before the end, as in stream()
+                self._release(endpoint, started, abandoned=True)
+                await upstream.aclose()
+                raise
+            self._release(endpoint, started, error)
+            if error is None:
+                return
+            if sent or not is_node_failure(error):
+                raise error
+            tried.append(endpoint)
+
+    def summary(self):
+        """Requests, failures, answer time and breaker state per server, for the log"""
+        now = time.monotonic()
+        lines = [f"{self.provider} endpoints ({self.strategy}):"]
+        with self._lock:
+            for e in self.endpoints:
+                latency = f"{e.latency:.1f}s" if e.latency is not None else "-"
+                lines.append(f"  {e.url}: {e.requests} requests, {e.failures} failed, avg {latency}, "
+                             f"{e.breaker.state(now)}, ejected {e.breaker.opened}x")
+        return "\n".join(lines)
+
+
+def pooled(llms, **kwargs):
+    """The one client, or an EndpointPool over several"""
+    return llms[0] if len(llms) == 1 else EndpointPool(llms, **kwargs)
@@ -0,0 +1,69 @@
+# file_index.py
+import os
+
+
+class FileIndex:
+    """Hash index over the files queued for classification.
+
+    Maps every basename to the full paths carrying it, and the full path of
+    a 'prefix####.ext' sequence entry to its SequenceManifest. A basename
+    shared by files in different directories keeps all of its paths, in the
+    order they were added, so callers see the ambiguity instead of silently
+    getting the first match. Adding, removing and looking up are O(1).
+    """
+
+    def __init__(self, paths=()):
+        self._by_name = {}  # basename -> {full path: None}, an insertion-ordered set
+        self._manifests = {}  # full path -> SequenceManifest, for sequence entries
+        for path in paths:
+            self.add(path)
+
+    def __len__(self):
+        return sum(len(paths) for paths in self._by_name.values())
+
+    def __contains__(self, path):
+        return path in self._by_name.get(os.path.basename(path), ())
+
+    def add(self, path, manifest=None):
+        self._by_name.setdefault(os.path.basename(path), {})[path] = None
+        if manifest is not None:
+            self._manifests[path] = manifest
+
+    def discard(self, path):
+        name = os.path.basename(path)
+        paths = self._by_name.get(name)
+        if paths is not None:
+            paths.pop(path, None)
+            if not paths:
+                del self._by_name[name]
+        self._manifests.pop(path, None)
+
+    def clear(self):
+        self._by_name.clear()
+        self._manifests.clear()
+
+    def paths(self, name):
+        """Full paths for name: itself if it is an indexed path, every path with that basename if it is a bare name"""
+        if os.path.dirname(name):
+            return [name] if name in self else []
+        return list(self._by_name.get(name, ()))
+
+    def manifest(self, name):
+        """SequenceManifest for a sequence path or key, or None if unknown or ambiguous"""
+        paths = self.paths(name)
+        if len(paths) != 1:
+            return None
+        return self._manifests.get(paths[0])
+
+    def duplicates(self):
+        """{basename: [paths]} for every basename shared by more than one file"""
+        return {name: list(paths) for name, paths in self._by_name.items() if len(paths) > 1}
+
+
+def resolve_name(name, *indexes):
+    """Full paths a classified name refers to, from the first index that knows it"""
+    for index in indexes:
+        paths = index.paths(name)
+        if paths:
+            return paths
+    return []
@@ -1,26 +1,48 @@
 import os
+import sys
 import json
 import argparse
 
-def scan_folder_structure(root_path):
+from scan_engine import WorkStealingScanner
+from scan_index import KIND_FILE, KIND_DIR, KIND_OTHER
+from scan_store import ScanStore, store_from_rows
+
+def _kind(entry):
+    try:
+        if entry.is_dir(follow_symlinks=False):
+            return KIND_DIR
+        if entry.is_file():
+            return KIND_FILE
+    except OSError:
+        pass
+    return KIND_OTHER
+
+def scan_folder_store(root_path, workers=None):
+    """
+    Scan the folder structure starting from root_path in parallel.
+    Returns a compact ScanStore of every entry.
     """
-    Recursively scan the folder structure starting from root_path.
+    store = ScanStore()
+    store.add_root(root_path)
+    def visit(current, entries):
+        store.add_entries(current, [(entry.name, _kind(entry)) for entry in entries])
+    WorkStealingScanner(workers=workers).scan([root_path], visit)
+    store.freeze()
+    return store
+
+def scan_folder_structure(root_path, workers=None):
+    """
+    Scan the folder structure starting from root_path.
     Returns a nested dict representing the folder structure.
     """
-    structure = {}
-    for entry in os.scandir(root_path):
-        if entry.is_dir():
-            structure[entry.name] = scan_folder_structure(entry.path)
-        elif entry.is_file():
-            if '__files__' not in structure:
-                structure['__files__'] = []
-            structure['__files__'].append(entry.name)
-    return structure
+    return scan_folder_store(root_path, workers=workers).nested_structure(root_path)
 
 def main():
     parser = argparse.ArgumentParser(description="Scan a folder and output its structure as JSON.")
     parser.add_argument('folder', help='Path to the folder to scan')
     parser.add_argument('-o', '--output', help='Output JSON file (default: print to stdout)')
+    parser.add_argument('--index', metavar='DB', help='Persistent scan index (SQLite); rescans only re-list directories whose mtime changed')
+    parser.add_argument('--workers', type=int, help='Parallel scan workers (default: 4 per CPU, at most 32)')
     args = parser.parse_args()
 
     folder = os.path.abspath(args.folder)
@@ -28,7 +50,19 @@ def main():
         print(f"Error: {folder} is not a valid directory.")
         return
 
-    structure = scan_folder_structure(folder)
+    if args.index:
+        from scan_index import ScanIndex
+        index = ScanIndex(args.index)
+        try:
+            stats = index.update([folder], workers=args.workers)
+            store = ScanStore()
+            store.add_root(folder)
+            structure = store_from_rows(index.iter_entries([folder]), store).nested_structure(folder)
+        finally:
+            index.close()
+        print(f"Index updated: {stats['listed']} directories re-listed, {stats['unchanged']} unchanged, {stats['removed']} removed", file=sys.stderr)
+    else:
+        structure = scan_folder_structure(folder, workers=args.workers)
     if args.output:
         with open(args.output, 'w', encoding='utf-8') as f:
             json.dump(structure, f, indent=2, ensure_ascii=False)
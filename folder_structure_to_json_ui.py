@@ -1,46 +1,67 @@
 import sys
 import os
 import json
-import concurrent.futures
+import threading
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLabel, QPushButton, QTextEdit, QFileDialog, QMessageBox
 )
-from PyQt5.QtCore import Qt, QMetaObject, Q_ARG
+from PyQt5.QtCore import QThread, pyqtSignal
+from scan_engine import WorkStealingScanner
 
-def scan_folder_structure(root_path, log_func=None):
-    structure = {}
-    try:
-        entries = list(os.scandir(root_path))
-    except Exception as e:
+def scan_folder_structure(root_path, log_func=None, workers=None):
+    """Scan the subfolders of root_path into a nested dict.
+
+    All directories are listed by one bounded pool of workers; the nested dict
+    is assembled once the walk is complete.
+    """
+    children = {}
+    lock = threading.Lock()
+
+    def visit(current, entries):
+        if log_func:
+            log_func(f"Scanning: {current}")
+        subfolders = [(entry.name, entry.path) for entry in entries if entry.is_dir(follow_symlinks=False)]
+        with lock:
+            children[current] = subfolders
+
+    def on_error(current, e):
         if log_func:
-            log_func(f"Error accessing {root_path}: {e}")
-        return structure
-    if log_func:
-        log_func(f"Scanning: {root_path}")
-    # Only collect subfolders
-    subfolders = [entry for entry in entries if entry.is_dir()]
-    # Use ThreadPoolExecutor for parallel scanning of subfolders
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future_to_name = {
-            executor.submit(scan_folder_structure, entry.path, log_func): entry.name
-            for entry in subfolders
-        }
-        for future in concurrent.futures.as_completed(future_to_name):
-            name = future_to_name[future]
-            try:
-                structure[name] = future.result()
-            except Exception as e:
-                if log_func:
-                    log_func(f"Error scanning {name}: {e}")
-                structure[name] = {}
+            log_func(f"Error accessing {current}: {e}")
+
+    WorkStealingScanner(workers=workers).scan([root_path], visit, on_error=on_error)
+
+    structure = {}
+    stack = [(root_path, structure)]
+    while stack:
+        path, node = stack.pop()
+        for name, child_path in sorted(children.get(path, [])):
+            node[name] = {}
+            stack.append((child_path, node[name]))
     return structure
 
+class FolderScanWorker(QThread):
+    log_message = pyqtSignal(str)
+    structure_ready = pyqtSignal(object)
+    error = pyqtSignal(str)
+
+    def __init__(self, folder):
+        super().__init__()
+        self.folder = folder
+
+    def run(self):
+        try:
+            structure = scan_folder_structure(self.folder, log_func=self.log_message.emit)
+            self.structure_ready.emit(structure)
+        except Exception as e:
+            self.error.emit(str(e))
+
 class FolderStructureUI(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Folder Structure to JSON")
         self.setGeometry(300, 300, 700, 500)
         self.setAcceptDrops(True)
+        self.worker = None
 
         layout = QVBoxLayout()
         layout.addWidget(QLabel("Drag and drop a folder here, or use the button below."))
@@ -78,31 +99,25 @@ class FolderStructureUI(QWidget):
             self.process_folder(folder)
 
     def process_folder(self, folder):
+        if self.worker is not None and self.worker.isRunning():
+            QMessageBox.information(self, "Scan in progress", "Please wait for the current scan to finish.")
+            return
         self.result_box.clear()
-        def log_func(msg):
-            # Ensure thread-safe append to QTextEdit
-            QMetaObject.invokeMethod(
-                self.result_box,
-                "append",
-                Qt.QueuedConnection,
-                Q_ARG(str, msg)
-            )
-        try:
-            structure = scan_folder_structure(folder, log_func=log_func)
-            QMetaObject.invokeMethod(
-                self.result_box,
-                "append",
-                Qt.QueuedConnection,
-                Q_ARG(str, "\n--- Folder Structure JSON ---\n")
-            )
-            QMetaObject.invokeMethod(
-                self.result_box,
-                "append",
-                Qt.QueuedConnection,
-                Q_ARG(str, json.dumps(structure, indent=2, ensure_ascii=False))
-            )
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to scan folder:\n{e}")
+        self.btn.setEnabled(False)
+        # Scan off the GUI thread; signals deliver log lines and the result back here
+        self.worker = FolderScanWorker(folder)
+        self.worker.log_message.connect(self.result_box.append)
+        self.worker.structure_ready.connect(self._on_structure_ready)
+        self.worker.error.connect(self._on_scan_error)
+        self.worker.finished.connect(lambda: self.btn.setEnabled(True))
+        self.worker.start()
+
+    def _on_structure_ready(self, structure):
+        self.result_box.append("\n--- Folder Structure JSON ---\n")
+        self.result_box.append(json.dumps(structure, indent=2, ensure_ascii=False))
+
+    def _on_scan_error(self, msg):
+        QMessageBox.critical(self, "Error", f"Failed to scan folder:\n{msg}")
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
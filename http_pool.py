@@ -0,0 +1,143 @@
+# http_pool.py
+import asyncio
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Async client for the providers' ainvoke/astream (optional - they fall back to a thread without it)
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+# (connect, read) seconds; the read timeout is the longest gap between bytes of the answer
+DEFAULT_TIMEOUT = (10, 120)
+DEFAULT_POOL_SIZE = 4
+
+_lock = threading.Lock()
+_sessions = {}  # endpoint (scheme://host:port) -> requests.Session
+_pool_size = DEFAULT_POOL_SIZE
+_retired = [0, 0]  # requests and connections of sessions dropped by set_pool_size
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {endpoint: httpx.AsyncClient}
+
+
+def _endpoint(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _pools(session):
+    """urllib3 connection pools behind a session's adapters"""
+    for adapter in set(session.adapters.values()):
+        manager = getattr(adapter, 'poolmanager', None)
+        if manager is None:
+            continue
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is not None:
+                yield pool
+
+
+def _counts(session):
+    sent = opened = 0
+    for pool in _pools(session):
+        sent += getattr(pool, 'num_requests', 0)
+        opened += getattr(pool, 'num_connections', 0)
+    return sent, opened
+
+
+def session_for(url):
+    """Keep-alive session shared by every client of url's endpoint.
+
+    Each endpoint gets one session whose pool keeps up to the configured
+    number of idle connections, so batches sent after the first reuse an
+    open TCP/TLS connection instead of handshaking again. Retries are left
+    to the caller (retry_policy).
+    """
+    endpoint = _endpoint(url)
+    with _lock:
+        session = _sessions.get(endpoint)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_pool_size, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[endpoint] = session
+        return session
+
+
+def set_pool_size(size):
+    """Connections kept open per endpoint; match it to the requests sent in parallel"""
+    global _pool_size
+    size = max(1, size)
+    with _lock:
+        if size == _pool_size:
+            return
+        _pool_size = size
+        # Sessions are recreated with the new size on their next use
+        for session in _sessions.values():
+            sent, opened = _counts(session)
+            _retired[0] += sent
+            _retired[1] += opened
+            session.close()
+        _sessions.clear()
+
+
+def stats():
+    """(requests sent, connections opened) over all endpoint sessions so far"""
+    with _lock:
+        sent, opened = _retired
+        for session in _sessions.values():
+            s, o = _counts(session)
+            sent += s
+            opened += o
+    return sent, opened
+
+
+def reuse_summary(since=(0, 0)):
+    """Connection reuse since an earlier stats() snapshot for the log, or None if nothing was sent"""
+    sent, opened = stats()
+    sent -= since[0]
+    opened -= since[1]
+    if sent <= 0:
+        return None
+    reused = max(0, sent - opened)
+    return f"HTTP: {sent} requests over {opened} new connections ({reused / sent:.0%} on a reused connection)"
+
+
+def httpx_timeout(timeout):
+    """httpx form of a requests (connect, read) timeout"""
+    if isinstance(timeout, tuple):
+        return httpx.Timeout(timeout[1], connect=timeout[0])
+    return timeout
+
+
+def async_client_for(url):
+    """httpx.AsyncClient shared by the running event loop's requests to url's endpoint.
+
+    An AsyncClient belongs to the loop it was first used on, so each loop
+    gets its own, with the same connection limit as the sessions above;
+    aclose_clients() closes them when the loop is done.
+    """
+    loop = asyncio.get_running_loop()
+    endpoint = _endpoint(url)
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(endpoint)
+        if client is None:
+            limits = httpx.Limits(max_connections=_pool_size, max_keepalive_connections=_pool_size)
+            client = httpx.AsyncClient(limits=limits, timeout=None)
+            clients[endpoint] = client
+        return client
+
+
+async def aclose_clients():
+    """Close the running event loop's async clients"""
+    with _lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
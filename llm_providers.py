@@ -0,0 +1,362 @@
+# llm_providers.py
+import re
+import time
+import asyncio
+import threading
+
+import requests
+
+import http_pool
+import rate_limiter
+from retry_policy import status_code, retry_after
+from llm_stream import iter_sse_content, iter_ndjson_content, aiter_sse_content, aiter_ndjson_content, CLASSIFICATION_SCHEMA
+
+# Seconds a local model stays loaded after its last request (Ollama keep_alive, LM Studio ttl),
+# so review pauses within a session do not unload it
+KEEP_ALIVE = 3600
+
+# A 400 whose body names these is a model refusing structured output, not a bad request
+_RESPONSE_FORMAT_ERROR = re.compile(r'response_format|json_schema|json schema', re.IGNORECASE)
+
+# Errors of the async client, reported like the blocking client's
+_ASYNC_HTTP_ERRORS = (http_pool.httpx.HTTPError,) if http_pool.HTTPX_AVAILABLE else ()
+
+
+class ProviderError(Exception):
+    """A provider request failed; status_code and retry_after (seconds) are set when the server gave them"""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RateLimitError(ProviderError):
+    """The provider throttled the request (429)"""
+
+
+def _provider_error(llm, error):
+    status = status_code(error)
+    cls = RateLimitError if status == 429 else ProviderError
+    return cls(f"{llm.provider} API Error: {error}", status, retry_after(error))
+
+
+def _observe(llm, response):
+    """Feed a response's status and rate-limit headers to the provider's rate limiter"""
+    rate_limiter.limiter_for(llm.provider, llm.model).observe(response.status_code, response.headers)
+
+
+def _rejects_response_format(data, response):
+    """Whether the server refused the request's response_format (the body of a 400 is read to tell)"""
+    return (response.status_code == 400 and "response_format" in data
+            and bool(_RESPONSE_FORMAT_ERROR.search(response.text)))
+
+
+def _post_chat(llm, prompt, stream=False):
+    """POST a chat completion for one of the wrappers below and return the checked response.
+
+    Requests go through the endpoint's pooled keep-alive session with the
+    wrapper's (connect, read) timeout. A model without structured output
+    rejects response_format with a 400 saying so; the request is then sent
+    once more without it, and the wrapper asks in plain text from then on.
+    Any other 400 (a prompt over the context length, a bad parameter) is
+    raised as it is.
+    """
+    headers, data = llm._request(prompt)
+    if stream:
+        data["stream"] = True
+    session = http_pool.session_for(llm.base_url)
+    response = session.post(llm.base_url, headers=headers, json=data, timeout=llm.timeout, stream=stream)
+    if _rejects_response_format(data, response):
+        response.close()
+        llm.json_mode = False
+        data.pop("response_format")
+        response = session.post(llm.base_url, headers=headers, json=data, timeout=llm.timeout, stream=stream)
+    _observe(llm, response)
+    response.raise_for_status()
+    return response
+
+
+async def _apost_chat(llm, prompt):
+    """_post_chat on the running event loop; returns the decoded JSON body"""
+    headers, data = llm._request(prompt)
+    client = http_pool.async_client_for(llm.base_url)
+    timeout = http_pool.httpx_timeout(llm.timeout)
+    response = await client.post(llm.base_url, headers=headers, json=data, timeout=timeout)
+    if _rejects_response_format(data, response):
+        llm.json_mode = False
+        data.pop("response_format")
+        response = await client.post(llm.base_url, headers=headers, json=data, timeout=timeout)
+    _observe(llm, response)
+    response.raise_for_status()
+    return response.json()
+
+
+async def _astream_chat(llm, prompt):
+    """Streamed _post_chat on the running event loop; yields the answer's text deltas"""
+    headers, data = llm._request(prompt)
+    data["stream"] = True
+    client = http_pool.async_client_for(llm.base_url)
+    timeout = http_pool.httpx_timeout(llm.timeout)
+    while True:
+        async with client.stream("POST", llm.base_url, headers=headers, json=data, timeout=timeout) as response:
+            if response.status_code == 400:
+                await response.aread()
+            if _rejects_response_format(data, response):
+                llm.json_mode = False
+                data.pop("response_format")
+                continue
+            _observe(llm, response)
+            response.raise_for_status()
+            async for text in llm._achunks(response):
+                yield text
+            return
+
+
+class ModelTimings:
+    """Model load and inference seconds Ollama reports with its answers, summed. Thread-safe."""
+
+    def __init__(self):
+        self.requests = 0
+        self.load = 0.0
+        self.inference = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        """Add the *_duration fields (nanoseconds) of one final answer object"""
+        with self._lock:
+            self.requests += 1
+            self.load += result.get("load_duration", 0) / 1e9
+            self.inference += (result.get("prompt_eval_duration", 0) + result.get("eval_duration", 0)) / 1e9
+
+
+class ChatLLM:
+    """Request plumbing shared by the provider wrappers.
+
+    A wrapper builds its request (_request) and reads its answer (_content
+    for a whole response, _chunks/_achunks for a stream); invoke/stream
+    block, ainvoke/astream run on an asyncio event loop. Without httpx the
+    async methods run the blocking ones on a thread. Failures are raised as
+    ProviderError (RateLimitError for a 429), and every response feeds the
+    provider's rate limiter.
+    """
+
+    provider = ""
+    _chunks = staticmethod(iter_sse_content)
+    _achunks = staticmethod(aiter_sse_content)
+
+    @staticmethod
+    def _content(result):
+        return result["choices"][0]["message"]["content"]
+
+    def invoke(self, prompt):
+        try:
+            return self._content(_post_chat(self, prompt).json())
+        except requests.exceptions.RequestException as e:
+            raise _provider_error(self, e)
+        except KeyError as e:
+            raise ProviderError(f"Unexpected response format from {self.provider}: {e}")
+
+    def stream(self, prompt):
+        """Yield the answer in chunks as the model generates it"""
+        try:
+            with _post_chat(self, prompt, stream=True) as response:
+                yield from self._chunks(response)
+        except requests.exceptions.RequestException as e:
+            raise _provider_error(self, e)
+
+    async def ainvoke(self, prompt):
+        if not http_pool.HTTPX_AVAILABLE:
+            return await asyncio.to_thread(self.invoke, prompt)
+        try:
+            return self._content(await _apost_chat(self, prompt))
+        except _ASYNC_HTTP_ERRORS as e:
+            raise _provider_error(self, e)
+        except KeyError as e:
+            raise ProviderError(f"Unexpected response format from {self.provider}: {e}")
+
+    async def astream(self, prompt):
+        """Yield the answer in chunks as the model generates it, on the running event loop"""
+        if not http_pool.HTTPX_AVAILABLE:
+            yield await self.ainvoke(prompt)
+            return
+        try:
+            async for text in _astream_chat(self, prompt):
+                yield text
+        except _ASYNC_HTTP_ERRORS as e:
+            raise _provider_error(self, e)
+
+
+class OpenRouterLLM(ChatLLM):
+    """Simple OpenRouter API wrapper for compatibility with Ollama interface"""
+
+    provider = "OpenRouter"
+
+    def __init__(self, model, api_key, json_mode=True, timeout=http_pool.DEFAULT_TIMEOUT):
+        self.model = model
+        self.api_key = api_key
+        # Ask for a JSON object answer (response_format) where the model supports it
+        self.json_mode = json_mode
+        self.timeout = timeout
+        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+
+    def _request(self, prompt):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://github.com/your-repo",  # Optional
+            "X-Title": "AI File Organizer"  # Optional
+        }
+
+        data = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.1,
+            "max_tokens": 4000
+        }
+        if self.json_mode:
+            data["response_format"] = {"type": "json_object"}
+        return headers, data
+
+
+# LM Studio API wrapper
+class LMStudioLLM(ChatLLM):
+    """LM Studio API wrapper for compatibility with Ollama/OpenRouter interface"""
+
+    provider = "LM Studio"
+
+    def __init__(self, model, base_url="http://localhost:1234/v1", json_mode=True, timeout=http_pool.DEFAULT_TIMEOUT,
+                 keep_alive=KEEP_ALIVE):
+        self.model = model
+        # LM Studio constrains the answer to a JSON schema (response_format json_schema)
+        self.json_mode = json_mode
+        self.timeout = timeout
+        # Idle seconds before LM Studio unloads a model it loaded on demand (ttl); None leaves its default
+        self.keep_alive = keep_alive
+        self.base_url = base_url.rstrip('/') + '/chat/completions'
+
+    def warm_up(self):
+        """Have LM Studio load the model now, with a one-token answer; returns the seconds it took"""
+        headers, data = self._request("Hi")
+        data["max_tokens"] = 1
+        data.pop("response_format", None)
+        started = time.monotonic()
+        response = http_pool.session_for(self.base_url).post(self.base_url, headers=headers, json=data, timeout=self.timeout)
+        response.raise_for_status()
+        return time.monotonic() - started
+
+    def _request(self, prompt):
+        headers = {
+            "Content-Type": "application/json"
+        }
+
+        data = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.1,
+            "max_tokens": 4000
+        }
+        if self.json_mode:
+            data["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "classification", "strict": True, "schema": CLASSIFICATION_SCHEMA}
+            }
+        if self.keep_alive is not None:
+            data["ttl"] = self.keep_alive
+        return headers, data
+
+
+class MistralLLM(ChatLLM):
+    """Simple Mistral API wrapper for compatibility with Ollama/OpenRouter interface"""
+
+    provider = "Mistral"
+
+    def __init__(self, model, api_key, json_mode=True, timeout=http_pool.DEFAULT_TIMEOUT):
+        self.model = model
+        self.api_key = api_key
+        # Mistral's JSON mode (response_format json_object)
+        self.json_mode = json_mode
+        self.timeout = timeout
+        self.base_url = "https://api.mistral.ai/v1/chat/completions"
+
+    def _request(self, prompt):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ]
+        }
+        if self.json_mode:
+            data["response_format"] = {"type": "json_object"}
+        return headers, data
+
+
+class OllamaAdapter(ChatLLM):
+    """Ollama's native /api/generate behind the same interface as the wrappers above.
+
+    Goes through the pooled sessions and async clients like the other
+    providers; format="json" constrains the answer to a JSON object. The
+    model load and inference times Ollama reports are summed in timings.
+    """
+
+    provider = "Ollama"
+
+    def __init__(self, model, base_url="http://localhost:11434", json_mode=True, timeout=http_pool.DEFAULT_TIMEOUT,
+                 keep_alive=KEEP_ALIVE):
+        self.model = model
+        self.json_mode = json_mode
+        self.timeout = timeout
+        # Seconds Ollama keeps the model loaded after a request; None leaves its default (5 minutes)
+        self.keep_alive = keep_alive
+        self.timings = ModelTimings()
+        self.base_url = base_url.rstrip('/') + '/api/generate'
+
+    def _chunks(self, response):
+        return iter_ndjson_content(response, on_done=self.timings.record)
+
+    def _achunks(self, response):
+        return aiter_ndjson_content(response, on_done=self.timings.record)
+
+    def _load(self, keep_alive, timeout):
+        """POST without a prompt: Ollama only loads (or, with keep_alive 0, unloads) the model"""
+        data = {"model": self.model, "stream": False, "keep_alive": keep_alive}
+        response = http_pool.session_for(self.base_url).post(self.base_url, json=data, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def warm_up(self):
+        """Load the model now and keep it loaded; returns the seconds Ollama spent loading it"""
+        keep_alive = self.keep_alive if self.keep_alive is not None else "5m"
+        return self._load(keep_alive, self.timeout).get("load_duration", 0) / 1e9
+
+    def release(self):
+        """Unload the model, freeing the GPU memory it holds; quick, as it runs while the app closes"""
+        self._load(0, (2, 10))
+
+    def _request(self, prompt):
+        headers = {
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,  # Ollama streams unless told otherwise
+            "options": {"temperature": 0.1}
+        }
+        if self.json_mode:
+            data["format"] = "json"
+        if self.keep_alive is not None:
+            data["keep_alive"] = self.keep_alive
+        return headers, data
+
+    def _content(self, result):
+        self.timings.record(result)
+        return result["response"]
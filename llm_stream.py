@@ -0,0 +1,264 @@
+# llm_stream.py
+import json
+
+# The answer the prompts ask for: {"filename": "folder", ...}, for providers that take a schema
+CLASSIFICATION_SCHEMA = {"type": "object", "additionalProperties": {"type": "string"}}
+
+
+class AnswerError(ValueError):
+    """The answer came back but holds nothing usable (no JSON object in it)"""
+
+
+def _decode_string(raw):
+    """Value of a JSON string body (the text between the quotes)"""
+    try:
+        return json.loads('"' + raw + '"', strict=False)
+    except ValueError:
+        return raw
+
+
+class JsonPairParser:
+    """Incremental parser for the flat {"filename": "folder", ...} object the prompts ask for.
+
+    feed() takes the answer as it streams in and returns the pairs completed
+    by that chunk. Text before the first '{' (prose, a ```json fence) and
+    after the object closes is ignored; values that are not strings are
+    skipped. Chunks may split the text anywhere, escapes included.
+    """
+
+    def __init__(self):
+        self.state = 'seek'
+        self.pairs = {}
+        self._chars = []
+        self._escape = False
+        self._key = None
+        self._depth = 0  # nesting inside a skipped object or array value
+        self._in_string = False  # inside a string of a skipped value
+
+    @property
+    def done(self):
+        return self.state == 'done'
+
+    def feed(self, text):
+        found = []
+        for ch in text:
+            state = self.state
+            if state == 'in_key' or state == 'in_value':
+                if self._escape:
+                    self._escape = False
+                    self._chars.append(ch)
+                elif ch == '\\':
+                    self._escape = True
+                    self._chars.append(ch)
+                elif ch == '"':
+                    value = _decode_string(''.join(self._chars))
+                    self._chars = []
+                    if state == 'in_key':
+                        self._key = value
+                        self.state = 'colon'
+                    else:
+                        self.pairs[self._key] = value
+                        found.append((self._key, value))
+                        self.state = 'comma'
+                else:
+                    self._chars.append(ch)
+            elif state == 'seek':
+                if ch == '{':
+                    self.state = 'key'
+            elif state == 'key':
+                if ch == '"':
+                    self.state = 'in_key'
+                elif ch == '}':
+                    self.state = 'done'
+            elif state == 'colon':
+                if ch == ':':
+                    self.state = 'value'
+            elif state == 'value':
+                if ch == '"':
+                    self.state = 'in_value'
+                elif ch in '{[':
+                    self._depth = 1
+                    self.state = 'skip'
+                elif not ch.isspace():
+                    self.state = 'comma'  # number, true/false/null: skipped up to the next separator
+            elif state == 'skip':
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif ch == '\\':
+                        self._escape = True
+                    elif ch == '"':
+                        self._in_string = False
+                elif ch == '"':
+                    self._in_string = True
+                elif ch in '{[':
+                    self._depth += 1
+                elif ch in '}]':
+                    self._depth -= 1
+                    if not self._depth:
+                        self.state = 'comma'
+            elif state == 'comma':
+                if ch == ',':
+                    self.state = 'key'
+                elif ch == '}':
+                    self.state = 'done'
+            else:
+                break
+        return found
+
+
+def _sse_delta(line):
+    """(finished, text) for one line of an OpenAI-compatible chat completion stream"""
+    if not line.startswith('data:'):
+        return False, None
+    data = line[5:].strip()
+    if data == '[DONE]':
+        return True, None
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return False, None
+    choices = event.get('choices') or []
+    return False, (choices[0].get('delta') or {}).get('content') if choices else None
+
+
+def _ndjson_delta(line):
+    """(finished, text) for one line of an Ollama /api/generate stream"""
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return False, None
+    return bool(event.get('done')), event.get('response')
+
+
+def iter_sse_content(response):
+    """Text deltas of an OpenAI-compatible chat completion streamed as server-sent events"""
+    for line in response.iter_lines():
+        # Decoded here: without a charset requests would read text/event-stream as Latin-1
+        line = line.decode('utf-8', 'replace') if isinstance(line, bytes) else line
+        finished, text = _sse_delta(line)
+        if text:
+            yield text
+        if finished:
+            break
+
+
+def iter_ndjson_content(response, on_done=None):
+    """Text deltas of an Ollama answer streamed as one JSON object per line; on_done gets the last object"""
+    for line in response.iter_lines():
+        line = line.decode('utf-8', 'replace') if isinstance(line, bytes) else line
+        finished, text = _ndjson_delta(line)
+        if text:
+            yield text
+        if finished:
+            if on_done is not None:
+                on_done(json.loads(line))
+            break
+
+
+async def aiter_sse_content(response):
+    """iter_sse_content for an httpx streaming response"""
+    async for line in response.aiter_lines():
+        finished, text = _sse_delta(line)
+        if text:
+            yield text
+        if finished:
+            break
+
+
+async def aiter_ndjson_content(response, on_done=None):
+    """iter_ndjson_content for an httpx streaming response"""
+    async for line in response.aiter_lines():
+        finished, text = _ndjson_delta(line)
+        if text:
+            yield text
+        if finished:
+            if on_done is not None:
+                on_done(json.loads(line))
+            break
+
+
+def stream_classification(llm, prompt, on_pair=None):
+    """Full answer of llm to prompt, calling on_pair(name, folder) as each pair of the JSON completes.
+
+    Uses llm.stream() (every provider wrapper has it); an LLM without one
+    is invoked as before and its pairs reported at the end.
+    """
+    stream = getattr(llm, 'stream', None)
+    chunks = stream(prompt) if stream is not None else [llm.invoke(prompt)]
+    parser = JsonPairParser()
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        if on_pair is not None and not parser.done:
+            for name, folder in parser.feed(chunk):
+                on_pair(name, folder)
+    return ''.join(parts)
+
+
+async def astream_classification(llm, prompt, on_pair=None):
+    """stream_classification on the running event loop, with llm.astream() or llm.ainvoke()"""
+    parser = JsonPairParser()
+    parts = []
+
+    def feed(chunk):
+        parts.append(chunk)
+        if on_pair is not None and not parser.done:
+            for name, folder in parser.feed(chunk):
+                on_pair(name, folder)
+
+    astream = getattr(llm, 'astream', None)
+    if astream is None:
+        feed(await llm.ainvoke(prompt))
+    else:
+        async for chunk in astream(prompt):
+            feed(chunk)
+    return ''.join(parts)
+
+
+def extract_json_object(text):
+    """First balanced {...} in text that decodes to a JSON object, found in one pass; None if there is none"""
+    start = None
+    depth = 0
+    in_string = escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            # Quotes only count inside a candidate object; prose outside may have stray ones
+            in_string = start is not None
+        elif ch == '{':
+            if start is None:
+                start = i
+            depth += 1
+        elif ch == '}' and start is not None:
+            depth -= 1
+            if not depth:
+                try:
+                    value = json.loads(text[start:i + 1], strict=False)
+                except ValueError:
+                    value = None
+                if isinstance(value, dict):
+                    return value
+                start = None
+    return None
+
+
+def parse_classification(text):
+    """{filename: folder} from an LLM answer, or None if it holds no JSON object.
+
+    Entries whose folder is not a string are dropped. An answer cut off
+    before its object closed still yields the pairs that were complete, so
+    only the names after the cut need asking again.
+    """
+    classification = extract_json_object(text)
+    if classification is None:
+        parser = JsonPairParser()
+        parser.feed(text)
+        return parser.pairs or None
+    return {name: folder for name, folder in classification.items() if isinstance(folder, str)}
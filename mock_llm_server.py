@@ -0,0 +1,255 @@
+# mock_llm_server.py
+"""
+Local stand-in for an LLM server, for testing the classifier without a model.
+
+Answers OpenAI-style chat completions (LM Studio, OpenRouter, Mistral) and
+Ollama's /api/generate, streamed or whole, by putting every file listed
+under the prompt's "Files to classify" line (or, without one, every line
+that looks like a file name) into /mock/<extension>.
+Latency, failures, a rate limit, model load time and a model without
+structured output or with a short context can be injected to exercise
+concurrency, retries, throttling, warm-up and the providers' fallbacks.
+
+    python mock_llm_server.py --port 1234 --latency 0.5 --failure-rate 0.1
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A line naming a file: something.ext, with no spaces around it
+FILE_LINE = re.compile(r'^\S.*\.[A-Za-z0-9]{1,6}$')
+
+
+def classify(prompt):
+    """{file name: folder} answer for the file names in a prompt"""
+    lines = prompt.splitlines()
+    for i, line in enumerate(lines):
+        if line.strip().lower().startswith('files to classify'):
+            # The list runs up to the next blank line
+            rest = lines[i + 1:]
+            lines = rest[:rest.index('')] if '' in rest else rest
+            break
+    names = [line.strip() for line in lines if FILE_LINE.match(line.strip())]
+    return {name: '/mock/' + (os.path.splitext(name)[1].lstrip('.').lower() or 'other') for name in names}
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer answering like an LLM provider.
+
+    latency: seconds before each answer; failure_rate: share of requests
+    answered with failure_status (and a Retry-After of retry_after
+    seconds); rate_limit: (requests, seconds) accepted per sliding window,
+    beyond which requests get a 429 with Retry-After and OpenAI-style
+    x-ratelimit headers; load_time: seconds the first request for a model
+    takes to load it (again after Ollama unloads it with keep_alive 0),
+    reported in Ollama's load_duration; structured_output=False answers
+    chat requests carrying a response_format with a 400 naming it;
+    context_length: prompt characters beyond which requests get a 400.
+    requests, throttled, loads and max_in_flight count what was received.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0, failure_rate=0.0, failure_status=503, retry_after=0, seed=None,
+                 rate_limit=None, load_time=0.0, structured_output=True, context_length=None):
+        super().__init__(address, MockLLMHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.rate_limit = rate_limit
+        self._accepted = deque()  # times of requests inside the rate limit window
+        self.load_time = load_time
+        self.loaded = set()  # models in memory
+        self.loads = 0
+        self.structured_output = structured_output
+        self.context_length = context_length
+        self.requests = 0
+        self.failures = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _rate_headers(self, now):
+        """(headers, seconds to wait or None) for one request under rate_limit; call with _lock held"""
+        count, seconds = self.rate_limit
+        while self._accepted and now - self._accepted[0] >= seconds:
+            self._accepted.popleft()
+        wait = None
+        if len(self._accepted) >= count:
+            wait = seconds - (now - self._accepted[0])
+        else:
+            self._accepted.append(now)
+        headers = {"x-ratelimit-limit-requests": str(int(count * 60 / seconds)),
+                   "x-ratelimit-remaining-requests": str(count - len(self._accepted)),
+                   "x-ratelimit-reset-requests": f"{seconds - (now - self._accepted[0]):.3f}s"}
+        return headers, wait
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_port}"
+
+    def start(self):
+        """Serve on a daemon thread and return self"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    _headers = {}  # rate limit headers for the current answer
+    _timings = {}  # Ollama's *_duration fields for the current answer
+
+    def do_GET(self):
+        self._headers = {}
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json({"data": [{"id": "mock-model"}]})
+        elif self.path.rstrip('/') == '/api/tags':
+            self._send_json({"models": [{"name": "mock-model"}]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b'{}')
+        server = self.server
+        self._headers = {}
+        wait = None
+        with server._lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            if server.rate_limit:
+                self._headers, wait = server._rate_headers(time.monotonic())
+                if wait is not None:
+                    server.throttled += 1
+            fail = wait is None and server.random.random() < server.failure_rate
+            if fail:
+                server.failures += 1
+            model = body.get("model", "")
+            unload = body.get("keep_alive") == 0
+            load = not fail and not unload and wait is None and model not in server.loaded
+            if unload:
+                server.loaded.discard(model)
+            elif load:
+                server.loaded.add(model)
+                server.loads += 1
+        try:
+            if wait is not None:
+                self._send_json({"error": "rate limited"}, status=429, headers={"Retry-After": f"{wait:.3f}"})
+                return
+            self._timings = {"load_duration": int(server.load_time * 1e9) if load else 0,
+                             "prompt_eval_duration": 0, "eval_duration": int(server.latency * 1e9)}
+            if load and server.load_time:
+                time.sleep(server.load_time)
+            if unload:
+                self._send_json({"model": model, "response": "", "done": True, "done_reason": "unload"})
+                return
+            if self.path.rstrip('/') == '/api/generate' and not body.get("prompt"):
+                # No prompt: Ollama just loads the model
+                self._send_json({"model": model, "response": "", "done": True, "done_reason": "load",
+                                 "load_duration": self._timings["load_duration"]})
+                return
+            prompt = body.get("prompt", "") + "\n".join(m.get("content", "") for m in body.get("messages", []))
+            if "response_format" in body and not server.structured_output:
+                self._send_json({"error": {"message": "This model does not support response_format json_schema"}}, status=400)
+                return
+            if server.context_length is not None and len(prompt) > server.context_length:
+                self._send_json({"error": {"message": f"The prompt exceeds the context length of {server.context_length}"}},
+                                status=400)
+                return
+            if server.latency:
+                time.sleep(server.latency)
+            if fail:
+                self._send_json({"error": "mock failure"}, status=server.failure_status,
+                                headers={"Retry-After": str(server.retry_after)})
+            elif self.path.rstrip('/').endswith('/chat/completions'):
+                prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+                self._answer(json.dumps(classify(prompt)), body.get("stream"), ollama=False)
+            elif self.path.rstrip('/') == '/api/generate':
+                # Ollama streams unless told otherwise
+                self._answer(json.dumps(classify(body.get("prompt", ""))), body.get("stream", True), ollama=True)
+            else:
+                self._send_json({"error": "not found"}, status=404)
+        finally:
+            with server._lock:
+                server.in_flight -= 1
+
+    def _answer(self, content, stream, ollama):
+        if not stream:
+            if ollama:
+                self._send_json({"response": content, "done": True, **self._timings})
+            else:
+                self._send_json({"choices": [{"message": {"role": "assistant", "content": content}}]})
+            return
+        # A few characters per chunk, like a model writing the answer
+        pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+        if ollama:
+            lines = [json.dumps({"response": p, "done": False}) + "\n" for p in pieces]
+            lines.append(json.dumps({"response": "", "done": True, **self._timings}) + "\n")
+            content_type = "application/x-ndjson"
+        else:
+            lines = [f"data: {json.dumps({'choices': [{'delta': {'content': p}}]})}\n\n" for p in pieces]
+            lines.append("data: [DONE]\n\n")
+            content_type = "text/event-stream"
+        payload = "".join(lines).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in self._headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, data, status=200, headers=None):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in {**self._headers, **(headers or {})}.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock LLM server for the AI File Organizer")
+    parser.add_argument("--port", type=int, default=1234, help="port to listen on (LM Studio's is 1234, Ollama's 11434)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each answer")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--failure-status", type=int, default=503, help="HTTP status of the injected errors")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the injected errors")
+    parser.add_argument("--requests-per-minute", type=int, default=None, help="answer requests beyond this rate with 429")
+    parser.add_argument("--load-time", type=float, default=0.0, help="seconds to load a model on its first request")
+    args = parser.parse_args()
+    server = MockLLMServer(("127.0.0.1", args.port), latency=args.latency, failure_rate=args.failure_rate,
+                           failure_status=args.failure_status, seed=args.seed,
+                           rate_limit=(args.requests_per_minute, 60) if args.requests_per_minute else None,
+                           load_time=args.load_time)
+    print(f"Mock LLM server on {server.url} (latency {args.latency}s, failure rate {args.failure_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
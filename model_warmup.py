@@ -0,0 +1,108 @@
+# model_warmup.py
+import time
+import threading
+
+from llm_providers import KEEP_ALIVE
+
+# Seconds a model must stay selected before it is loaded, so refilling the model list loads only the final pick
+WARM_UP_DELAY = 0.8
+
+# Seconds closing waits, in all, for the servers to unload the warmed models
+UNLOAD_DEADLINE = 2.0
+
+
+def clients(llm):
+    """The provider clients behind llm: an EndpointPool's servers, or llm itself"""
+    return [e.llm for e in llm.endpoints] if hasattr(llm, 'endpoints') else [llm]
+
+
+def timing_summary(llm):
+    """Seconds the servers spent loading the model versus answering, for the log, or None if not reported"""
+    timings = [c.timings for c in clients(llm) if getattr(c, 'timings', None) is not None and c.timings.requests]
+    if not timings:
+        return None
+    load = sum(t.load for t in timings)
+    inference = sum(t.inference for t in timings)
+    requests = sum(t.requests for t in timings)
+    return f"Model time: {load:.1f}s loading, {inference:.1f}s inference over {requests} requests"
+
+
+class ModelWarmer:
+    """Loads the selected local model ahead of the first batch and keeps it loaded.
+
+    warm() loads llm's model on each of its servers in the background, once
+    the selection has settled for WARM_UP_DELAY seconds, and logs how long
+    loading took. A model already warmed on a server within half its
+    KEEP_ALIVE is not loaded again. close() stops warming when the
+    application closes, and can unload what was warmed. log is called
+    from background threads. Thread-safe.
+    """
+
+    def __init__(self, log, delay=WARM_UP_DELAY):
+        self.log = log
+        self.delay = delay
+        self._warmed = {}  # (base_url, model) -> (client, monotonic time warmed)
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def warm(self, llm):
+        """Warm llm's model unless another one is picked within delay seconds"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self._warm_all, (clients(llm),))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _warm_all(self, targets):
+        # Servers load in parallel
+        for client in targets:
+            if hasattr(client, 'warm_up'):
+                threading.Thread(target=self._warm_one, args=(client,), daemon=True).start()
+
+    def _warm_one(self, client):
+        key = (client.base_url, client.model)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._warmed.get(key)
+            if entry is not None and now - entry[1] < KEEP_ALIVE / 2:
+                return
+            self._warmed[key] = (client, now)
+        try:
+            seconds = client.warm_up()
+        except Exception as e:
+            with self._lock:
+                self._warmed.pop(key, None)
+            self.log(f"Could not load {client.provider} model {client.model} at {client.base_url}: {e}")
+            return
+        self.log(f"{client.provider} model {client.model} ready at {client.base_url} (loaded in {seconds:.1f}s)")
+
+    def close(self, unload=False, deadline=UNLOAD_DEADLINE):
+        """Cancel a pending warm-up; with unload, also unload the models warmed here.
+
+        Unloading is opt-in, since a shared Ollama host may be serving the
+        model to others. The servers are asked in parallel on daemon threads,
+        waited for at most deadline seconds in all.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            warmed = []
+            if unload:
+                warmed = [client for client, _ in self._warmed.values()]
+                self._warmed.clear()
+        threads = [threading.Thread(target=self._release_one, args=(client,), daemon=True)
+                   for client in warmed if hasattr(client, 'release')]
+        for thread in threads:
+            thread.start()
+        end = time.monotonic() + deadline
+        for thread in threads:
+            thread.join(max(0.0, end - time.monotonic()))
+
+    @staticmethod
+    def _release_one(client):
+        try:
+            client.release()
+        except Exception:
+            pass  # the server may be gone already; it unloads the model after KEEP_ALIVE anyway
@@ -0,0 +1,257 @@
+# rate_limiter.py
+import re
+import time
+import asyncio
+import threading
+
+from retry_policy import parse_retry_after
+
+# (requests, tokens) per minute assumed per provider until its rate-limit headers tell
+# better; None is unlimited. Local servers are not limited.
+PROVIDER_LIMITS = {
+    'OpenRouter': (60, None),  # depends on the account and model; headers and 429s adjust it
+    'Mistral': (60, 500000),  # free tier: one request per second, 500k tokens per minute
+}
+
+# A bucket holds this many seconds of its rate, so requests go out evenly rather than in bursts
+BURST_SECONDS = 2.0
+
+# (limit, remaining, reset) headers per bucket: OpenAI-style names (LM Studio, OpenRouter on 429s) and Mistral's
+RATE_LIMIT_HEADERS = {
+    'requests': (('x-ratelimit-limit-requests', 'x-ratelimit-limit'),
+                 ('x-ratelimit-remaining-requests', 'x-ratelimit-remaining'),
+                 ('x-ratelimit-reset-requests', 'x-ratelimit-reset')),
+    'tokens': (('x-ratelimit-limit-tokens', 'x-ratelimitbysize-limit'),
+               ('x-ratelimit-remaining-tokens', 'x-ratelimitbysize-remaining'),
+               ('x-ratelimit-reset-tokens', 'x-ratelimitbysize-reset')),
+}
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+
+
+def parse_reset(value):
+    """Seconds until a rate limit resets: a duration ("1s", "6m0s", "20ms"), seconds, or an epoch time (s or ms)"""
+    if value is None:
+        return None
+    value = value.strip()
+    parts = _DURATION_PART.findall(value)
+    if parts and ''.join(n + u for n, u in parts) == value:
+        scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+        return sum(float(n) * scale[u] for n, u in parts)
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    if number > 1e11:  # epoch milliseconds
+        number /= 1000
+    if number > 1e9:  # epoch seconds
+        return max(0.0, number - time.time())
+    return max(0.0, number)
+
+
+def _header(headers, names):
+    for name in names:
+        if headers.get(name) is not None:
+            return headers.get(name)
+    return None
+
+
+def _int_header(headers, names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return int(float(value))
+            except ValueError:
+                pass
+    return None
+
+
+class TokenBucket:
+    """A rate of so many units per minute, reserved ahead.
+
+    A reservation may take the bucket below zero; the caller then waits
+    until it has refilled, so waiting requests go out in the order they
+    asked. Not thread-safe; RateLimiter locks it.
+    """
+
+    def __init__(self, per_minute):
+        self.limit = per_minute  # the provider's ceiling
+        self.per_minute = per_minute  # current rate, lowered after a 429
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def capacity(self):
+        return max(1.0, self.per_minute / 60 * BURST_SECONDS)
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """Seconds until amount is available, taking it now"""
+        self._refill(now)
+        self.level -= amount
+        return 0.0 if self.level >= 0 else -self.level * 60 / self.per_minute
+
+    def set_limit(self, per_minute, now):
+        self._refill(now)
+        self.limit = per_minute
+        self.per_minute = min(self.per_minute, per_minute)
+
+    def set_remaining(self, remaining, now):
+        """The server's count of what is left in its window caps what the bucket may hand out"""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+    def throttled(self, now):
+        """A 429 came back: the real ceiling is below the current rate"""
+        self._refill(now)
+        self.per_minute = max(1.0, self.per_minute * 0.75)
+        self.level = min(self.level, 0.0)
+
+    def recovered(self):
+        """An answer came back: creep back toward the ceiling"""
+        self.per_minute = min(self.limit, self.per_minute + self.limit * 0.02)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one provider and model. Thread-safe.
+
+    acquire() waits until a request of so many tokens may go out; observe()
+    reads each response's status and rate-limit headers. A 429 pauses
+    every request to the provider until its Retry-After (or the limit's
+    reset) and lowers the rate, which then recovers with each answer, so
+    the requests settle just under the provider's ceiling instead of
+    retrying into it together.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.configured = (requests_per_minute, tokens_per_minute)
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.paused_until = 0.0
+        self.throttled = 0  # 429s seen
+        self.waited = 0.0  # seconds requests spent waiting here
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        """Monotonic time the request may go out at"""
+        now = time.monotonic()
+        with self._lock:
+            wait = 0.0
+            if self.requests is not None:
+                wait = self.requests.reserve(1, now)
+            if self.tokens is not None and tokens:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            return max(now + wait, self.paused_until)
+
+    def _remaining(self, ready):
+        with self._lock:
+            return max(ready, self.paused_until) - time.monotonic()
+
+    def acquire(self, tokens=0, should_stop=None):
+        """Wait until a request of tokens may be sent; returns the seconds waited.
+
+        should_stop is polled while waiting; the wait then ends early.
+        """
+        ready = self._reserve(tokens)
+        started = time.monotonic()
+        while True:
+            remaining = self._remaining(ready)
+            if remaining <= 0 or (should_stop and should_stop()):
+                break
+            time.sleep(min(0.2, remaining))
+        return self._waited(started)
+
+    async def aacquire(self, tokens=0, should_stop=None):
+        """acquire() on the running event loop"""
+        ready = self._reserve(tokens)
+        started = time.monotonic()
+        while True:
+            remaining = self._remaining(ready)
+            if remaining <= 0 or (should_stop and should_stop()):
+                break
+            await asyncio.sleep(min(0.2, remaining))
+        return self._waited(started)
+
+    def _waited(self, started):
+        waited = time.monotonic() - started
+        with self._lock:
+            self.waited += waited
+        return waited
+
+    def observe(self, status, headers):
+        """Take in one response's status and rate-limit headers"""
+        now = time.monotonic()
+        headers = headers or {}
+        with self._lock:
+            for kind, (limit_names, remaining_names, reset_names) in RATE_LIMIT_HEADERS.items():
+                limit = _int_header(headers, limit_names)
+                remaining = _int_header(headers, remaining_names)
+                bucket = getattr(self, kind)
+                if limit:
+                    if bucket is None:
+                        bucket = TokenBucket(limit)
+                        setattr(self, kind, bucket)
+                    elif limit != bucket.limit:
+                        bucket.set_limit(limit, now)
+                if bucket is not None and remaining is not None:
+                    bucket.set_remaining(remaining, now)
+                    reset = parse_reset(_header(headers, reset_names))
+                    if remaining <= 0 and reset:
+                        self.paused_until = max(self.paused_until, now + reset)
+            if status == 429:
+                self.throttled += 1
+                wait = parse_retry_after(headers.get('Retry-After'))
+                if wait is None:
+                    wait = 60 / self.requests.per_minute if self.requests is not None else 1.0
+                self.paused_until = max(self.paused_until, now + wait)
+                for bucket in (self.requests, self.tokens):
+                    if bucket is not None:
+                        bucket.throttled(now)
+            elif status < 400:
+                for bucket in (self.requests, self.tokens):
+                    if bucket is not None:
+                        bucket.recovered()
+
+    def summary(self):
+        """Rates and waits for the log, or None if nothing was limited"""
+        with self._lock:
+            if not self.throttled and self.waited < 0.5:
+                return None
+            rates = []
+            if self.requests is not None:
+                rates.append(f"{self.requests.per_minute:.0f}/{self.requests.limit:.0f} requests/min")
+            if self.tokens is not None:
+                rates.append(f"{self.tokens.per_minute:.0f}/{self.tokens.limit:.0f} tokens/min")
+            return (f"Rate limiter: {self.waited:.1f}s waiting, {self.throttled} throttled (429)"
+                    + (f", now at {', '.join(rates)}" if rates else ""))
+
+
+_lock = threading.Lock()
+_limiters = {}  # (provider, model) -> RateLimiter
+
+
+def limiter_for(provider, model):
+    """RateLimiter shared by every request to provider's model"""
+    with _lock:
+        limiter = _limiters.get((provider, model))
+        if limiter is None:
+            limiter = RateLimiter(*PROVIDER_LIMITS.get(provider, (None, None)))
+            _limiters[(provider, model)] = limiter
+        return limiter
+
+
+def set_limits(provider, model, requests_per_minute=None, tokens_per_minute=None):
+    """Set provider's model's limits (None: the provider's default); headers still adjust them.
+
+    The limiter, and what it learned, is kept when the limits are unchanged.
+    """
+    default_requests, default_tokens = PROVIDER_LIMITS.get(provider, (None, None))
+    limits = (requests_per_minute or default_requests, tokens_per_minute or default_tokens)
+    with _lock:
+        limiter = _limiters.get((provider, model))
+        if limiter is None or limiter.configured != limits:
+            _limiters[(provider, model)] = RateLimiter(*limits)
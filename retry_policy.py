@@ -0,0 +1,173 @@
+# retry_policy.py
+import time
+import asyncio
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+from llm_stream import AnswerError
+
+# Status codes worth another attempt: timeouts, rate limits and server or gateway failures
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# The request can never succeed (bad key, unknown model or endpoint), so splitting a batch will not help
+FATAL_STATUS = {401, 403, 404}
+
+
+def _chain(error):
+    """error and the exceptions it was raised from or while handling"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def status_code(error):
+    """HTTP status behind an exception (requests' HTTPError, the Ollama client's ResponseError), or None"""
+    for e in _chain(error):
+        status = getattr(e, 'status_code', None)
+        if status is None:
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def parse_retry_after(value):
+    """Seconds in a Retry-After header value (seconds or an HTTP date), or None"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(error):
+    """Seconds the server asked to wait in a Retry-After header, or None"""
+    for e in _chain(error):
+        if isinstance(getattr(e, 'retry_after', None), (int, float)):
+            return max(0.0, e.retry_after)
+        headers = getattr(getattr(e, 'response', None), 'headers', None)
+        seconds = parse_retry_after(headers.get('Retry-After') if headers else None)
+        if seconds is not None:
+            return seconds
+    return None
+
+
+def is_fatal(error):
+    return status_code(error) in FATAL_STATUS
+
+
+def is_answer_error(error):
+    """Whether error is about the answer itself, which a smaller batch may fix; throttling and server errors are not"""
+    return any(isinstance(e, AnswerError) for e in _chain(error))
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for LLM requests.
+
+    Retry n waits a random time up to base_delay * 2**n, capped at
+    max_delay; when the server sends Retry-After, at least that long. A
+    Retry-After beyond max_retry_after ends the retries instead. Errors
+    without a status (connection failures, timeouts) and RETRY_STATUS are
+    retried; other client errors are raised at once.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0, max_retry_after=300.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, error):
+        status = status_code(error)
+        return status is None or status in RETRY_STATUS
+
+    def delay(self, retry, error=None):
+        """Seconds to wait before retry number retry (0-based), or None to give up"""
+        wait = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+        server = retry_after(error) if error is not None else None
+        if server is not None:
+            if server > self.max_retry_after:
+                return None
+            wait = max(wait, server)
+        return wait
+
+    def _next_wait(self, attempt, error, on_retry, should_stop):
+        """Seconds to wait after failed attempt number attempt, or None to raise the error"""
+        if attempt >= self.max_attempts or not self.should_retry(error) or (should_stop and should_stop()):
+            return None
+        wait = self.delay(attempt - 1, error)
+        if wait is not None and on_retry is not None:
+            on_retry(attempt, wait, error)
+        return wait
+
+    def call(self, fn, on_retry=None, should_stop=None):
+        """fn() with retries; on_retry(attempt, wait, error) is told before each wait.
+
+        should_stop is polled while waiting, so a stop request does not sit
+        out a long backoff; the last error is raised then.
+        """
+        attempt = 1
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                wait = self._next_wait(attempt, e, on_retry, should_stop)
+                if wait is None:
+                    raise
+                deadline = time.monotonic() + wait
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    if should_stop and should_stop():
+                        raise
+                    time.sleep(min(0.2, remaining))
+                attempt += 1
+
+    async def acall(self, fn, on_retry=None, should_stop=None):
+        """call() for a coroutine function; waits with asyncio.sleep, so other requests go on meanwhile"""
+        attempt = 1
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                wait = self._next_wait(attempt, e, on_retry, should_stop)
+                if wait is None:
+                    raise
+                deadline = time.monotonic() + wait
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    if should_stop and should_stop():
+                        raise
+                    await asyncio.sleep(min(0.2, remaining))
+                attempt += 1
+
+
+class FailureLedger:
+    """Files a run could not classify, with the reason, so only those are sent again. Thread-safe."""
+
+    def __init__(self):
+        self.entries = {}  # file -> error text
+        self._lock = threading.Lock()
+
+    def record(self, files, error):
+        with self._lock:
+            for f in files:
+                self.entries[f] = str(error)
+
+    def files(self):
+        with self._lock:
+            return list(self.entries)
+
+    def __len__(self):
+        with self._lock:
+            return len(self.entries)
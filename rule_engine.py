@@ -0,0 +1,186 @@
+# rule_engine.py
+import os
+import re
+from functools import lru_cache
+
+# Lines of the prompt templates the rules are read from
+CAMERA_RULE_LINE = re.compile(r'^(\w+?)_Camera_File_Task:\s*(\^.*\$)\s*$')
+TREE_LINE = re.compile(r'^([│ ]*)(?:├──|└──)\s*(\S+)\s*(?:#\s*(.*))?$')
+EXAMPLE_INPUT = re.compile(r'^Input:\s*(\S+)\s*(?:\((.*)\))?')
+EXAMPLE_OUTPUT = re.compile(r'^Output:\s*(\S+)')
+# A folder that exists for exactly these file types: "(nk files)", "(xml, edl, aaf files)"
+EXTENSION_LIST = re.compile(r'\(\s*(\.?[A-Za-z0-9]{2,6}(?:\s*,\s*\.?[A-Za-z0-9]{2,6})*)\s+files\)')
+# Shot codes the prompts describe: a short letter prefix followed by a number (SC001, sh002, SH010)
+SHOT_CODE = re.compile(r'^[A-Za-z]{2,4}\d{2,5}$')
+
+
+def shot_name(filename):
+    """Everything before the first underscore, as the prompts define a shot name"""
+    return os.path.splitext(filename)[0].split('_')[0]
+
+
+def _generalize(filename, output, camera=None):
+    """Turn an example output path into a template by naming its shot and camera segments"""
+    shot = shot_name(filename)
+    parts = []
+    for part in output.split('/'):
+        # The camera folder comes first when the shot is named after the camera (DJI/DJI)
+        if camera and part == camera and '{camera}' not in parts:
+            part = '{camera}'
+        elif part and part == shot:
+            part = '{shot}'
+        parts.append(part)
+    return '/'.join(parts)
+
+
+def _parse_tree(lines):
+    """(folder path, description) for every branch of the annotated tree (its root line has none)"""
+    folders = []
+    stack = []
+    for line in lines:
+        m = TREE_LINE.match(line.rstrip())
+        if not m:
+            continue
+        depth = len(m.group(1)) // 4
+        del stack[depth:]
+        stack.append(m.group(2))
+        folders.append(('/'.join(stack), m.group(3) or ''))
+    return folders
+
+
+def _parse_examples(lines):
+    """(input name, annotation, output path) for the Input:/Output: example pairs"""
+    examples = []
+    pending = None
+    for line in lines:
+        line = line.strip()
+        m = EXAMPLE_INPUT.match(line)
+        if m:
+            pending = (m.group(1), m.group(2) or '')
+            continue
+        m = EXAMPLE_OUTPUT.match(line)
+        if m and pending is not None:
+            examples.append((pending[0], pending[1], m.group(1)))
+            pending = None
+    return examples
+
+
+class RuleEngine:
+    """Deterministic pre-classifier compiled from a classification prompt template.
+
+    The templates state rules the LLM has to follow: camera file regexes
+    that override everything else, and folders that exist for exactly one
+    set of file types. Those rules are compiled into one alternation of the
+    camera patterns (in template order, so precedence is kept) plus an
+    extension table, with destinations taken from the template's own
+    Input/Output examples. Names no rule covers, or that would need the
+    LLM's judgement (a shot name that is not a plain shot code), are left
+    for the LLM.
+    """
+
+    def __init__(self, camera_rules, extension_rules):
+        self.camera_rules = camera_rules  # [(camera, pattern, destination template)]
+        self.extension_rules = extension_rules  # {'.ext': destination template}
+        self.camera_matcher = None
+        if camera_rules:
+            alternation = '|'.join(f'(?P<c{i}>{pattern})' for i, (_, pattern, _) in enumerate(camera_rules))
+            self.camera_matcher = re.compile(alternation)
+        self.hits = 0
+        self.total = 0
+
+    @classmethod
+    def from_template(cls, template):
+        lines = template.splitlines()
+        examples = _parse_examples(lines)
+        folders = _parse_tree(lines)
+        # Camera patterns; inline (?i) before the extension group is scoped to that group
+        cameras = []
+        for line in lines:
+            m = CAMERA_RULE_LINE.match(line.strip())
+            if not m:
+                continue
+            pattern = m.group(2).replace('(?i)(', '(?i:')
+            try:
+                re.compile(pattern)
+            except re.error:
+                continue
+            cameras.append((m.group(1), pattern))
+        camera_templates = {}
+        for name, note, output in examples:
+            for camera, _ in cameras:
+                if f'{camera}_Camera_File_Task' in note:
+                    camera_templates.setdefault(camera, _generalize(name, output, camera))
+        camera_rules = []
+        fallback = next(iter(camera_templates.values()), None)
+        for camera, pattern in cameras:
+            destination = camera_templates.get(camera, fallback)
+            if destination is not None:
+                camera_rules.append((camera, pattern, destination))
+        # Extensions: the examples fix the destination when they all agree; otherwise
+        # the tree folder, but only where the examples answer with tree paths
+        by_ext = {}
+        for name, note, output in examples:
+            if 'Camera_File_Task' not in note:
+                by_ext.setdefault(os.path.splitext(name)[1].lower(), set()).add(_generalize(name, output))
+        top_level = {path.split('/')[0] for path, _ in folders}
+        tree_is_output = bool(examples) and all(
+            output.strip('/').split('/')[0] in top_level for _, _, output in examples if output != 'unknown')
+        extension_rules = {}
+        claimed = {}
+        for path, description in folders:
+            m = EXTENSION_LIST.search(description)
+            if not m:
+                continue
+            for ext in re.split(r'\s*,\s*', m.group(1)):
+                ext = '.' + ext.lstrip('.').lower()
+                claimed.setdefault(ext, []).append(path)
+        for ext, paths in claimed.items():
+            if len(paths) != 1:
+                continue
+            destinations = by_ext.get(ext)
+            if destinations and len(destinations) == 1:
+                extension_rules[ext] = next(iter(destinations))
+            elif not destinations and tree_is_output:
+                extension_rules[ext] = paths[0]
+        return cls(camera_rules, extension_rules)
+
+    def classify_name(self, name):
+        """Destination folder for a file name, or None if the LLM has to decide"""
+        if self.camera_matcher is not None:
+            m = self.camera_matcher.match(name)
+            if m:
+                camera, _, destination = self.camera_rules[int(m.lastgroup[1:])]
+                return destination.replace('{camera}', camera).replace('{shot}', shot_name(name))
+        destination = self.extension_rules.get(os.path.splitext(name)[1].lower())
+        if destination is None:
+            return None
+        if '{shot}' in destination:
+            shot = shot_name(name)
+            if '_' not in name or not SHOT_CODE.match(shot):
+                return None
+            return destination.replace('{shot}', shot)
+        return destination
+
+    def classify(self, names):
+        """Split names into ({name: folder} decided locally, [names left for the LLM])"""
+        classified = {}
+        remaining = []
+        for name in names:
+            folder = self.classify_name(name)
+            if folder is None:
+                remaining.append(name)
+            else:
+                classified[name] = folder
+        self.hits += len(classified)
+        self.total += len(classified) + len(remaining)
+        return classified, remaining
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.total if self.total else 0.0
+
+
+@lru_cache(maxsize=8)
+def compile_rules(template):
+    """RuleEngine for a prompt template, compiled once per template text"""
+    return RuleEngine.from_template(template)
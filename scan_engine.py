@@ -0,0 +1,196 @@
+# scan_engine.py
+import os
+import json
+import time
+import threading
+from collections import deque
+
+
+def default_scan_workers():
+    """Default worker count for directory scans (I/O bound, so oversubscribe the CPUs)"""
+    return min(32, (os.cpu_count() or 1) * 4)
+
+
+class WorkStealingScanner:
+    """Parallel directory walker with a bounded pool of work-stealing workers.
+
+    Every worker owns a deque of directories. It pops its own newest directory
+    (depth-first, good locality) and, when that runs dry, steals the oldest
+    directory from another worker (the biggest remaining subtree). The walk
+    finishes when no directory is queued or being listed.
+    """
+
+    def __init__(self, workers=None, follow_symlinks=False):
+        self.workers = max(1, int(workers or default_scan_workers()))
+        self.follow_symlinks = follow_symlinks
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ask the running scan to finish early"""
+        self._stop.set()
+
+    def scan(self, roots, visit, on_error=None):
+        """Walk every root and call visit(dir_path, entries) once per directory.
+
+        visit is called from the worker threads with the list of os.DirEntry
+        objects of that directory, so it must do its own locking. Directories
+        that cannot be listed are skipped, as are errors raised by visit;
+        on_error(dir_path, exc) is told about both if given.
+        """
+        self._stop.clear()
+        n = self.workers
+        deques = [deque() for _ in range(n)]
+        cond = threading.Condition()
+        state = {'pending': 0}
+        seen = set()
+        for root in roots:
+            if root in seen:
+                continue
+            seen.add(root)
+            deques[state['pending'] % n].append(root)
+            state['pending'] += 1
+        if not state['pending']:
+            return
+
+        def take(idx):
+            try:
+                return deques[idx].pop()
+            except IndexError:
+                pass
+            for offset in range(1, n):
+                try:
+                    return deques[(idx + offset) % n].popleft()
+                except IndexError:
+                    continue
+            return None
+
+        def worker(idx):
+            own = deques[idx]
+            while True:
+                if self._stop.is_set():
+                    return
+                current = take(idx)
+                if current is None:
+                    with cond:
+                        if state['pending'] == 0:
+                            return
+                        cond.wait(0.05)
+                    continue
+                subdirs = []
+                try:
+                    with os.scandir(current) as it:
+                        entries = list(it)
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=self.follow_symlinks):
+                                subdirs.append(entry.path)
+                        except OSError:
+                            pass
+                    visit(current, entries)
+                except Exception as e:
+                    # Ignore permission errors etc.
+                    if on_error is not None:
+                        try:
+                            on_error(current, e)
+                        except Exception:
+                            pass
+                # Account for the children before they become stealable so the
+                # pending count can never hit zero while work is still queued.
+                with cond:
+                    state['pending'] += len(subdirs) - 1
+                    if state['pending'] == 0:
+                        cond.notify_all()
+                if subdirs:
+                    own.extend(subdirs)
+                    with cond:
+                        cond.notify_all()
+
+        if n == 1:
+            worker(0)
+            return
+        threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+
+class ScanProgress:
+    """Running progress estimate for a single-pass scan.
+
+    The total is not known up front, so the estimate is completed directories
+    over discovered directories, floored by the directory count recorded for
+    the previous scan of the same roots. The reported fraction never goes
+    backwards and stays below 1.0 until the caller finishes.
+    """
+
+    def __init__(self, roots=1, cached=None):
+        cached = cached or {}
+        self.discovered_dirs = roots
+        self.completed_dirs = 0
+        self.entries = 0
+        self.cached_dirs = int(cached.get('dirs', 0))
+        self.cached_entries = int(cached.get('entries', 0))
+        self._last = 0.0
+
+    def dir_done(self, subdirs, entries):
+        """Record one listed directory with its subdirectory and entry counts"""
+        self.discovered_dirs += subdirs
+        self.completed_dirs += 1
+        self.entries += entries
+
+    def fraction(self):
+        total = max(self.discovered_dirs, self.cached_dirs)
+        if total <= 0:
+            return self._last
+        self._last = max(self._last, min(0.99, self.completed_dirs / total))
+        return self._last
+
+    def estimated_entries(self):
+        """Best guess at the final entry count"""
+        if self.cached_entries >= self.entries:
+            return self.cached_entries
+        if not self.completed_dirs:
+            return self.entries
+        per_dir = self.entries / self.completed_dirs
+        return max(self.entries, int(per_dir * max(self.discovered_dirs, self.cached_dirs)))
+
+    def summary(self):
+        return {'dirs': self.completed_dirs, 'entries': self.entries}
+
+
+class ScanCountCache:
+    """Remembers directory/entry counts per scanned root set to seed progress estimates"""
+
+    MAX_ENTRIES = 500
+
+    def __init__(self, storage_file="FIelOrganizer_scan_counts.json"):
+        self.storage_file = os.path.join(os.path.expanduser('~'), storage_file)
+
+    @staticmethod
+    def key(roots):
+        return '|'.join(sorted(os.path.normcase(os.path.abspath(r)) for r in roots))
+
+    def _load(self):
+        try:
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception:
+            return {}
+
+    def get(self, roots):
+        return self._load().get(self.key(roots))
+
+    def set(self, roots, counts):
+        data = self._load()
+        data[self.key(roots)] = dict(counts, time=time.time())
+        if len(data) > self.MAX_ENTRIES:
+            oldest = sorted(data, key=lambda k: data[k].get('time', 0))
+            for k in oldest[:len(data) - self.MAX_ENTRIES]:
+                del data[k]
+        try:
+            with open(self.storage_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+        except Exception:
+            pass  # The cache only improves progress estimates
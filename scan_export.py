@@ -0,0 +1,353 @@
+# scan_export.py
+import os
+import json
+import math
+import mmap
+import heapq
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+
+def record_key(record):
+    """Identity of an exported record; also its sort order"""
+    return (record['Path'], record['File'])
+
+
+def iter_ndjson(path):
+    """Yield the records of a newline-delimited JSON file one at a time"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """Yield the items of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buf, pos, started, eof = '', 0, False, False
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ',')):
+                pos += 1
+            if pos < len(buf):
+                if not started:
+                    if buf[pos] != '[':
+                        raise ValueError(f"{path} is not a JSON array")
+                    started = True
+                    pos += 1
+                    continue
+                if buf[pos] == ']':
+                    return
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    item = end = None
+                if end is not None and (end < len(buf) or eof):
+                    yield item
+                    pos = end
+                    continue
+            elif eof:
+                raise ValueError(f"{path}: unterminated JSON array")
+            # Need more input: the next item is incomplete (or may be, at the buffer edge)
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+
+
+def iter_records(path):
+    """Stream the records of an export, NDJSON or JSON array by extension"""
+    if path.endswith('.ndjson'):
+        return iter_ndjson(path)
+    return iter_json_array(path)
+
+
+class NdjsonWriter:
+    """Thread-safe newline-delimited JSON writer with constant memory.
+
+    Records go to a temporary file next to the target, which replaces the
+    target on close(), so readers never see a half-written export.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        if append:
+            self._tmp_path = None
+            self._file = open(path, 'a', encoding='utf-8')
+        else:
+            directory = os.path.dirname(os.path.abspath(path))
+            fd, self._tmp_path = tempfile.mkstemp(prefix='.export-', suffix='.ndjson', dir=directory)
+            self._file = os.fdopen(fd, 'w', encoding='utf-8')
+
+    def _encode(self, record):
+        return json.dumps(record, ensure_ascii=False) + '\n'
+
+    def _write_lines(self, lines):
+        self._file.writelines(lines)
+
+    def write(self, record):
+        self.write_many([record])
+
+    def write_many(self, records):
+        lines = [self._encode(record) for record in records]
+        with self._lock:
+            self._write_lines(lines)
+            self.count += len(lines)
+
+    def close(self):
+        self._file.close()
+        if self._tmp_path:
+            os.replace(self._tmp_path, self.path)
+            self._tmp_path = None
+
+    def abort(self):
+        """Close without replacing the target"""
+        self._file.close()
+        if self._tmp_path:
+            os.remove(self._tmp_path)
+            self._tmp_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonArrayWriter(NdjsonWriter):
+    """Streams records into a JSON array laid out like json.dump(records, f, indent=2)"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._file.write('[')
+
+    def _encode(self, record):
+        return '  ' + json.dumps(record, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+
+    def _write_lines(self, lines):
+        for i, line in enumerate(lines):
+            self._file.write(',\n' if self.count + i else '\n')
+            self._file.write(line)
+
+    def close(self):
+        self._file.write('\n]' if self.count else ']')
+        super().close()
+
+
+class ExternalSorter:
+    """Sorts an unbounded record stream in bounded memory.
+
+    Records are buffered up to chunk_size, then sorted and spilled to a
+    temporary NDJSON chunk; sorted_records() k-way merges the chunks. Memory
+    is O(chunk_size) records plus one record per spilled chunk.
+    """
+
+    def __init__(self, key, chunk_size=200000, tmp_dir=None):
+        self.key = key
+        self.chunk_size = chunk_size
+        self.tmp_dir = tmp_dir
+        self.count = 0
+        self._buffer = []
+        self._chunks = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self._buffer.append(record)
+            self.count += 1
+            if len(self._buffer) >= self.chunk_size:
+                self._spill()
+
+    def add_many(self, records):
+        with self._lock:
+            self._buffer.extend(records)
+            self.count += len(records)
+            if len(self._buffer) >= self.chunk_size:
+                self._spill()
+
+    def _spill(self):
+        self._buffer.sort(key=self.key)
+        fd, path = tempfile.mkstemp(prefix='.sort-chunk-', suffix='.ndjson', dir=self.tmp_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in self._buffer)
+        self._chunks.append(path)
+        self._buffer = []
+
+    def sorted_records(self):
+        """Yield every added record in key order, then remove the spilled chunks"""
+        self._buffer.sort(key=self.key)
+        streams = []
+        try:
+            streams = [iter_ndjson(path) for path in self._chunks]
+            streams.append(iter(self._buffer))
+            for record in heapq.merge(*streams, key=self.key):
+                yield record
+        finally:
+            for stream in streams[:-1]:
+                stream.close()
+            self.cleanup()
+
+    def cleanup(self):
+        for path in self._chunks:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._chunks = []
+        self._buffer = []
+
+
+# --- Append/merge ---
+def is_sorted(records, key=record_key):
+    """True if records come in non-decreasing key order (consumes the iterable)"""
+    last = None
+    for record in records:
+        k = key(record)
+        if last is not None and k < last:
+            return False
+        last = k
+    return True
+
+
+def merge_sorted(existing, new, key=record_key):
+    """Merge two key-sorted record streams in one pass, keeping the first of any duplicates"""
+    last = None
+    for record in heapq.merge(existing, new, key=key):
+        k = key(record)
+        if k != last:
+            last = k
+            yield record
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter whose bit array is a memory-mapped temporary file"""
+
+    def __init__(self, expected, error_rate=0.01, tmp_dir=None):
+        expected = max(1, int(expected))
+        self.num_bits = max(64, int(-expected * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / expected * math.log(2)))
+        fd, self.path = tempfile.mkstemp(prefix='.bloom-', dir=tmp_dir)
+        size = (self.num_bits + 7) // 8
+        os.ftruncate(fd, size)
+        self._file = os.fdopen(fd, 'r+b')
+        self._bits = mmap.mmap(self._file.fileno(), size)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for bit in self._positions(key):
+            self._bits[bit >> 3] |= 1 << (bit & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[bit >> 3] & (1 << (bit & 7)) for bit in self._positions(key))
+
+    def close(self):
+        self._bits.close()
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class DiskKeySet:
+    """Set of string keys kept on disk, for deduplicating inputs too large to sort or hold.
+
+    A memory-mapped Bloom filter answers most lookups for unseen keys; the
+    rest are confirmed against an SQLite hash index, so there are no false
+    positives.
+    """
+
+    BATCH = 10000
+
+    def __init__(self, expected=1000000, tmp_dir=None):
+        self._dir = tempfile.mkdtemp(prefix='.keyset-', dir=tmp_dir)
+        self.bloom = BloomFilter(expected, tmp_dir=self._dir)
+        self.conn = sqlite3.connect(os.path.join(self._dir, 'keys.db'))
+        self.conn.execute('PRAGMA journal_mode=OFF')
+        self.conn.execute('PRAGMA synchronous=OFF')
+        self.conn.execute('CREATE TABLE keys (k TEXT PRIMARY KEY) WITHOUT ROWID')
+        self._pending = []
+
+    def _flush(self):
+        if self._pending:
+            self.conn.executemany('INSERT OR IGNORE INTO keys VALUES (?)', [(k,) for k in self._pending])
+            self._pending = []
+
+    def add(self, key):
+        self.bloom.add(key)
+        self._pending.append(key)
+        if len(self._pending) >= self.BATCH:
+            self._flush()
+
+    def __contains__(self, key):
+        if key not in self.bloom:
+            return False
+        self._flush()
+        return self.conn.execute('SELECT 1 FROM keys WHERE k = ?', (key,)).fetchone() is not None
+
+    def close(self):
+        self.conn.close()
+        self.bloom.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def append_unsorted(existing, new, key=record_key, expected=1000000, tmp_dir=None):
+    """Existing records unchanged, then the new records not already present"""
+    seen = DiskKeySet(expected, tmp_dir=tmp_dir)
+    try:
+        for record in existing:
+            seen.add('\0'.join(key(record)))
+            yield record
+        for record in new:
+            k = '\0'.join(key(record))
+            if k not in seen:
+                seen.add(k)
+                yield record
+    finally:
+        seen.close()
+
+
+def merge_export(path, new_records, new_sorted=True, drop=None):
+    """Merge new_records into the export at path in one streaming pass and return the entry count.
+
+    Neither side is loaded into memory. If both the existing export and
+    new_records are sorted by record_key they are merged in order; otherwise
+    the existing records are kept as they are and new ones are appended,
+    with duplicates filtered through a DiskKeySet. Existing records for
+    which drop(record) is true are left out, so whole directories can be
+    replaced. The export is replaced atomically once the merge succeeds.
+    """
+    expected = os.path.getsize(path) // 64 + 1000
+    writer = NdjsonWriter(path) if path.endswith('.ndjson') else JsonArrayWriter(path)
+
+    def existing():
+        records = iter_records(path)
+        return records if drop is None else (record for record in records if not drop(record))
+
+    try:
+        if new_sorted and is_sorted(iter_records(path)):
+            merged = merge_sorted(existing(), new_records)
+        else:
+            merged = append_unsorted(existing(), new_records, expected=expected)
+        for record in merged:
+            writer.write(record)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.count
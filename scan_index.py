@@ -0,0 +1,248 @@
+# scan_index.py
+import os
+import time
+import sqlite3
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from scan_engine import default_scan_workers
+
+# Entry kinds stored in the index
+KIND_FILE = 0
+KIND_DIR = 1
+KIND_OTHER = 2
+
+# A directory modified this close to the scan may change again within the same
+# mtime tick, so it is stored without an mtime and re-listed on the next scan.
+RACY_MTIME_NS = 2 * 10**9
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS dirs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    parent_id INTEGER,
+    mtime_ns INTEGER,
+    entry_count INTEGER,
+    scanned_at REAL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent_id);
+CREATE TABLE IF NOT EXISTS entries (
+    dir_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    kind INTEGER NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    PRIMARY KEY (dir_id, name)
+) WITHOUT ROWID;
+'''
+
+
+def _subtree_bounds(root):
+    """Return (prefix, upper) so that prefix <= path < upper selects everything below root"""
+    prefix = root if root.endswith(os.sep) else root + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class ScanIndex:
+    """Persistent on-disk index of scanned directories and their entries.
+
+    Each directory is stored with its mtime. A rescan still stats every known
+    directory, but only lists the ones whose mtime changed (an entry was
+    added, removed or renamed), so re-running over a barely changed archive
+    costs one stat per directory instead of a full walk. File sizes and
+    mtimes are only recorded when stat_files is set, because that needs one
+    extra stat per file on most platforms.
+    """
+
+    CHUNK_DIRS = 256
+
+    def __init__(self, db_path=None, stat_files=False):
+        if db_path is None:
+            db_path = os.path.join(os.path.expanduser('~'), 'FIelOrganizer_scan_index.db')
+        self.db_path = db_path
+        self.stat_files = stat_files
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.last_stats = {}
+
+    def close(self):
+        self.conn.close()
+
+    def _known_dirs(self, root, recursive=True):
+        if not recursive:
+            return self.conn.execute(
+                'SELECT id, path, parent_id, mtime_ns, entry_count FROM dirs WHERE path = ?', (root,)).fetchall()
+        prefix, upper = _subtree_bounds(root)
+        return self.conn.execute(
+            'SELECT id, path, parent_id, mtime_ns, entry_count FROM dirs WHERE path = ? OR (path >= ? AND path < ?)',
+            (root, prefix, upper)
+        ).fetchall()
+
+    def _dir_id(self, path):
+        row = self.conn.execute('SELECT id FROM dirs WHERE path = ?', (path,)).fetchone()
+        return row[0] if row else None
+
+    def _check_dir(self, path, known_mtime):
+        """Runs on the pool: stat the directory and list it only if it changed"""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        if known_mtime is not None and known_mtime == mtime_ns:
+            return mtime_ns, None
+        rows = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            kind = KIND_DIR
+                        elif entry.is_file():
+                            kind = KIND_FILE
+                        else:
+                            kind = KIND_OTHER
+                        size = mtime = None
+                        if self.stat_files and kind == KIND_FILE:
+                            st = entry.stat()
+                            size, mtime = st.st_size, st.st_mtime_ns
+                    except OSError:
+                        kind, size, mtime = KIND_OTHER, None, None
+                    rows.append((entry.name, kind, size, mtime))
+        except OSError:
+            return None
+        return mtime_ns, rows
+
+    def update(self, roots, workers=None, progress=None, progress_callback=None, recursive=True):
+        """Bring the index up to date for roots and return the scan statistics.
+
+        progress (a ScanProgress) and progress_callback(dir_path, progress) are
+        updated on the calling thread once per directory, the callback after
+        each chunk of directories has been committed. Without recursive only
+        the roots themselves are checked, not the folders below them.
+        """
+        roots = list(dict.fromkeys(os.path.abspath(r) for r in roots))
+        known = {}
+        children = defaultdict(list)
+        for root in roots:
+            for dir_id, path, parent_id, mtime_ns, entry_count in self._known_dirs(root, recursive):
+                known[path] = (dir_id, mtime_ns, entry_count or 0)
+                children[parent_id].append(path)
+        stats = {'listed': 0, 'unchanged': 0, 'removed': 0, 'entries': 0}
+        reached = set()
+        queued = set(roots)
+        frontier = deque((root, None) for root in roots)
+        with ThreadPoolExecutor(max_workers=workers or default_scan_workers()) as pool:
+            while frontier:
+                chunk = [frontier.popleft() for _ in range(min(self.CHUNK_DIRS, len(frontier)))]
+                checks = pool.map(lambda item: self._check_dir(item[0], known.get(item[0], (None, None, 0))[1]), chunk)
+                now_ns = time.time_ns()
+                done = []
+                with self.conn:
+                    for (path, parent_id), result in zip(chunk, checks):
+                        if result is None:
+                            if progress is not None:
+                                progress.dir_done(0, 0)
+                            continue
+                        reached.add(path)
+                        mtime_ns, rows = result
+                        if parent_id is None:
+                            # A root below an indexed folder stays linked to it, so rescans of that folder still reach it
+                            parent_id = self._dir_id(os.path.dirname(path))
+                        if rows is None:
+                            dir_id = known[path][0]
+                            subdirs = children.get(dir_id, [])
+                            stats['unchanged'] += 1
+                            n_entries = known[path][2]
+                        else:
+                            stored_mtime = None if now_ns - mtime_ns < RACY_MTIME_NS else mtime_ns
+                            if path in known:
+                                dir_id = known[path][0]
+                                self.conn.execute(
+                                    'UPDATE dirs SET parent_id = COALESCE(?, parent_id), mtime_ns = ?, entry_count = ?, scanned_at = ? WHERE id = ?',
+                                    (parent_id, stored_mtime, len(rows), time.time(), dir_id))
+                                self.conn.execute('DELETE FROM entries WHERE dir_id = ?', (dir_id,))
+                            else:
+                                dir_id = self.conn.execute(
+                                    'INSERT INTO dirs (path, parent_id, mtime_ns, entry_count, scanned_at) VALUES (?, ?, ?, ?, ?)',
+                                    (path, parent_id, stored_mtime, len(rows), time.time())).lastrowid
+                            known[path] = (dir_id, stored_mtime, len(rows))
+                            self.conn.executemany(
+                                'INSERT INTO entries (dir_id, name, kind, size, mtime_ns) VALUES (?, ?, ?, ?, ?)',
+                                [(dir_id,) + row for row in rows])
+                            subdirs = [os.path.join(path, row[0]) for row in rows if row[1] == KIND_DIR]
+                            stats['listed'] += 1
+                            n_entries = len(rows)
+                            stats['entries'] += n_entries
+                        if not recursive:
+                            subdirs = []
+                        for sub in subdirs:
+                            if sub not in queued:
+                                queued.add(sub)
+                                frontier.append((sub, dir_id))
+                        if progress is not None:
+                            progress.dir_done(len(subdirs), n_entries)
+                        done.append(path)
+                # Callbacks run after the commit so a UI callback that re-enters
+                # the index (e.g. via processEvents) never waits on our write lock
+                if progress_callback:
+                    for path in done:
+                        progress_callback(path, progress)
+        # Anything under the roots that was not reached has been deleted or moved
+        gone = [dir_id for path, (dir_id, _, _) in known.items() if path not in reached]
+        if gone:
+            with self.conn:
+                self.conn.executemany('DELETE FROM entries WHERE dir_id = ?', [(i,) for i in gone])
+                self.conn.executemany('DELETE FROM dirs WHERE id = ?', [(i,) for i in gone])
+        stats['removed'] = len(gone)
+        self.last_stats = stats
+        return stats
+
+    def update_changes(self, changes, workers=None):
+        """Bring the index up to date for one FolderWatcher changes dict, re-listing only what it touched.
+
+        The directories holding the changed paths are re-listed on their own;
+        new folders are indexed and deleted ones dropped with everything below
+        them. Returns the set of directories re-listed on their own.
+        """
+        trees = changes['created_dirs'] + changes['deleted_dirs']
+        dirs = {os.path.dirname(os.path.abspath(p)) for p in changes['created'] + changes['deleted'] + trees}
+        if dirs:
+            self.update(sorted(dirs), workers=workers, recursive=False)
+        if trees:
+            self.update(sorted(trees), workers=workers)
+        return dirs
+
+    def iter_entries(self, roots, recursive=True):
+        """Yield (dir_path, name, kind, size, mtime_ns) for everything indexed under roots (or in them only)"""
+        for root in dict.fromkeys(os.path.abspath(r) for r in roots):
+            if recursive:
+                prefix, upper = _subtree_bounds(root)
+                cursor = self.conn.execute(
+                    'SELECT d.path, e.name, e.kind, e.size, e.mtime_ns FROM dirs d '
+                    'JOIN entries e ON e.dir_id = d.id '
+                    'WHERE d.path = ? OR (d.path >= ? AND d.path < ?) ORDER BY d.path, e.name',
+                    (root, prefix, upper))
+            else:
+                cursor = self.conn.execute(
+                    'SELECT d.path, e.name, e.kind, e.size, e.mtime_ns FROM dirs d '
+                    'JOIN entries e ON e.dir_id = d.id WHERE d.path = ? ORDER BY e.name', (root,))
+            for row in cursor:
+                yield row
+
+    def nested_structure(self, root, include_files=True):
+        """Build the folder_structure_to_json nested dict for root from the index"""
+        root = os.path.abspath(root)
+        structure = {}
+        nodes = {root: structure}
+        for dir_path, name, kind, _, _ in self.iter_entries([root]):
+            node = nodes.get(dir_path)
+            if node is None:
+                continue
+            if kind == KIND_DIR:
+                node[name] = {}
+                nodes[os.path.join(dir_path, name)] = node[name]
+            elif kind == KIND_FILE and include_files:
+                node.setdefault('__files__', []).append(name)
+        return structure
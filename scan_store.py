@@ -0,0 +1,252 @@
+# scan_store.py
+import os
+import threading
+from array import array
+
+from scan_index import KIND_FILE, KIND_DIR
+
+# Collapsed frame sequence (e.g. plate.####.exr) standing in for its frames
+KIND_SEQUENCE = 3
+
+UNKNOWN = -1
+
+
+def _encode(name):
+    return name.encode('utf-8', 'surrogateescape')
+
+
+class ScanStore:
+    """Compact columnar store for scan results.
+
+    A scan result as a dict {'Path': ..., 'File': ...} repeats the whole
+    parent path for every entry and costs several hundred bytes. Here every
+    directory is interned once and an entry is a row in parallel arrays
+    (parent directory id, name offset and length into a shared UTF-8 string
+    pool, kind), 15 bytes plus its name. The size and mtime columns are only
+    allocated once a row carries them, and collapsed sequences keep their
+    Sequence (frame ranges) in a side table. Full paths are only built when
+    asked for.
+
+    Directories are registered when their parent lists them, so scanners
+    must add a directory's entries before descending into it, which is what
+    WorkStealingScanner does. add_entries() may be called from several
+    threads.
+    """
+
+    def __init__(self):
+        self._pool = bytearray()
+        # Directory columns; roots keep their full path in the pool
+        self.dir_parent = array('q')
+        self.dir_entry = array('q')
+        self.dir_name_off = array('q')
+        self.dir_name_len = array('l')
+        # Entry columns
+        self.parent = array('i')
+        self.name_off = array('q')
+        self.name_len = array('H')
+        self.kind = array('b')
+        self.size = None
+        self.mtime = None
+        self.sequences = {}  # entry id -> Sequence, for KIND_SEQUENCE rows
+        self._dir_ids = {}  # dir path -> dir id, only needed while adding
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.parent)
+
+    # --- Building ---
+    def _intern(self, name):
+        data = _encode(name)
+        offset = len(self._pool)
+        self._pool += data
+        return offset, len(data)
+
+    def _new_dir(self, parent, entry, offset, length):
+        self.dir_parent.append(parent)
+        self.dir_entry.append(entry)
+        self.dir_name_off.append(offset)
+        self.dir_name_len.append(length)
+        return len(self.dir_parent) - 1
+
+    def add_root(self, path):
+        """Register a scan root and return its directory id"""
+        with self._lock:
+            dir_id = self._dir_ids.get(path)
+            if dir_id is None:
+                dir_id = self._new_dir(UNKNOWN, UNKNOWN, *self._intern(path))
+                self._dir_ids[path] = dir_id
+                self._dir_ids.setdefault(os.path.normpath(path), dir_id)
+            return dir_id
+
+    def add_entries(self, dir_path, rows):
+        """Add one directory's entries.
+
+        rows are (name, kind), (name, kind, size, mtime_ns) or, for
+        collapsed sequences, (key, KIND_SEQUENCE, Sequence).
+        """
+        with self._lock:
+            dir_id = self._dir_ids.get(dir_path)
+            if dir_id is None:
+                dir_id = self._new_dir(UNKNOWN, UNKNOWN, *self._intern(dir_path))
+                self._dir_ids[dir_path] = dir_id
+            for row in rows:
+                name, kind = row[0], row[1]
+                entry = len(self.parent)
+                if kind == KIND_SEQUENCE and len(row) > 2:
+                    self.sequences[entry] = row[2]
+                    row = row[:2]
+                if len(row) > 2 and (row[2] is not None or row[3] is not None):
+                    if self.size is None:
+                        self.size = array('q', [UNKNOWN]) * entry
+                        self.mtime = array('q', [UNKNOWN]) * entry
+                    self.size.append(UNKNOWN if row[2] is None else row[2])
+                    self.mtime.append(UNKNOWN if row[3] is None else row[3])
+                elif self.size is not None:
+                    self.size.append(UNKNOWN)
+                    self.mtime.append(UNKNOWN)
+                offset, length = self._intern(name)
+                self.parent.append(dir_id)
+                self.name_off.append(offset)
+                self.name_len.append(length)
+                self.kind.append(kind)
+                if kind == KIND_DIR:
+                    child = self._new_dir(dir_id, entry, offset, length)
+                    self._dir_ids[os.path.join(dir_path, name)] = child
+            return dir_id
+
+    def freeze(self):
+        """Drop the path lookup used while adding; the store is read-only afterwards"""
+        self._dir_ids = None
+
+    # --- Reading ---
+    def _str(self, offset, length):
+        return self._pool[offset:offset + length].decode('utf-8', 'surrogateescape')
+
+    def name(self, i):
+        return self._str(self.name_off[i], self.name_len[i])
+
+    def dir_path(self, dir_id):
+        parts = []
+        while self.dir_parent[dir_id] != UNKNOWN:
+            parts.append(self._str(self.dir_name_off[dir_id], self.dir_name_len[dir_id]))
+            dir_id = self.dir_parent[dir_id]
+        return os.path.join(self._str(self.dir_name_off[dir_id], self.dir_name_len[dir_id]), *reversed(parts))
+
+    def path(self, i):
+        return os.path.join(self.dir_path(self.parent[i]), self.name(i))
+
+    def roots(self):
+        return [d for d in range(len(self.dir_parent)) if self.dir_parent[d] == UNKNOWN]
+
+    def nbytes(self):
+        """Approximate memory held by the columns and the string pool"""
+        columns = (self.dir_parent, self.dir_entry, self.dir_name_off, self.dir_name_len,
+                   self.parent, self.name_off, self.name_len, self.kind, self.size, self.mtime)
+        return len(self._pool) + sum(col.itemsize * len(col) for col in columns if col is not None)
+
+    def iter_rows(self):
+        """Yield (dir_path, name, kind, size, mtime_ns) in insertion order, like ScanIndex.iter_entries"""
+        last_dir, last_path = UNKNOWN, None
+        for i in range(len(self.parent)):
+            dir_id = self.parent[i]
+            if dir_id != last_dir:
+                last_dir, last_path = dir_id, self.dir_path(dir_id)
+            size = mtime = UNKNOWN
+            if self.size is not None:
+                size, mtime = self.size[i], self.mtime[i]
+            yield (last_path, self.name(i), self.kind[i],
+                   None if size == UNKNOWN else size, None if mtime == UNKNOWN else mtime)
+
+    def _record(self, i, dir_path, name):
+        record = {'Path': os.path.join(dir_path, name), 'File': name}
+        seq = self.sequences.get(i)
+        if seq is not None:
+            record.update(seq.to_dict())
+        return record
+
+    def iter_records(self):
+        """Yield {'Path', 'File'} export records in insertion order"""
+        for i, (dir_path, name, _, _, _) in enumerate(self.iter_rows()):
+            yield self._record(i, dir_path, name)
+
+    def _children(self):
+        """Entry ids grouped per directory: (starts, order) with a counting sort by parent"""
+        n_dirs = len(self.dir_parent)
+        starts = array('q', [0]) * (n_dirs + 1)
+        for dir_id in self.parent:
+            starts[dir_id + 1] += 1
+        for d in range(n_dirs):
+            starts[d + 1] += starts[d]
+        fill = array('q', starts)
+        order = array('q', [0]) * len(self.parent)
+        for i, dir_id in enumerate(self.parent):
+            order[fill[dir_id]] = i
+            fill[dir_id] += 1
+        entry_dirs = {self.dir_entry[d]: d for d in range(n_dirs) if self.dir_entry[d] != UNKNOWN}
+        return starts, order, entry_dirs
+
+    def iter_sorted_records(self):
+        """Yield export records ordered by Path without materializing every path.
+
+        Walks the tree depth-first with each directory's entries sorted by
+        name, placing a subdirectory's contents at name + os.sep, which is
+        exactly where its paths fall in a plain string sort.
+        """
+        starts, order, entry_dirs = self._children()
+        roots = sorted(self.roots(), key=self.dir_path)
+        for root in roots:
+            stack = [(self.dir_path(root), root)]
+            while stack:
+                item = stack.pop()
+                if isinstance(item, dict):
+                    yield item
+                    continue
+                dir_path, dir_id = item
+                items = []
+                for i in order[starts[dir_id]:starts[dir_id + 1]]:
+                    name = self.name(i)
+                    items.append((name, self._record(i, dir_path, name)))
+                    child = entry_dirs.get(i)
+                    if child is not None:
+                        items.append((name + os.sep, (os.path.join(dir_path, name), child)))
+                items.sort(key=lambda pair: pair[0])
+                stack.extend(value for _, value in reversed(items))
+
+    def nested_structure(self, root_path=None):
+        """Build the folder_structure_to_json nested dict (names sorted, files under '__files__')"""
+        starts, order, entry_dirs = self._children()
+        roots = self.roots()
+        if root_path is not None:
+            roots = [d for d in roots if self.dir_path(d) == root_path]
+        if not roots:
+            return {}
+        structure = {}
+        stack = [(roots[0], structure)]
+        while stack:
+            dir_id, node = stack.pop()
+            ids = sorted(order[starts[dir_id]:starts[dir_id + 1]], key=self.name)
+            for i in ids:
+                kind = self.kind[i]
+                if kind == KIND_DIR:
+                    node[self.name(i)] = child_node = {}
+                    child = entry_dirs.get(i)
+                    if child is not None:
+                        stack.append((child, child_node))
+                elif kind in (KIND_FILE, KIND_SEQUENCE):
+                    node.setdefault('__files__', []).append(self.name(i))
+        return structure
+
+
+def store_from_rows(rows, store=None):
+    """Fill a ScanStore from (dir_path, name, kind, size, mtime_ns) rows grouped by directory"""
+    store = store if store is not None else ScanStore()
+    current, batch = None, []
+    for dir_path, name, kind, size, mtime in rows:
+        if dir_path != current:
+            if batch:
+                store.add_entries(current, batch)
+            current, batch = dir_path, []
+        batch.append((name, kind, size, mtime))
+    if batch:
+        store.add_entries(current, batch)
+    return store
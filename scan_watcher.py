@@ -0,0 +1,254 @@
+# scan_watcher.py
+import os
+import time
+import logging
+import threading
+
+# Native change notifications (inotify on Linux) via watchdog, if installed
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+    FileSystemEventHandler = object
+
+log = logging.getLogger(__name__)
+
+# Mount types that do not deliver inotify events for remote changes
+NETWORK_FS_TYPES = {'nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'fuse.sshfs', 'afpfs', 'davfs', '9p'}
+
+
+def is_network_path(path):
+    """Best-effort check whether path lives on a network mount"""
+    if path.startswith('\\\\') or path.startswith('//'):
+        return True
+    try:
+        with open('/proc/mounts', 'r', encoding='utf-8') as f:
+            mounts = [line.split()[:3] for line in f]
+    except OSError:
+        return False
+    path = os.path.realpath(path)
+    best, best_type = '', None
+    for fields in mounts:
+        if len(fields) < 3:
+            continue
+        mount_point = fields[1].replace('\\040', ' ')
+        if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) > len(best):
+            best, best_type = mount_point, fields[2]
+    return best_type in NETWORK_FS_TYPES
+
+
+class ChangeCoalescer:
+    """Collects create/delete events and flushes them as one batch once the burst settles.
+
+    A batch is flushed after `debounce` seconds without new events, or after
+    `max_delay` seconds at the latest, so a render writing thousands of frames
+    produces a handful of updates instead of one per frame. A path created and
+    deleted within the same batch is dropped.
+    """
+
+    def __init__(self, on_changes, debounce=1.0, max_delay=10.0):
+        self.on_changes = on_changes
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._first = self._last = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def push(self, action, path, is_dir=False):
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                self._first = now
+            self._last = now
+            previous = self._pending.get(path)
+            if previous and previous[0] == 'created' and action == 'deleted':
+                del self._pending[path]
+            else:
+                self._pending[path] = (action, is_dir)
+
+    def _run(self):
+        while not self._stop.wait(0.2):
+            self.flush(force=False)
+
+    def flush(self, force=True):
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                return
+            if not force and now - self._last < self.debounce and now - self._first < self.max_delay:
+                return
+            pending, self._pending = self._pending, {}
+        changes = {'created': [], 'deleted': [], 'created_dirs': [], 'deleted_dirs': []}
+        for path, (action, is_dir) in pending.items():
+            changes[action + ('_dirs' if is_dir else '')].append(path)
+        try:
+            self.on_changes(changes)
+        except Exception:
+            # The batch is lost, but watching goes on
+            log.exception("Applying %d watched change(s) failed", len(pending))
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+
+class _WatchdogHandler(FileSystemEventHandler):
+    def __init__(self, coalescer):
+        super().__init__()
+        self.coalescer = coalescer
+
+    def on_created(self, event):
+        self.coalescer.push('created', event.src_path, event.is_directory)
+
+    def on_deleted(self, event):
+        self.coalescer.push('deleted', event.src_path, event.is_directory)
+
+    def on_moved(self, event):
+        self.coalescer.push('deleted', event.src_path, event.is_directory)
+        self.coalescer.push('created', event.dest_path, event.is_directory)
+
+
+class _PollingWatcher:
+    """Fallback watcher: re-stats every directory and re-lists the ones whose mtime changed"""
+
+    def __init__(self, coalescer, interval=5.0):
+        self.coalescer = coalescer
+        self.interval = interval
+        self._roots = []
+        self._snapshot = {}  # dir path -> (mtime_ns, {name: is_dir})
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def add_root(self, root):
+        with self._lock:
+            self._roots.append(root)
+            self._poll_root(root, report=False)
+
+    def _list(self, path):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                names = {entry.name: entry.is_dir(follow_symlinks=False) for entry in it}
+        except OSError:
+            return None
+        return mtime_ns, names
+
+    def _poll_root(self, root, report=True):
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            old = self._snapshot.get(path)
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if old is not None and old[0] == mtime_ns:
+                stack.extend(os.path.join(path, n) for n, d in old[1].items() if d)
+                continue
+            listing = self._list(path)
+            if listing is None:
+                continue
+            self._snapshot[path] = listing
+            names = listing[1]
+            if report and old is not None:
+                for name, is_dir in names.items():
+                    if name not in old[1]:
+                        self.coalescer.push('created', os.path.join(path, name), is_dir)
+                for name, is_dir in old[1].items():
+                    if name not in names:
+                        self.coalescer.push('deleted', os.path.join(path, name), is_dir)
+                        if is_dir:
+                            self._forget(os.path.join(path, name))
+            for name, is_dir in names.items():
+                if is_dir:
+                    child = os.path.join(path, name)
+                    if report and old is not None and child not in self._snapshot and name not in old[1]:
+                        # New directory: its contents were reported with the directory itself
+                        self._poll_root(child, report=False)
+                    else:
+                        stack.append(child)
+
+    def _forget(self, path):
+        prefix = path + os.sep
+        for key in [k for k in self._snapshot if k == path or k.startswith(prefix)]:
+            del self._snapshot[key]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                for root in self._roots:
+                    self._poll_root(root)
+
+    def stop(self):
+        self._stop.set()
+
+
+class FolderWatcher:
+    """Watches folder roots and reports coalesced changes to on_changes(changes).
+
+    changes is a dict of path lists: 'created', 'deleted', 'created_dirs' and
+    'deleted_dirs'; renames arrive as a delete plus a create. Callbacks run on
+    a background thread. Roots on network mounts, or all roots when watchdog
+    is not installed, are polled every poll_interval seconds instead.
+    """
+
+    def __init__(self, on_changes, debounce=1.0, poll_interval=5.0, force_polling=False):
+        self.coalescer = ChangeCoalescer(on_changes, debounce=debounce)
+        self.force_polling = force_polling
+        self.roots = set()
+        self._observer = None
+        self._poller = None
+        self.poll_interval = poll_interval
+
+    def uses_polling(self, root):
+        return self.force_polling or not WATCHDOG_AVAILABLE or is_network_path(root)
+
+    def watched_root(self, path):
+        """The watched root path is, or lies under, or None"""
+        path = os.path.abspath(path)
+        for root in self.roots:
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
+
+    def add_root(self, root):
+        """Start watching root (recursively); returns 'native' or 'polling'.
+
+        A root inside one already watched is covered by it and adds nothing.
+        """
+        root = os.path.abspath(root)
+        covering = self.watched_root(root)
+        if covering is not None:
+            return 'polling' if self.uses_polling(covering) else 'native'
+        self.roots.add(root)
+        if self.uses_polling(root):
+            if self._poller is None:
+                self._poller = _PollingWatcher(self.coalescer, interval=self.poll_interval)
+                self._poller.start()
+            self._poller.add_root(root)
+            return 'polling'
+        if self._observer is None:
+            self._observer = Observer()
+            self._observer.start()
+        self._observer.schedule(_WatchdogHandler(self.coalescer), root, recursive=True)
+        return 'native'
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+        if self._poller is not None:
+            self._poller.stop()
+            self._poller = None
+        self.coalescer.stop()
+        self.roots.clear()
@@ -0,0 +1,218 @@
+# sequence_engine.py
+import os
+import re
+from collections import Counter, defaultdict
+
+# Frame numbers are padded to at least this many digits; shorter numbers (take_1.wav, Interview_2.wav)
+# name separate files, not frames
+MIN_FRAME_DIGITS = 3
+
+# A frame is the last run of MIN_FRAME_DIGITS or more digits before the extension, after an optional
+# '.', '_' or '-' separator: plate.1001.exr, plate_1001.exr, plate1001.exr, 1001.exr
+FRAME_PATTERN = re.compile(r'^(.*?[._-]?)(\d{%d,})(\.[^.]+)$' % MIN_FRAME_DIGITS)
+
+# Fewer numbered files than this sharing a prefix/extension are left as single files
+MIN_SEQUENCE_COUNT = 2
+
+
+def sequence_key(name):
+    """Return the 'prefix####.ext' key a numbered filename would be grouped under, or None"""
+    m = FRAME_PATTERN.match(name)
+    if not m:
+        return None
+    return f"{m.group(1)}####{m.group(3)}"
+
+
+def compact_ranges(frames):
+    """Collapse sorted, unique frame numbers into inclusive (first, last) ranges"""
+    ranges = []
+    for frame in frames:
+        if ranges and frame == ranges[-1][1] + 1:
+            ranges[-1][1] = frame
+        else:
+            ranges.append([frame, frame])
+    return [tuple(r) for r in ranges]
+
+
+def format_ranges(ranges):
+    return ','.join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+class Sequence:
+    """A frame sequence in one directory, stored as frame ranges rather than a file list.
+
+    Frames whose digits do not round-trip through the sequence padding
+    (e.g. 'plate.001.exr' next to 'plate.0002.exr') are kept verbatim in
+    `exceptions`, so names() always reproduces exactly the files that were
+    grouped.
+    """
+
+    __slots__ = ('prefix', 'ext', 'padding', 'ranges', 'exceptions')
+
+    def __init__(self, prefix, ext, padding, ranges, exceptions=()):
+        self.prefix = prefix
+        self.ext = ext
+        self.padding = padding
+        self.ranges = list(ranges)
+        self.exceptions = list(exceptions)
+
+    @classmethod
+    def from_digits(cls, prefix, ext, digits):
+        """Build a sequence from the frame digit strings found for prefix/ext"""
+        # Zero-padded frames fix the padding; unpadded ones (1, 2, ... 10) only set a minimum
+        padded = Counter(len(d) for d in digits if d[0] == '0' and len(d) > 1)
+        padding = padded.most_common(1)[0][0] if padded else min(len(d) for d in digits)
+        frames = []
+        exceptions = []
+        for d in digits:
+            frame = int(d)
+            if len(d) == padding or (d[0] != '0' and len(d) > padding):
+                frames.append(frame)
+            else:
+                exceptions.append(f"{prefix}{d}{ext}")
+        return cls(prefix, ext, padding, compact_ranges(sorted(set(frames))), sorted(exceptions))
+
+    @property
+    def key(self):
+        """Stable identifier used in file lists and prompts"""
+        return f"{self.prefix}####{self.ext}"
+
+    @property
+    def first(self):
+        return self.ranges[0][0] if self.ranges else None
+
+    @property
+    def last(self):
+        return self.ranges[-1][1] if self.ranges else None
+
+    @property
+    def count(self):
+        return sum(b - a + 1 for a, b in self.ranges) + len(self.exceptions)
+
+    @property
+    def missing(self):
+        """Gaps between first and last frame as (first, last) ranges"""
+        return [(b1 + 1, a2 - 1) for (_, b1), (a2, _) in zip(self.ranges, self.ranges[1:])]
+
+    def frame_name(self, frame):
+        return f"{self.prefix}{frame:0{self.padding}d}{self.ext}"
+
+    def names(self):
+        """Yield every filename of the sequence, in frame order, then the exceptions"""
+        for a, b in self.ranges:
+            for frame in range(a, b + 1):
+                yield self.frame_name(frame)
+        yield from self.exceptions
+
+    def frames_text(self):
+        return format_ranges(self.ranges)
+
+    def label(self):
+        """Human-readable form, e.g. 'plate.[1001-1240].exr (3 missing: 1100,1105-1106)'"""
+        text = f"{self.prefix}[{self.frames_text()}]{self.ext}"
+        gaps = self.missing
+        if gaps:
+            text += f" ({sum(b - a + 1 for a, b in gaps)} missing: {format_ranges(gaps)})"
+        return text
+
+    def to_dict(self):
+        info = {'Frames': self.frames_text(), 'Count': self.count, 'Padding': self.padding}
+        if self.missing:
+            info['Missing'] = format_ranges(self.missing)
+        if self.exceptions:
+            info['Exceptions'] = list(self.exceptions)
+        return info
+
+    def __repr__(self):
+        return f"Sequence({self.label()!r})"
+
+
+def group_names(names, min_count=MIN_SEQUENCE_COUNT):
+    """Group the filenames of ONE directory into (singles, sequences).
+
+    Names matching FRAME_PATTERN are bucketed by (prefix, extension) in a
+    single pass with the precompiled pattern; buckets with fewer than
+    min_count members stay single files.
+    """
+    match = FRAME_PATTERN.match
+    singles = []
+    buckets = defaultdict(list)
+    for name in names:
+        m = match(name)
+        if m is None:
+            singles.append(name)
+        else:
+            prefix, digits, ext = m.groups()
+            buckets[(prefix, ext)].append(digits)
+    sequences = []
+    for (prefix, ext), digits in buckets.items():
+        if len(digits) < min_count:
+            singles.extend(f"{prefix}{d}{ext}" for d in digits)
+        else:
+            sequences.append(Sequence.from_digits(prefix, ext, digits))
+    return singles, sequences
+
+
+class SequenceManifest:
+    """Frames of a listed sequence captured at scan time: its directory plus the Sequence.
+
+    Expanding a manifest is an in-memory operation; revalidate() refreshes it
+    from a single listing of the directory.
+    """
+
+    __slots__ = ('dir_path', 'sequence')
+
+    def __init__(self, dir_path, sequence):
+        self.dir_path = dir_path
+        self.sequence = sequence
+
+    @classmethod
+    def for_key(cls, dir_path, key):
+        """Manifest for a 'prefix####.ext' key, filled from one listing of dir_path"""
+        prefix, _, ext = key.partition('####')
+        manifest = cls(dir_path, Sequence(prefix, ext, 4, []))
+        manifest.revalidate()
+        return manifest
+
+    @property
+    def key(self):
+        return self.sequence.key
+
+    def paths(self):
+        return [os.path.join(self.dir_path, name) for name in self.sequence.names()]
+
+    def refresh(self, names):
+        """Rebuild the sequence from a directory listing; returns True if the frames changed"""
+        prefix, ext = self.sequence.prefix, self.sequence.ext
+        digits = []
+        for name in names:
+            if name.startswith(prefix) and name.endswith(ext):
+                m = FRAME_PATTERN.match(name)
+                if m and m.group(1) == prefix and m.group(3) == ext:
+                    digits.append(m.group(2))
+        old = (self.sequence.ranges, self.sequence.exceptions)
+        if digits:
+            self.sequence = Sequence.from_digits(prefix, ext, digits)
+        else:
+            self.sequence = Sequence(prefix, ext, self.sequence.padding, [])
+        return old != (self.sequence.ranges, self.sequence.exceptions)
+
+    def revalidate(self):
+        return revalidate_manifests([self]) > 0
+
+
+def revalidate_manifests(manifests):
+    """Refresh manifests with one scandir per directory; returns how many changed"""
+    by_dir = defaultdict(list)
+    for manifest in manifests:
+        by_dir[manifest.dir_path].append(manifest)
+    changed = 0
+    for dir_path, group in by_dir.items():
+        try:
+            with os.scandir(dir_path) as it:
+                names = [entry.name for entry in it]
+        except OSError:
+            names = []
+        for manifest in group:
+            changed += manifest.refresh(names)
+    return changed
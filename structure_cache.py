@@ -0,0 +1,192 @@
+# structure_cache.py
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from scan_engine import default_scan_workers
+
+# Exact token counts with tiktoken, if installed (the encoding may also need a download)
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('cl100k_base')
+    TIKTOKEN_AVAILABLE = True
+except Exception:
+    _ENCODING = None
+    TIKTOKEN_AVAILABLE = False
+
+
+def estimate_tokens(text):
+    """Token count of text: exact with tiktoken, otherwise about 4 characters per token"""
+    if TIKTOKEN_AVAILABLE:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+# --- Directory tree rendering ---
+def _list_subdirs(path, leaf_limit):
+    """Sorted (name, stat) pairs of the subdirectories of path, or None if it cannot be listed.
+
+    Uses the d_type cached by scandir, so files cost no stat. A directory
+    that yields leaf_limit files before its first subdirectory is treated
+    as a leaf (a frame or cache folder) and not read to the end.
+    """
+    dirs = []
+    files = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        dirs.append((entry.name, entry.stat()))
+                        continue
+                except OSError:
+                    continue
+                files += 1
+                if leaf_limit and files >= leaf_limit and not dirs:
+                    break
+    except OSError:
+        return None
+    dirs.sort(key=lambda d: d[0])
+    return dirs
+
+
+def render_tree(root, max_depth=6, dir_mtimes=None, max_nodes=2000, leaf_limit=1000, trust_nlink=False, workers=None):
+    """Render the folders (no files) under root as a ├──/└── tree, max_depth levels deep.
+
+    Directories are listed level by level on a small pool, so NAS latency
+    overlaps, and at most max_nodes folders are shown; the breadth-first
+    order means a truncated tree still covers the top levels. With
+    trust_nlink, directories whose link count says they have no
+    subdirectories (st_nlink == 2 on POSIX filesystems) are not listed at
+    all; symlinked subdirectories do not count towards it, so this is off by
+    default. The mtime of every directory the tree depends on is recorded
+    in dir_mtimes if given.
+    """
+    try:
+        root_stat = os.stat(root)
+    except OSError:
+        return ""
+    children = {}
+    level = [(root, root_stat)]
+    nodes = 0
+    truncated = False
+    depth = 1
+    with ThreadPoolExecutor(max_workers=workers or default_scan_workers()) as pool:
+        while level and depth <= max_depth and not truncated:
+            to_list = []
+            for path, st in level:
+                if dir_mtimes is not None:
+                    dir_mtimes[path] = st.st_mtime_ns
+                if trust_nlink and st.st_nlink == 2:
+                    children[path] = []
+                else:
+                    to_list.append(path)
+            next_level = []
+            for path, subdirs in zip(to_list, pool.map(lambda p: _list_subdirs(p, leaf_limit), to_list)):
+                subdirs = subdirs or []
+                if max_nodes and nodes + len(subdirs) > max_nodes:
+                    subdirs = subdirs[:max_nodes - nodes]
+                    truncated = True
+                nodes += len(subdirs)
+                children[path] = [name for name, _ in subdirs]
+                next_level.extend((os.path.join(path, name), st) for name, st in subdirs)
+                if truncated:
+                    break
+            level = next_level
+            depth += 1
+    lines = []
+    def _render(path, prefix):
+        names = children.get(path, [])
+        for i, name in enumerate(names):
+            is_last = (i == len(names) - 1)
+            lines.append(f"{prefix}{'└── ' if is_last else '├── '}{name}")
+            _render(os.path.join(path, name), prefix + ("    " if is_last else "│   "))
+    _render(root, "")
+    if truncated:
+        lines.append(f"... (truncated at {max_nodes} folders)")
+    return "\n".join(lines)
+
+
+class StructureSnapshot:
+    """A rendered project tree plus the mtimes of the directories it was built from"""
+
+    def __init__(self, root, depth, text, dir_mtimes):
+        self.root = root
+        self.depth = depth
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.dir_mtimes = dir_mtimes
+        self.checked_at = time.monotonic()
+
+    @property
+    def dir_count(self):
+        return len(self.dir_mtimes)
+
+    def is_current(self):
+        """True while none of the listed directories gained, lost or renamed an entry"""
+        for path, mtime_ns in self.dir_mtimes.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+class StructureCache:
+    """Rendered project-structure snapshots keyed by (project_root, depth).
+
+    render(root, depth, dir_mtimes) must return the tree text and record the
+    mtime of every directory it listed in dir_mtimes (taken before listing).
+    A snapshot is reused until one of those mtimes changes; checking costs
+    one stat per listed directory and is skipped entirely if the snapshot was
+    checked less than `recheck` seconds ago.
+    """
+
+    def __init__(self, render, max_entries=8, recheck=1.0):
+        self.render = render
+        self.max_entries = max_entries
+        self.recheck = recheck
+        self.hits = 0
+        self.misses = 0
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(root, depth):
+        return (os.path.normcase(os.path.abspath(root)), depth)
+
+    def get(self, root, depth):
+        """Return the StructureSnapshot for root at depth, rendering it only if it is stale"""
+        key = self.key(root, depth)
+        # Held while rendering so concurrent callers wait for one walk instead of repeating it
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                now = time.monotonic()
+                if now - snapshot.checked_at < self.recheck or snapshot.is_current():
+                    snapshot.checked_at = now
+                    self._snapshots.move_to_end(key)
+                    self.hits += 1
+                    return snapshot
+            self.misses += 1
+            dir_mtimes = {}
+            text = self.render(root, depth, dir_mtimes)
+            snapshot = StructureSnapshot(root, depth, text, dir_mtimes)
+            self._snapshots[key] = snapshot
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > self.max_entries:
+                self._snapshots.popitem(last=False)
+            return snapshot
+
+    def invalidate(self, root=None):
+        """Forget the snapshots of root (all roots if None)"""
+        with self._lock:
+            if root is None:
+                self._snapshots.clear()
+                return
+            prefix = self.key(root, 0)[0]
+            for key in [k for k in self._snapshots if k[0] == prefix]:
+                del self._snapshots[key]
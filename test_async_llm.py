@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for the providers' asyncio interface against the mock LLM server
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import http_pool
+from llm_providers import LMStudioLLM, OllamaAdapter
+from llm_stream import astream_classification, parse_classification
+from mock_llm_server import MockLLMServer
+from retry_policy import RetryPolicy, status_code
+
+PROMPT = "Sort these.\nFiles to classify:\nshot_010.exr\nedit v2.prproj\n\nProject structure:\n/Footage\n"
+EXPECTED = {"shot_010.exr": "/mock/exr", "edit v2.prproj": "/mock/prproj"}
+
+
+async def closing(*coros):
+    """Await coros together, then close the loop's async clients"""
+    try:
+        return await asyncio.gather(*coros)
+    finally:
+        await http_pool.aclose_clients()
+
+
+def test_concurrent_ainvoke():
+    """Requests awaited together are in flight together and take about one latency"""
+    print("🧪 Testing concurrent ainvoke...")
+    server = MockLLMServer(latency=0.3).start()
+    try:
+        llm = LMStudioLLM("mock-model", base_url=server.url + "/v1")
+        start = time.monotonic()
+        answers = asyncio.run(closing(*(llm.ainvoke(PROMPT) for _ in range(6))))
+        elapsed = time.monotonic() - start
+        assert all(parse_classification(a) == EXPECTED for a in answers), answers
+        # One after another they would take 6 * 0.3s; the margin covers the async client's start-up
+        assert elapsed < 6 * 0.3 * 0.75, elapsed
+        assert server.max_in_flight > 1, server.max_in_flight
+        print(f"✅ 6 requests in {elapsed:.2f}s, up to {server.max_in_flight} in flight"
+              f"{'' if http_pool.HTTPX_AVAILABLE else ' (thread fallback, httpx not installed)'}")
+        return True
+    finally:
+        server.stop()
+
+
+def test_astream_both_shapes():
+    """Server-sent events and Ollama's NDJSON stream into the same pairs"""
+    print("\n🧪 Testing astream for chat completions and Ollama...")
+    server = MockLLMServer().start()
+    try:
+        for llm in (LMStudioLLM("mock-model", base_url=server.url + "/v1"), OllamaAdapter("mock-model", base_url=server.url)):
+            pairs = []
+            answer, = asyncio.run(closing(astream_classification(llm, PROMPT, lambda *pair: pairs.append(pair))))
+            assert parse_classification(answer) == EXPECTED, answer
+            assert dict(pairs) == EXPECTED, pairs
+            # The blocking interface gives the same answer
+            assert parse_classification(llm.invoke(PROMPT)) == EXPECTED
+            assert parse_classification("".join(llm.stream(PROMPT))) == EXPECTED
+        print(f"✅ {server.requests} requests answered in both stream formats")
+        return True
+    finally:
+        server.stop()
+
+
+def test_injected_failures_retried():
+    """Injected 503s are retried by RetryPolicy.acall until every request succeeds"""
+    print("\n🧪 Testing retries against injected failures...")
+    server = MockLLMServer(failure_rate=0.5, seed=7).start()
+    try:
+        llm = OllamaAdapter("mock-model", base_url=server.url)
+        policy = RetryPolicy(max_attempts=10, base_delay=0.01, max_delay=0.05)
+        retries = []
+        answers = asyncio.run(closing(*(policy.acall(lambda: llm.ainvoke(PROMPT), on_retry=lambda *args: retries.append(args))
+                                        for _ in range(5))))
+        assert all(parse_classification(a) == EXPECTED for a in answers)
+        assert server.failures > 0 and len(retries) == server.failures, (server.failures, len(retries))
+        print(f"✅ {server.failures} injected failures retried, {server.requests} requests in all")
+        return True
+    finally:
+        server.stop()
+
+
+def test_structured_output_fallback():
+    """Only a 400 refusing response_format drops it; any other 400 is raised and json_mode stays on"""
+    print("\n🧪 Testing the structured output fallback...")
+    plain, short = MockLLMServer(structured_output=False).start(), MockLLMServer(context_length=10).start()
+    try:
+        for send in (lambda llm: llm.invoke(PROMPT), lambda llm: "".join(llm.stream(PROMPT)),
+                     lambda llm: asyncio.run(closing(llm.ainvoke(PROMPT)))[0],
+                     lambda llm: asyncio.run(closing(astream_classification(llm, PROMPT)))[0]):
+            llm = LMStudioLLM("mock-model", base_url=plain.url + "/v1")
+            assert parse_classification(send(llm)) == EXPECTED and not llm.json_mode
+            llm = LMStudioLLM("mock-model", base_url=short.url + "/v1")
+            try:
+                send(llm)
+                assert False, "should have raised"
+            except Exception as e:
+                assert status_code(e) == 400, e
+            assert llm.json_mode
+        # Each request was sent once, not again without response_format
+        assert short.requests == 4, short.requests
+        print(f"✅ plain-text fallback after {plain.requests // 2} refusals; other 400s raised")
+        return True
+    finally:
+        plain.stop()
+        short.stop()
+
+
+def main():
+    tests = [test_concurrent_ainvoke, test_astream_both_shapes, test_injected_failures_retried, test_structured_output_fallback]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
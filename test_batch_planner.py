@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test script for token-budget batch packing
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batch_planner import BatchPlanner, file_tokens
+
+
+def test_token_packing():
+    """Short names pack into bigger batches than long ones; max_files still caps a batch"""
+    print("🧪 Testing token-budget packing...")
+    short = [f"A{i:03d}.exr" for i in range(400)]
+    long = [f"SH{i:03d}_comp_plate_main_cleanup_denoise_retime_v{i:03d}_final_approved.exr" for i in range(400)]
+    planner = BatchPlanner(8192, 2048)
+    short_batches = planner.plan(short, fixed_tokens=1500)
+    long_batches = planner.plan(long, fixed_tokens=1500)
+    assert sum(map(len, short_batches)) == 400 and sum(map(len, long_batches)) == 400
+    assert len(short_batches[0]) > len(long_batches[0]), (len(short_batches[0]), len(long_batches[0]))
+    for batch in long_batches:
+        assert sum(file_tokens(name)[1] for name in batch) <= planner.output_tokens
+    capped = BatchPlanner(8192, 2048, max_files=10).plan(short, fixed_tokens=1500)
+    assert max(map(len, capped)) == 10
+    # A prompt that leaves no room still sends one file at a time
+    assert planner.next_batch(long, 0, fixed_tokens=10 ** 6) == 1
+    print(f"✅ {len(short_batches[0])} short vs {len(long_batches[0])} long names per batch")
+    return True
+
+
+def test_adaptive_scale():
+    """Truncated answers shrink the following batches; clean ones grow them back"""
+    print("\n🧪 Testing adaptive batch scale...")
+    names = [f"SH{i:03d}_plate_v001.exr" for i in range(1000)]
+    planner = BatchPlanner.for_provider("OpenRouter")
+    first = planner.next_batch(names, 0, fixed_tokens=2000)
+    planner.record(5.0, truncated=True)
+    planner.record(5.0, truncated=True)
+    shrunk = planner.next_batch(names, 0, fixed_tokens=2000)
+    assert shrunk < first, (shrunk, first)
+    planner.record(planner.target_latency + 1, truncated=False)
+    assert planner.next_batch(names, 0, fixed_tokens=2000) <= shrunk
+    for _ in range(20):
+        planner.record(5.0, truncated=False)
+    assert planner.scale == 1.0 and planner.next_batch(names, 0, fixed_tokens=2000) == first
+    assert planner.truncation_rate == 2 / 23, planner.truncation_rate
+    print(f"✅ {first} -> {shrunk} -> {first} files per batch")
+    return True
+
+
+def main():
+    tests = [test_token_packing, test_adaptive_scale]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
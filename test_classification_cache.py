@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test script for the persistent classification cache
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from classification_cache import ClassificationCache
+
+
+def test_hits_and_context():
+    """Answers are reused only for the same template, structure, provider and model"""
+    print("🧪 Testing classification cache lookups...")
+    tmp = tempfile.mkdtemp()
+    try:
+        db = os.path.join(tmp, "cache.db")
+        cache = ClassificationCache(db)
+        context = cache.context("template", "├── sh010", "OpenRouter", "model-a")
+        cache.put_many(context, {"A001C003_230101_R1AB.mov": "/sh010/plates", "notes.txt": "/docs", "bad": None})
+        cache.close()
+        # Persisted across instances; the filename match ignores case
+        cache = ClassificationCache(db)
+        found = cache.get_many(context, ["a001c003_230101_r1ab.mov", "notes.txt", "new.exr"])
+        assert found == {"a001c003_230101_r1ab.mov": "/sh010/plates", "notes.txt": "/docs"}, found
+        assert (cache.hits, cache.misses) == (2, 1), (cache.hits, cache.misses)
+        for other in (cache.context("template", "├── sh020", "OpenRouter", "model-a"),
+                      cache.context("template", "├── sh010", "OpenRouter", "model-b")):
+            assert cache.get_many(other, ["notes.txt"]) == {}
+        print(f"✅ {cache.hits} hits, {cache.misses} misses")
+        cache.close()
+        return True
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def test_lru_eviction():
+    """Beyond max_entries the least recently used go; entries past max_age_days expire"""
+    print("\n🧪 Testing classification cache eviction...")
+    tmp = tempfile.mkdtemp()
+    try:
+        cache = ClassificationCache(os.path.join(tmp, "cache.db"), max_entries=3, max_age_days=1)
+        context = cache.context("t", "s", "Ollama", "m")
+        for i in range(3):
+            cache.put_many(context, {f"file{i}.exr": "/plates"})
+            time.sleep(0.01)
+        cache.get_many(context, ["file0.exr"])  # file1 is now the least recently used
+        cache.put_many(context, {"file3.exr": "/plates"})
+        cache.evict()
+        assert len(cache) == 3 and cache.get_many(context, ["file1.exr"]) == {}, len(cache)
+        cache.conn.execute("UPDATE classifications SET used_at = used_at - 2 * 86400 WHERE name = 'file0.exr'")
+        cache.evict()
+        assert cache.get_many(context, ["file0.exr", "file2.exr", "file3.exr"]).keys() == {"file2.exr", "file3.exr"}
+        print(f"✅ {len(cache)} entries kept")
+        cache.close()
+        return True
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    tests = [test_hits_and_context, test_lru_eviction]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test script for spreading requests over several servers with failover
+"""
+
+import os
+import sys
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from endpoint_pool import EndpointPool, CircuitBreaker, split_urls, pooled
+from llm_providers import OllamaAdapter, LMStudioLLM
+from llm_stream import stream_classification, parse_classification
+from mock_llm_server import MockLLMServer
+
+PROMPT = "Files to classify:\nshot_010.exr\n"
+EXPECTED = {"shot_010.exr": "/mock/exr"}
+
+
+class ChunkedLLM:
+    """A client streaming a fixed answer, noting when its stream was closed"""
+
+    provider = "Fake"
+    model = "m"
+    base_url = "fake://"
+
+    def __init__(self):
+        self.closed = 0
+
+    def stream(self, prompt):
+        try:
+            yield from ['{"shot_010.exr": ', '"/mock/exr"', '}']
+        finally:
+            self.closed += 1
+
+    async def astream(self, prompt):
+        try:
+            for chunk in ['{"shot_010.exr": ', '"/mock/exr"', '}']:
+                yield chunk
+        finally:
+            self.closed += 1
+
+
+def test_routing_by_latency():
+    """Busy or slow servers get fewer requests; every server gets some"""
+    print("🧪 Testing request routing...")
+    fast, slow = MockLLMServer(latency=0.05).start(), MockLLMServer(latency=0.3).start()
+    try:
+        assert split_urls(f" {fast.url}, {slow.url};") == [fast.url, slow.url]
+        single = pooled([OllamaAdapter("m", base_url=fast.url)])
+        assert isinstance(single, OllamaAdapter)
+        pool = pooled([OllamaAdapter("m", base_url=fast.url), OllamaAdapter("m", base_url=slow.url)])
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            answers = list(executor.map(pool.invoke, [PROMPT] * 40))
+        assert all(parse_classification(a) == EXPECTED for a in answers)
+        assert fast.requests + slow.requests == 40 and slow.requests > 0
+        assert fast.requests > 2 * slow.requests, (fast.requests, slow.requests)
+        assert all(e.outstanding == 0 for e in pool.endpoints)
+        print(f"✅ fast server {fast.requests} requests, slow server {slow.requests}")
+        return True
+    finally:
+        fast.stop()
+        slow.stop()
+
+
+def test_failover_and_breaker():
+    """Requests to a dead server go to the next one; the breaker ejects it, then lets one trial through"""
+    print("\n🧪 Testing failover and circuit breaker...")
+    live = MockLLMServer().start()
+    dead = MockLLMServer()
+    dead_url = dead.url
+    dead.server_close()  # nothing listens there any more
+    try:
+        pool = EndpointPool([LMStudioLLM("m", base_url=dead_url + "/v1"), LMStudioLLM("m", base_url=live.url + "/v1")],
+                            strategy="least_outstanding", failure_threshold=2, cooldown=1.0)
+        dead_endpoint = pool.endpoints[0]
+        for _ in range(6):
+            assert parse_classification(pool.invoke(PROMPT)) == EXPECTED
+            assert parse_classification(stream_classification(pool, PROMPT)) == EXPECTED
+        # Two failures open the breaker; after that the dead server gets nothing until the cooldown ends
+        assert dead_endpoint.failures == 2 and dead_endpoint.breaker.opened == 1, dead_endpoint.failures
+        assert live.requests == 12
+        time.sleep(1.05)
+        assert parse_classification(asyncio.run(pool.ainvoke(PROMPT))) == EXPECTED
+        assert dead_endpoint.failures == 3 and dead_endpoint.breaker.state(time.monotonic()) == "open"
+        # A 404 is the request's fault, not the server's: raised at once, and the breaker stays closed
+        wrong_path = EndpointPool([OllamaAdapter("m", base_url=live.url + "/nothing-here")], failure_threshold=1)
+        try:
+            wrong_path.invoke(PROMPT)
+            assert False, "should have raised"
+        except Exception as e:
+            assert "404" in str(e), e
+        assert wrong_path.endpoints[0].failures == 0 and wrong_path.endpoints[0].breaker.state(time.monotonic()) == "closed"
+        # Half-open lets exactly one trial through
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=10)
+        breaker.failure(0)
+        assert not breaker.available(5) and breaker.state(11) == "half-open" and breaker.available(11)
+        breaker.start(11)
+        assert not breaker.available(11)
+        breaker.success()
+        assert breaker.state(12) == "closed"
+        print(f"✅ dead server ejected after 2 failures and again after its trial; live server answered {live.requests}")
+        print(pool.summary())
+        return True
+    finally:
+        live.stop()
+
+
+def test_abandoned_stream():
+    """A stream closed before its end closes the server's stream and counts as neither success nor failure"""
+    print("\n🧪 Testing abandoned streams...")
+    llm = ChunkedLLM()
+    pool = EndpointPool([llm], failure_threshold=3)
+    endpoint = pool.endpoints[0]
+    endpoint.breaker.failure(time.monotonic())
+
+    def read_one():
+        stream = pool.stream(PROMPT)
+        next(stream)
+        stream.close()
+
+    async def aread_one():
+        stream = pool.astream(PROMPT)
+        await stream.__anext__()
+        await stream.aclose()
+
+    for abandon in (read_one, lambda: asyncio.run(aread_one())):
+        abandon()
+        assert endpoint.outstanding == 0 and endpoint.latency is None and endpoint.breaker.failures == 1
+    assert llm.closed == 2, llm.closed
+    # Read to the end, the answer is a success
+    assert parse_classification(stream_classification(pool, PROMPT)) == EXPECTED
+    assert endpoint.breaker.failures == 0 and endpoint.latency is not None
+    print("✅ abandoned streams closed upstream and left the breaker as it was")
+    return True
+
+
+def main():
+    tests = [test_routing_by_latency, test_failover_and_breaker, test_abandoned_stream]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script for the basename index behind find_full_path and classification results
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from file_index import FileIndex, resolve_name
+from sequence_engine import SequenceManifest, group_names
+
+
+def test_duplicates_and_manifests():
+    """Shared basenames keep every path; sequence entries resolve to their manifest"""
+    print("🧪 Testing file index lookups...")
+    root = os.path.join(os.sep, "proj")
+    a = os.path.join(root, "sh010", "notes.txt")
+    b = os.path.join(root, "sh020", "notes.txt")
+    index = FileIndex([a, b])
+    assert index.paths("notes.txt") == [a, b] and index.paths(a) == [a]
+    assert index.duplicates() == {"notes.txt": [a, b]}
+    _, (seq,) = group_names([f"plate.{f}.exr" for f in range(1001, 1004)])
+    seq_dir = os.path.join(root, "sh010", "plates")
+    seq_path = os.path.join(seq_dir, seq.key)
+    index.add(seq_path, SequenceManifest(seq_dir, seq))
+    assert index.manifest("plate.####.exr").paths()[0] == os.path.join(seq_dir, "plate.1001.exr")
+    index.discard(a)
+    assert index.paths("notes.txt") == [b] and a not in index and len(index) == 2
+    # The batch wins over the rest of the run
+    assert resolve_name("notes.txt", FileIndex([a]), index) == [a]
+    assert resolve_name("missing.txt", FileIndex(), index) == []
+    print("✅ duplicates kept, manifests found, batch resolution preferred")
+    return True
+
+
+def test_linear_resolution():
+    """Resolving a 50k-file classification is a hash lookup per name"""
+    print("\n🧪 Testing resolution of a 50k-file classification...")
+    paths = [os.path.join(os.sep, "proj", f"sh{i // 100:03d}", f"file_{i:05d}.exr") for i in range(50000)]
+    start = time.perf_counter()
+    index = FileIndex(paths)
+    resolved = 0
+    for i in range(0, len(paths), 15):
+        batch = FileIndex(paths[i:i + 15])
+        for path in paths[i:i + 15]:
+            resolved += len(resolve_name(os.path.basename(path), batch, index))
+    elapsed = time.perf_counter() - start
+    assert resolved == len(paths), resolved
+    print(f"✅ {resolved} names resolved in {elapsed:.2f}s")
+    return elapsed < 5
+
+
+def main():
+    tests = [test_duplicates_and_manifests, test_linear_resolution]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
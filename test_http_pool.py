@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the pooled keep-alive sessions behind the provider wrappers
+"""
+
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import http_pool
+
+
+class ChatHandler(BaseHTTPRequestHandler):
+    """Answers every POST like a chat completion endpoint, keeping the connection open"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"choices": [{"message": {"content": "{}"}}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_connection_reuse():
+    """Requests to one endpoint share a session and, after the first, an open connection"""
+    print("🧪 Testing pooled keep-alive sessions...")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+        assert http_pool.session_for(url) is http_pool.session_for(f"http://127.0.0.1:{server.server_port}/v1/models")
+        before = http_pool.stats()
+        for _ in range(5):
+            response = http_pool.session_for(url).post(url, json={"model": "m"}, timeout=http_pool.DEFAULT_TIMEOUT)
+            assert response.json()["choices"][0]["message"]["content"] == "{}"
+        sent, opened = (now - then for now, then in zip(http_pool.stats(), before))
+        assert (sent, opened) == (5, 1), (sent, opened)
+        summary = http_pool.reuse_summary(before)
+        assert "80%" in summary, summary
+        # A new pool size starts new sessions but keeps the counts
+        http_pool.set_pool_size(http_pool.DEFAULT_POOL_SIZE + 1)
+        assert http_pool.stats() == (before[0] + 5, before[1] + 1)
+        http_pool.session_for(url).post(url, json={}, timeout=http_pool.DEFAULT_TIMEOUT).close()
+        assert http_pool.stats()[1] == before[1] + 2
+        print(f"✅ {summary}")
+        return True
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    tests = [test_connection_reuse]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for streamed LLM answers and the incremental JSON pair parser
+"""
+
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_stream import JsonPairParser, iter_sse_content, stream_classification, extract_json_object, parse_classification
+
+
+def test_incremental_pairs():
+    """Pairs come out as soon as they are complete, however the answer is chunked"""
+    print("🧪 Testing incremental JSON pair parsing...")
+    answer = ('Here is the classification:\n```json\n{\n  "SH010_plate_v001.exr": "/SH010/plates",\n'
+              '  "notes \\"final\\".txt": "/docs",\n  "skip.me": {"nested": ["a", "}"]},\n'
+              '  "count": 3,\n  "Ünïcode_ß.mov": "/footage/\\u00fc"\n}\n```\nThe {rest} is ignored: {"x": "y"}')
+    expected = {k: v for k, v in json.loads(answer[answer.index('{'):answer.index('```', 40)]).items() if isinstance(v, str)}
+    for size in (1, 3, 7, len(answer)):
+        parser = JsonPairParser()
+        found = []
+        for i in range(0, len(answer), size):
+            found.extend(parser.feed(answer[i:i + size]))
+        assert dict(found) == expected and parser.done, (size, found)
+    # The first pair is reported before the object is complete
+    parser = JsonPairParser()
+    assert parser.feed('{"a.exr": "/plates", "b.ex') == [("a.exr", "/plates")]
+    assert parser.feed('r": "/pl') == [] and parser.feed('ates"') == [("b.exr", "/plates")]
+    print(f"✅ {len(expected)} pairs at every chunk size")
+    return True
+
+
+class FakeResponse:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+
+class StreamingLLM:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def stream(self, prompt):
+        yield from self.chunks
+
+
+class PlainLLM:
+    def invoke(self, prompt):
+        return '{"a.exr": "/plates"}'
+
+
+def test_sse_and_stream():
+    """Server-sent deltas are joined into the answer, reporting pairs on the way"""
+    print("\n🧪 Testing server-sent event streams...")
+    events = [': keep-alive', ''] + [
+        f"data: {json.dumps({'choices': [{'delta': {'content': text}}]})}".encode('utf-8')
+        for text in ('{"sh', 'ot_ü.exr": "/pl', 'ates"}')
+    ] + [b'data: {"choices": [{"delta": {}, "finish_reason": "stop"}]}', b'data: [DONE]', b'data: {"late": 1}']
+    chunks = list(iter_sse_content(FakeResponse(events)))
+    assert ''.join(chunks) == '{"shot_ü.exr": "/plates"}', chunks
+    seen = []
+    text = stream_classification(StreamingLLM(chunks), "prompt", lambda name, folder: seen.append((name, folder, len(seen))))
+    assert text == ''.join(chunks) and seen == [("shot_ü.exr", "/plates", 0)]
+    # Without stream() the answer is invoked whole
+    assert stream_classification(PlainLLM(), "prompt", lambda *pair: seen.append(pair)) == '{"a.exr": "/plates"}'
+    assert seen[-1] == ("a.exr", "/plates")
+    print(f"✅ {len(chunks)} deltas read")
+    return True
+
+
+def test_balanced_extraction():
+    """The first decodable object is found past prose, fences and braces inside strings"""
+    print("\n🧪 Testing balanced-brace extraction...")
+    answer = 'Files use {shot} names.\n```json\n{"a {1}.exr": "/plates/{x}", "b.txt": {"x": 1}}\n```'
+    assert extract_json_object(answer) == {"a {1}.exr": "/plates/{x}", "b.txt": {"x": 1}}
+    assert parse_classification(answer) == {"a {1}.exr": "/plates/{x}"}
+    assert parse_classification('{"a": "/x"}') == {"a": "/x"}  # single braces (the old regex needed {{ }})
+    # A truncated answer keeps its complete pairs; no object at all is None
+    assert parse_classification('{"a.exr": "/plates", "b.exr": "/pla') == {"a.exr": "/plates"}
+    assert parse_classification("I cannot classify these files.") is None
+    print("✅ objects extracted, truncated answers salvaged")
+    return True
+
+
+def main():
+    tests = [test_incremental_pairs, test_sse_and_stream, test_balanced_extraction]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for local model warm-up, keep-alive and load/inference timings
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_providers import OllamaAdapter, LMStudioLLM, KEEP_ALIVE
+from llm_stream import stream_classification, astream_classification, parse_classification
+from endpoint_pool import pooled
+from mock_llm_server import MockLLMServer
+from model_warmup import ModelWarmer, timing_summary
+
+PROMPT = "Files to classify:\nshot_010.exr\n"
+EXPECTED = {"shot_010.exr": "/mock/exr"}
+
+
+def test_warm_up_and_timings():
+    """warm_up() loads the model before the first batch; load and inference time are counted apart"""
+    print("🧪 Testing warm-up and model timings...")
+    server = MockLLMServer(latency=0.05, load_time=0.4).start()
+    try:
+        llm = OllamaAdapter("m", base_url=server.url)
+        assert llm._request(PROMPT)[1]["keep_alive"] == KEEP_ALIVE
+        loaded_in = llm.warm_up()
+        assert 0.35 <= loaded_in <= 0.45 and server.loaded == {"m"}, loaded_in
+        assert parse_classification(llm.invoke(PROMPT)) == EXPECTED
+        assert parse_classification(stream_classification(llm, PROMPT)) == EXPECTED
+        assert parse_classification(asyncio.run(astream_classification(llm, PROMPT))) == EXPECTED
+        # Nothing waited on a load
+        assert llm.timings.requests == 3 and llm.timings.load == 0
+        assert abs(llm.timings.inference - 0.15) < 1e-6
+        # Unloaded, the next request pays for the load, and the summary shows it
+        llm.release()
+        assert server.loaded == set()
+        llm.invoke(PROMPT)
+        assert abs(llm.timings.load - 0.4) < 1e-6 and server.loads == 2
+        assert timing_summary(llm) == "Model time: 0.4s loading, 0.2s inference over 4 requests", timing_summary(llm)
+        # LM Studio is asked to keep the model for the session and warmed with a one-token answer
+        studio = LMStudioLLM("s", base_url=server.url + "/v1")
+        assert studio._request(PROMPT)[1]["ttl"] == KEEP_ALIVE
+        assert studio.warm_up() >= 0.4 and "s" in server.loaded
+        assert timing_summary(studio) is None
+        print(f"✅ model loaded in {loaded_in:.1f}s ahead of the batches; {timing_summary(llm)}")
+        return True
+    finally:
+        server.stop()
+
+
+def test_warmer():
+    """Only the settled selection is warmed, once per server, and unloaded on close only when asked"""
+    print("\n🧪 Testing ModelWarmer...")
+    first, second = MockLLMServer(load_time=0.2).start(), MockLLMServer(load_time=0.2).start()
+    dead = MockLLMServer()
+    dead_url = dead.url
+    dead.server_close()
+    messages = []
+    try:
+        warmer = ModelWarmer(messages.append, delay=0.1)
+        # Refilling the model list picks several models in a row; only the last is loaded
+        for model in ("a", "b", "c"):
+            warmer.warm(pooled([OllamaAdapter(model, base_url=first.url), OllamaAdapter(model, base_url=second.url)]))
+        time.sleep(0.5)
+        assert first.loaded == {"c"} and second.loaded == {"c"}, (first.loaded, second.loaded)
+        assert len(messages) == 2 and all("ready at" in m and "loaded in 0.2s" in m for m in messages), messages
+        # Picking it again does not reload it; a server that is down is reported and tried again next time
+        warmer.warm(OllamaAdapter("c", base_url=first.url))
+        time.sleep(0.3)
+        assert first.loads == 1 and first.requests == 1 and len(messages) == 2
+        warmer.warm(OllamaAdapter("c", base_url=dead_url))
+        time.sleep(0.3)
+        assert len(messages) == 3 and messages[-1].startswith("Could not load Ollama model c"), messages
+        assert (dead_url + "/api/generate", "c") not in warmer._warmed
+        warmer.close()
+        assert first.loaded == {"c"} and second.loaded == {"c"}
+        warmer.close(unload=True)
+        assert first.loaded == set() and second.loaded == set()
+        # A server that never answers holds closing up for the deadline only
+        silent = socket.socket()
+        silent.bind(("127.0.0.1", 0))
+        silent.listen()
+        try:
+            warmer._warmed[("silent", "c")] = (OllamaAdapter("c", base_url="http://127.0.0.1:%d" % silent.getsockname()[1]), 0)
+            start = time.monotonic()
+            warmer.close(unload=True, deadline=0.3)
+            assert time.monotonic() - start < 0.6, time.monotonic() - start
+        finally:
+            silent.close()
+        print(f"✅ {len(messages)} log lines, e.g. {messages[0]}")
+        return True
+    finally:
+        first.stop()
+        second.stop()
+
+
+def main():
+    tests = [test_warm_up_and_timings, test_warmer]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-provider rate limiter
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rate_limiter
+from rate_limiter import RateLimiter, parse_reset
+from llm_providers import LMStudioLLM, RateLimitError
+from llm_stream import parse_classification
+from mock_llm_server import MockLLMServer
+from retry_policy import RetryPolicy
+
+PROMPT = "Files to classify:\nshot_010.exr\n"
+
+
+def test_buckets_and_headers():
+    """Requests and tokens are paced by their buckets; rate-limit headers and 429s adjust them"""
+    print("🧪 Testing token buckets...")
+    assert parse_reset("1s") == 1 and parse_reset("6m0s") == 360 and abs(parse_reset("20ms") - 0.02) < 1e-9
+    assert 9 <= parse_reset(str(int((time.time() + 10) * 1000))) <= 10 and parse_reset("soon") is None
+    # 600 requests per minute with two seconds of burst: 20 at once, then 10 a second
+    limiter = RateLimiter(requests_per_minute=600)
+    start = time.monotonic()
+    for _ in range(30):
+        limiter.acquire()
+    assert 0.8 <= time.monotonic() - start <= 1.5, time.monotonic() - start
+    # Tokens: 10000 a second, 20000 at once
+    limiter = RateLimiter(tokens_per_minute=600000)
+    start = time.monotonic()
+    limiter.acquire(12000)
+    limiter.acquire(12000)
+    assert 0.3 <= time.monotonic() - start <= 0.8, time.monotonic() - start
+    # A 429 pauses every request for its Retry-After and lowers the rate; answers bring it back
+    limiter = RateLimiter(requests_per_minute=600)
+    limiter.observe(429, {"Retry-After": "0.3"})
+    assert limiter.requests.per_minute == 450 and limiter.throttled == 1
+    assert limiter.acquire() >= 0.25
+    for _ in range(20):
+        limiter.observe(200, {})
+    assert limiter.requests.per_minute == 600
+    # The server's own limit replaces the assumed one; nothing left pauses until its reset
+    limiter = RateLimiter()
+    limiter.observe(200, {"x-ratelimit-limit-requests": "120", "x-ratelimit-remaining-requests": "0",
+                          "x-ratelimit-reset-requests": "300ms"})
+    assert limiter.requests.limit == 120 and 0.25 <= limiter.acquire() <= 0.7
+    # Limits set in the UI replace the provider's; unchanged limits keep what was learned
+    rate_limiter.set_limits("Mistral", "m")
+    learned = rate_limiter.limiter_for("Mistral", "m")
+    assert learned.requests.limit == 60 and learned.tokens.limit == 500000
+    rate_limiter.set_limits("Mistral", "m")
+    assert rate_limiter.limiter_for("Mistral", "m") is learned
+    rate_limiter.set_limits("Mistral", "m", requests_per_minute=30)
+    assert rate_limiter.limiter_for("Mistral", "m").requests.limit == 30
+    assert rate_limiter.limiter_for("Ollama", "m").requests is None
+    print("✅ buckets pace requests and tokens; 429s and headers adjust them")
+    return True
+
+
+def test_throttling_server():
+    """Against a server allowing 10 requests a second, the limiter learns the limit from the first 429"""
+    print("\n🧪 Testing against a rate-limited server...")
+    server = MockLLMServer(rate_limit=(10, 1.0)).start()
+    try:
+        llm = LMStudioLLM("throttled-model", base_url=server.url + "/v1")
+        limiter = rate_limiter.limiter_for(llm.provider, llm.model)
+        try:
+            for _ in range(11):
+                llm.invoke(PROMPT)
+            assert False, "should have been throttled"
+        except RateLimitError as e:
+            assert e.status_code == 429 and e.retry_after is not None
+        assert limiter.requests.limit == 600 and limiter.throttled == 1
+        policy = RetryPolicy(max_attempts=6, base_delay=0.05, max_delay=0.5)
+
+        def classify(_):
+            def send():
+                limiter.acquire()
+                return llm.invoke(PROMPT)
+            return policy.call(send)
+
+        throttled = server.throttled
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            answers = list(executor.map(classify, range(30)))
+        elapsed = time.monotonic() - start
+        assert all(parse_classification(a) == {"shot_010.exr": "/mock/exr"} for a in answers)
+        assert server.throttled - throttled <= 3, server.throttled - throttled
+        print(f"✅ 30 requests in {elapsed:.1f}s with {server.throttled - throttled} more 429s; {limiter.summary()}")
+        return True
+    finally:
+        server.stop()
+
+
+def main():
+    tests = [test_buckets_and_headers, test_throttling_server]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
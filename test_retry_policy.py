@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test script for request retries and the failure ledger
+"""
+
+import os
+import sys
+import time
+from email.utils import formatdate
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from retry_policy import RetryPolicy, FailureLedger, retry_after, status_code, is_fatal, is_answer_error
+from llm_stream import AnswerError
+from llm_providers import LMStudioLLM
+from mock_llm_server import MockLLMServer
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.response = FakeResponse(status, headers)
+
+
+def wrapped(error):
+    """An HTTP error re-raised as a plain Exception, the way the provider wrappers report it"""
+    try:
+        raise error
+    except HTTPError as e:
+        try:
+            raise Exception(f"API Error: {e}")
+        except Exception as outer:
+            return outer
+
+
+def test_backoff_and_retry_after():
+    """Transient errors are retried with bounded jittered waits; Retry-After is waited out"""
+    print("🧪 Testing retry backoff...")
+    policy = RetryPolicy(max_attempts=4, base_delay=0.01, max_delay=0.05)
+    for retry in range(6):
+        assert 0 <= policy.delay(retry) <= min(0.05, 0.01 * 2 ** retry)
+    error = wrapped(HTTPError(429, {"Retry-After": "0.2"}))
+    assert status_code(error) == 429 and retry_after(error) == 0.2
+    assert 55 <= retry_after(HTTPError(503, {"Retry-After": formatdate(time.time() + 60, usegmt=True)})) <= 60
+    assert policy.delay(0, error) >= 0.2
+    assert RetryPolicy(max_retry_after=10).delay(0, HTTPError(429, {"Retry-After": "3600"})) is None
+    calls = []
+
+    def flaky():
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            raise error
+        return "ok"
+
+    retries = []
+    assert policy.call(flaky, on_retry=lambda *args: retries.append(args)) == "ok"
+    assert len(calls) == 3 and [r[0] for r in retries] == [1, 2]
+    assert calls[1] - calls[0] >= 0.2, calls
+    print(f"✅ {len(retries)} retries, first after {calls[1] - calls[0]:.2f}s")
+    return True
+
+
+def test_give_up_and_ledger():
+    """Client errors are not retried, attempts are capped, and failed files are kept"""
+    print("\n🧪 Testing non-retryable errors and the failure ledger...")
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001)
+    for error, expected_calls in ((HTTPError(400), 1), (wrapped(HTTPError(401)), 1), (ConnectionError("reset"), 3)):
+        calls = []
+
+        def failing():
+            calls.append(1)
+            raise error
+
+        try:
+            policy.call(failing)
+            assert False, "should have raised"
+        except Exception as e:
+            assert e is error
+        assert len(calls) == expected_calls, (error, len(calls))
+    assert is_fatal(wrapped(HTTPError(401))) and not is_fatal(HTTPError(400)) and not is_fatal(ValueError("no JSON"))
+    # A stop request ends the wait instead of sitting out the backoff
+    def unavailable():
+        raise HTTPError(503, {"Retry-After": "5"})
+
+    start = time.monotonic()
+    try:
+        RetryPolicy().call(unavailable, should_stop=lambda: time.monotonic() - start > 0.1)
+    except HTTPError:
+        pass
+    assert time.monotonic() - start < 1
+    ledger = FailureLedger()
+    ledger.record(["/a/bad name.exr", "/a/other.exr"], ValueError("no JSON object in the answer"))
+    ledger.record(["/a/other.exr"], "left out of the answer")
+    assert ledger.files() == ["/a/bad name.exr", "/a/other.exr"] and len(ledger) == 2
+    assert ledger.entries["/a/other.exr"] == "left out of the answer"
+    print(f"✅ {len(ledger)} failed files kept for Retry Failed")
+    return True
+
+
+def test_only_answer_errors_split():
+    """A batch is split only when its answer is unusable; a 429 that outlasts the retries is not"""
+    print("\n🧪 Testing which failures split a batch...")
+    server = MockLLMServer(rate_limit=(1, 10)).start()
+    try:
+        llm = LMStudioLLM("mock-model", base_url=server.url + "/v1")
+        policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_retry_after=1)
+        policy.call(lambda: llm.invoke("Files to classify:\nshot_010.exr\n"))
+        try:
+            policy.call(lambda: llm.invoke("Files to classify:\nshot_010.exr\nshot_020.exr\n"))
+            assert False, "should have raised"
+        except Exception as e:
+            throttled = e
+        # The Retry-After is beyond max_retry_after, so the policy gives up at once and nothing is resent
+        assert status_code(throttled) == 429 and server.requests == 2, (throttled, server.requests)
+        assert not is_answer_error(throttled)
+        assert not is_answer_error(wrapped(HTTPError(503))) and not is_answer_error(ConnectionError("reset"))
+        assert is_answer_error(AnswerError("no JSON object in the answer"))
+        try:
+            try:
+                raise AnswerError("no JSON object in the answer")
+            except AnswerError:
+                raise RuntimeError("batch 3 failed")
+        except RuntimeError as e:
+            assert is_answer_error(e)
+        print(f"✅ 429 kept whole after {server.requests} requests; unusable answers split")
+        return True
+    finally:
+        server.stop()
+
+
+def main():
+    tests = [test_backoff_and_retry_after, test_give_up_and_ledger, test_only_answer_errors_split]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test script for the local rule engine compiled from the classification prompts
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rule_engine import RuleEngine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_template(name):
+    """Prompt text as the apps load it (markdown heading lines dropped)"""
+    with open(os.path.join(HERE, name), encoding='utf-8') as f:
+        return ''.join(line for line in f if not line.strip().startswith('#') or line.strip() == '#')
+
+
+def test_kent_rules():
+    """Camera patterns win over extensions; project and interchange files map to their folders"""
+    print("🧪 Testing KENT rules...")
+    rules = RuleEngine.from_template(load_template('prompt_kent.md'))
+    assert [camera for camera, _, _ in rules.camera_rules] == ['ARRI', 'RED', 'Sony', 'Canon', 'DJI']
+    expected = {
+        'A001C001_220101_R1MP4.mov': 'Video/Footage/ARRI/A001C001',
+        'A001C001_220101_R1MP4.EXR': 'Video/Footage/ARRI/A001C001',
+        'DJI_0001.mp4': 'Video/Footage/DJI/DJI',
+        'SH010_COMP_v001.nk': 'Projects/Nuke/SH010',
+        'cut_v3.edl': 'Video/XML-EDL-AAF',
+        'promo.aep': 'Projects/AfterEffects',
+        # Left to the LLM: asset names, renders, documents
+        'BALA_comp_v0054.nk': None,
+        'SH010_COMP_v001.####.exr': None,
+        'notes.txt': None,
+    }
+    for name, folder in expected.items():
+        assert rules.classify_name(name) == folder, (name, rules.classify_name(name))
+    print(f"✅ {len(rules.camera_rules)} camera rules, {len(rules.extension_rules)} extension rules")
+    return True
+
+
+def test_sphere_rules_and_hit_rate():
+    """Sphere answers outside its tree, so only example-backed rules apply; hit rate is reported"""
+    print("\n🧪 Testing SPHERE rules and hit rate...")
+    rules = RuleEngine.from_template(load_template('prompt_sphere.md'))
+    names = ['A001C001_220101_R1MP4.mov', 'SH010_COMP_v001.nk', 'promo.aep', 'readme.txt']
+    local, remaining = rules.classify(names)
+    assert local == {'A001C001_220101_R1MP4.mov': '/01_plates/', 'SH010_COMP_v001.nk': '/05_comp/SH010/project/'}, local
+    assert remaining == ['promo.aep', 'readme.txt'] and rules.hit_rate == 0.5
+    names = [f'A{i % 900 + 100:03d}C{i % 999:03d}_230101_R1AB.mov' for i in range(50000)] + [f'shot_{i}.exr' for i in range(50000)]
+    start = time.perf_counter()
+    local, remaining = rules.classify(names)
+    elapsed = time.perf_counter() - start
+    assert len(local) == len(remaining) == 50000
+    print(f"✅ {len(names)} names in {elapsed:.2f}s, run hit rate {len(local) / len(names):.0%}")
+    return True
+
+
+def main():
+    tests = [test_kent_rules, test_sphere_rules_and_hit_rate]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Test script for the parallel scan engine used by the folder scanners
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scan_engine import WorkStealingScanner, ScanProgress
+
+
+def make_tree(root):
+    """Build a small project tree with plates, renders and loose files"""
+    for shot in range(6):
+        for kind in ("plates", "renders"):
+            d = os.path.join(root, f"sh{shot:03d}", kind)
+            os.makedirs(d)
+            for frame in range(1001, 1011):
+                open(os.path.join(d, f"sh{shot:03d}_{kind}.{frame}.exr"), "w").close()
+            open(os.path.join(d, "notes.txt"), "w").close()
+
+
+def test_all_directories_visited():
+    """Every directory is visited exactly once, whatever the worker count"""
+    print("🧪 Testing work-stealing scanner coverage...")
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root)
+        expected = sorted(dirpath for dirpath, _, _ in os.walk(root))
+        for workers in (1, 3, 8):
+            visited = []
+            lock = threading.Lock()
+
+            def visit(path, entries):
+                with lock:
+                    visited.append(path)
+
+            WorkStealingScanner(workers=workers).scan([root, root], visit)
+            assert sorted(visited) == expected, f"workers={workers}: {len(visited)} != {len(expected)}"
+            print(f"✅ {workers} worker(s) visited {len(visited)} directories")
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def test_sequences_collapsed():
+    """scan_folders_spanning_tree keeps the {'Path','File'} output and collapses sequences"""
+    print("\n🧪 Testing sequence collapsing in scan_folders_spanning_tree...")
+    try:
+        from ai_folder_scanner import scan_folders_spanning_tree
+    except ImportError as e:
+        print(f"⚠️ Skipped, GUI dependencies not available: {e}")
+        return True
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root)
+        results = scan_folders_spanning_tree([root], workers=4)
+        files = [r['File'] for r in results]
+        assert files.count("sh000_plates.####.exr") == 1
+        assert files.count("notes.txt") == 12
+        print(f"✅ {len(results)} entries, sequences collapsed")
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def test_progress_estimate():
+    """Single-pass progress is monotonic, capped below 100% and seeded by the cached count"""
+    print("\n🧪 Testing single-pass progress estimate...")
+    progress = ScanProgress()
+    seen = []
+    # Root has 4 children, each child has none
+    progress.dir_done(4, 10)
+    seen.append(progress.fraction())
+    for _ in range(4):
+        progress.dir_done(0, 5)
+        seen.append(progress.fraction())
+    assert seen == sorted(seen), seen
+    assert seen[-1] < 1.0
+    cached = ScanProgress(cached={'dirs': 100, 'entries': 1000})
+    cached.dir_done(1, 10)
+    assert cached.fraction() == 0.01
+    assert cached.estimated_entries() == 1000
+    print(f"✅ Fractions: {[round(f, 2) for f in seen]}")
+    return True
+
+
+def test_incremental_index():
+    """A rescan only re-lists directories whose mtime changed, and picks up deletions"""
+    print("\n🧪 Testing incremental scan index...")
+    from scan_index import ScanIndex
+    root = tempfile.mkdtemp()
+    try:
+        tree = os.path.join(root, "tree")
+        make_tree(tree)
+        # Backdate the directories so their mtimes are not considered racy
+        old = time.time() - 60
+        for dirpath, _, _ in os.walk(tree):
+            os.utime(dirpath, (old, old))
+        index = ScanIndex(os.path.join(root, "index.db"))
+        try:
+            first = index.update([tree])
+            assert first['listed'] == 19 and first['unchanged'] == 0, first
+            second = index.update([tree])
+            assert second['listed'] == 0 and second['unchanged'] == 19, second
+            open(os.path.join(tree, "sh001", "plates", "extra.txt"), "w").close()
+            shutil.rmtree(os.path.join(tree, "sh002"))
+            third = index.update([tree])
+            # The new file touches plates/, the deletion touches the root
+            assert third['listed'] == 2 and third['removed'] == 3, third
+            indexed = sum(1 for _ in index.iter_entries([tree]))
+            on_disk = sum(len(d) + len(f) for _, d, f in os.walk(tree))
+            assert indexed == on_disk, (indexed, on_disk)
+            print(f"✅ Rescans: {first}, {second}, {third}")
+        finally:
+            index.close()
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def test_sorted_ndjson_export():
+    """The external sorter spills to disk and merges back into Path order"""
+    print("\n🧪 Testing sorted NDJSON export...")
+    import random
+    from scan_export import NdjsonWriter, ExternalSorter, iter_ndjson
+    root = tempfile.mkdtemp()
+    try:
+        records = [{'Path': f"/show/sh{i:05d}", 'File': f"sh{i:05d}"} for i in range(2500)]
+        random.shuffle(records)
+        sorter = ExternalSorter(key=lambda r: r['Path'], chunk_size=300, tmp_dir=root)
+        for i in range(0, len(records), 97):
+            sorter.add_many(records[i:i + 97])
+        spilled = len(sorter._chunks)
+        assert spilled >= 5, spilled
+        output = os.path.join(root, "out.ndjson")
+        with NdjsonWriter(output) as writer:
+            for record in sorter.sorted_records():
+                writer.write(record)
+        paths = [r['Path'] for r in iter_ndjson(output)]
+        assert paths == sorted(r['Path'] for r in records), "not sorted"
+        leftovers = [n for n in os.listdir(root) if n != "out.ndjson"]
+        assert not leftovers, leftovers
+        print(f"✅ {writer.count} records merged from {spilled} spilled chunks")
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def test_append_merge():
+    """Append mode merges into the existing export without duplicates, sorted or not"""
+    print("\n🧪 Testing streaming append merge...")
+    import random
+    from scan_export import JsonArrayWriter, merge_export, iter_json_array
+    root = tempfile.mkdtemp()
+    try:
+        records = [{'Path': f"/show/sh{i:04d}", 'File': f"sh{i:04d}"} for i in range(1000)]
+        sorted_path = os.path.join(root, "sorted.json")
+        with JsonArrayWriter(sorted_path) as writer:
+            writer.write_many(records[:600])
+        total = merge_export(sorted_path, records[400:])
+        assert total == 1000 and list(iter_json_array(sorted_path, chunk_size=128)) == records, total
+        # Older appends left exports unsorted: keep them as they are and add only new records
+        shuffled = records[:600]
+        random.shuffle(shuffled)
+        unsorted_path = os.path.join(root, "unsorted.json")
+        with JsonArrayWriter(unsorted_path) as writer:
+            writer.write_many(shuffled)
+        total = merge_export(unsorted_path, records[400:])
+        merged = list(iter_json_array(unsorted_path))
+        assert total == 1000 and merged == shuffled + records[600:], total
+        print(f"✅ Merged {total} records (sorted and unsorted exports)")
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def test_watch_update_export():
+    """A watcher batch rewrites only the touched directories' records and matches a full rescan"""
+    print("\n🧪 Testing the export update for a watcher batch...")
+    try:
+        from ai_folder_scanner import scan_folders_indexed, update_export
+    except ImportError as e:
+        print(f"⚠️ Skipped, GUI dependencies not available: {e}")
+        return True
+    from scan_index import ScanIndex
+    from scan_export import JsonArrayWriter, iter_json_array, record_key
+    root = tempfile.mkdtemp()
+    try:
+        tree = os.path.join(root, "tree")
+        make_tree(tree)
+        index = ScanIndex(os.path.join(root, "index.db"))
+        try:
+            export = os.path.join(root, "export.json")
+            # A record appended from another scan, outside the watched folder, is kept
+            elsewhere = {'Path': os.path.join(root, "elsewhere", "a.txt"), 'File': "a.txt"}
+            with JsonArrayWriter(export) as writer:
+                writer.write_many(sorted(scan_folders_indexed([tree], index=index) + [elsewhere], key=record_key))
+            os.remove(os.path.join(tree, "sh000", "plates", "notes.txt"))
+            open(os.path.join(tree, "sh001", "renders", "sh001_renders.1011.exr"), "w").close()
+            shutil.rmtree(os.path.join(tree, "sh002"))
+            new_plates = os.path.join(tree, "sh006", "plates")
+            os.makedirs(new_plates)
+            for frame in range(1001, 1004):
+                open(os.path.join(new_plates, f"sh006_plates.{frame}.exr"), "w").close()
+            changes = {'deleted': [os.path.join(tree, "sh000", "plates", "notes.txt")],
+                       'created': [os.path.join(tree, "sh001", "renders", "sh001_renders.1011.exr"),
+                                   os.path.join(new_plates, "sh006_plates.1001.exr")],
+                       'deleted_dirs': [os.path.join(tree, "sh002")],
+                       'created_dirs': [os.path.join(tree, "sh006"), new_plates]}
+            checked = []
+            check_dir = index._check_dir
+            index._check_dir = lambda path, known_mtime: checked.append(path) or check_dir(path, known_mtime)
+            total = update_export(export, changes, index=index)
+            # Only the touched directories and the new and deleted folders were looked at, not the untouched shots
+            touched = [tree, os.path.join(tree, "sh000", "plates"), os.path.join(tree, "sh001", "renders"),
+                       os.path.join(tree, "sh002"), os.path.join(tree, "sh006"), new_plates]
+            assert sorted(set(checked)) == sorted(touched), sorted(set(checked))
+        finally:
+            index.close()
+        fresh = ScanIndex(os.path.join(root, "fresh.db"))
+        try:
+            expected = sorted(scan_folders_indexed([tree], index=fresh) + [elsewhere], key=record_key)
+        finally:
+            fresh.close()
+        updated = list(iter_json_array(export))
+        assert updated == expected and total == len(expected), (total, len(expected))
+        renders = [r for r in updated if r['File'] == "sh001_renders.####.exr"]
+        assert len(renders) == 1 and renders[0]['Frames'] == "1001-1011", renders
+        print(f"✅ {total} entries after the batch, same as a full rescan")
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def test_scan_store():
+    """The compact store yields the same records, in Path order, at a fraction of the memory"""
+    print("\n🧪 Testing compact scan store...")
+    from scan_store import ScanStore
+    from scan_index import KIND_FILE, KIND_DIR
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root)
+        # Siblings that sort between a directory and its contents ('.' < os.sep)
+        os.makedirs(os.path.join(root, "sh001.bak"))
+        open(os.path.join(root, "sh001.txt"), "w").close()
+        store = ScanStore()
+        store.add_root(root)
+        expected = []
+        def visit(current, entries):
+            store.add_entries(current, [(e.name, KIND_DIR if e.is_dir() else KIND_FILE) for e in entries])
+            expected.extend({'Path': e.path, 'File': e.name} for e in entries)
+        WorkStealingScanner(workers=4).scan([root], visit)
+        store.freeze()
+        assert list(store.iter_sorted_records()) == sorted(expected, key=lambda r: r['Path'])
+        assert sorted(r['Path'] for r in store.iter_records()) == sorted(r['Path'] for r in expected)
+        big = ScanStore()
+        names = [f"comp_v{i:06d}.nk" for i in range(10000)]
+        big.add_entries("/projects/show/sequences/sq010/sh0100/comp/work", [(n, KIND_FILE) for n in names])
+        per_entry = big.nbytes() / len(big)
+        assert per_entry < 40, per_entry
+        print(f"✅ {len(store)} entries in Path order, {per_entry:.0f} bytes per entry")
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    tests = [test_all_directories_visited, test_sequences_collapsed, test_progress_estimate,
+             test_incremental_index, test_sorted_ndjson_export, test_append_merge, test_watch_update_export,
+             test_scan_store]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
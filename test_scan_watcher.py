@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test script for folder watching: event coalescing and the polling fallback
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scan_watcher import ChangeCoalescer, FolderWatcher, _PollingWatcher
+
+
+class Recorder:
+    """Stands in for a ChangeCoalescer, keeping what was pushed"""
+
+    def __init__(self):
+        self.events = []
+
+    def push(self, action, path, is_dir=False):
+        self.events.append((action, os.path.basename(path), is_dir))
+
+
+def test_coalescing():
+    """Bursts flush once they settle or after max_delay; create+delete pairs are dropped; errors are logged"""
+    print("🧪 Testing ChangeCoalescer...")
+    batches = []
+    coalescer = ChangeCoalescer(batches.append, debounce=0.5, max_delay=10.0)
+    try:
+        for i in range(5):
+            coalescer.push('created', f'/r/f{i}.exr')
+            time.sleep(0.1)
+        coalescer.push('created', '/r/tmp.part')
+        coalescer.push('deleted', '/r/tmp.part')
+        coalescer.push('created', '/r/new', is_dir=True)
+        assert batches == []  # still within the debounce
+        time.sleep(0.9)
+        assert len(batches) == 1, batches
+        assert batches[0] == {'created': [f'/r/f{i}.exr' for i in range(5)], 'deleted': [],
+                              'created_dirs': ['/r/new'], 'deleted_dirs': []}, batches[0]
+    finally:
+        coalescer.stop()
+    # A steady stream is flushed every max_delay rather than held until it stops
+    batches = []
+    coalescer = ChangeCoalescer(batches.append, debounce=0.5, max_delay=0.8)
+    try:
+        start = time.monotonic()
+        while time.monotonic() - start < 2.0:
+            coalescer.push('created', f'/r/{time.monotonic()}.exr')
+            time.sleep(0.05)
+        assert 2 <= len(batches) <= 3, len(batches)
+    finally:
+        coalescer.stop()
+    assert sum(len(b['created']) for b in batches) > 30
+    # A failing callback is logged and the next batch still arrives
+    failures = []
+    handler = logging.Handler()
+    handler.emit = failures.append
+    logging.getLogger('scan_watcher').addHandler(handler)
+    calls = []
+
+    def fail_once(changes):
+        calls.append(changes)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    coalescer = ChangeCoalescer(fail_once, debounce=0.0)
+    try:
+        coalescer.push('deleted', '/r/a.exr')
+        coalescer.flush()
+        coalescer.push('deleted', '/r/b.exr')
+        coalescer.flush()
+    finally:
+        coalescer.stop()
+        logging.getLogger('scan_watcher').removeHandler(handler)
+    assert len(calls) == 2 and len(failures) == 1 and failures[0].exc_info[1].args == ("boom",), failures
+    print(f"✅ a burst of 8 events in 1 batch; a 2s stream in {len(batches)} batches; callback errors logged")
+    return True
+
+
+def test_polling_diff():
+    """The polling fallback reports what changed between two polls, and a new folder once"""
+    print("\n🧪 Testing the polling watcher...")
+    root = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(root, 'plates', 'old'))
+        open(os.path.join(root, 'plates', 'a.exr'), 'w').close()
+        open(os.path.join(root, 'notes.txt'), 'w').close()
+        recorder = Recorder()
+        poller = _PollingWatcher(recorder)
+        poller.add_root(root)
+        assert recorder.events == []  # the first listing is the baseline
+        time.sleep(0.01)
+        open(os.path.join(root, 'plates', 'b.exr'), 'w').close()
+        os.remove(os.path.join(root, 'notes.txt'))
+        os.makedirs(os.path.join(root, 'renders', 'v001'))
+        open(os.path.join(root, 'renders', 'v001', 'c.exr'), 'w').close()
+        shutil.rmtree(os.path.join(root, 'plates', 'old'))
+        poller._poll_root(root)
+        assert sorted(recorder.events) == [('created', 'b.exr', False), ('created', 'renders', True),
+                                           ('deleted', 'notes.txt', False), ('deleted', 'old', True)], recorder.events
+        # The new folder was listed with its report; nothing is reported twice
+        recorder.events = []
+        poller._poll_root(root)
+        assert recorder.events == [] and os.path.join(root, 'renders', 'v001') in poller._snapshot
+        assert os.path.join(root, 'plates', 'old') not in poller._snapshot
+        # A folder inside a watched root is covered by it, not watched a second time
+        watcher = FolderWatcher(lambda changes: None, force_polling=True)
+        try:
+            watcher.add_root(root)
+            assert watcher.add_root(os.path.join(root, 'renders')) == 'polling'
+            assert watcher.roots == {root} and watcher._poller._roots == [root]
+            assert watcher.watched_root(os.path.join(root, 'renders', 'v001')) == root
+            assert watcher.watched_root(root + '_other') is None
+        finally:
+            watcher.stop()
+        print("✅ created/deleted files and folders found by mtime")
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    tests = [test_coalescing, test_polling_diff]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
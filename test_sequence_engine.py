@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared frame-sequence detection engine
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sequence_engine import group_names, sequence_key, SequenceManifest, revalidate_manifests
+
+
+def test_grouping_and_ranges():
+    """Frames are grouped per prefix/extension with range, padding, gaps and count"""
+    print("🧪 Testing sequence grouping...")
+    names = [f"plate.{f}.exr" for f in range(1001, 1241) if f not in (1100, 1105, 1106)]
+    names += ["plate_v002.nk", "readme.txt", "0001.dpx", "0002.dpx", "report2023.pdf", "x_1.wav", "x_2.wav", "x_10.wav"]
+    singles, sequences = group_names(names)
+    by_key = {seq.key: seq for seq in sequences}
+    # Numbers shorter than a frame's padding name separate files
+    assert sorted(singles) == ["plate_v002.nk", "readme.txt", "report2023.pdf", "x_1.wav", "x_10.wav", "x_2.wav"], singles
+    assert len(sequences) == 2
+    plate = by_key["plate.####.exr"]
+    assert plate.count == 237 and plate.padding == 4 and (plate.first, plate.last) == (1001, 1240)
+    assert plate.missing == [(1100, 1100), (1105, 1106)], plate.missing
+    assert plate.label() == "plate.[1001-1099,1101-1104,1107-1240].exr (3 missing: 1100,1105-1106)", plate.label()
+    assert sorted(plate.names()) == sorted(n for n in names if n.startswith("plate.")), "names do not round-trip"
+    assert by_key["####.dpx"].frames_text() == "1-2" and list(by_key["####.dpx"].names()) == ["0001.dpx", "0002.dpx"]
+    assert sequence_key("sh010_comp_1001.exr") == "sh010_comp_####.exr" and sequence_key("notes.txt") is None
+    assert sequence_key("Interview_1.wav") is None and sequence_key("Interview_01.wav") is None
+    print(f"✅ {plate.label()}")
+    return True
+
+
+def test_mixed_padding():
+    """Frames that do not fit the sequence padding are kept verbatim"""
+    print("\n🧪 Testing mixed padding...")
+    names = ["shot.001.exr", "shot.0002.exr", "shot.0003.exr", "shot.0004.exr", "shot.010.exr", "shot.1000.exr"]
+    _, (seq,) = group_names(names)
+    assert seq.count == 6 and seq.exceptions == ["shot.001.exr", "shot.010.exr"], seq.exceptions
+    assert sorted(seq.names()) == sorted(names), list(seq.names())
+    print(f"✅ {seq.label()} + exceptions {seq.exceptions}")
+    return True
+
+
+def test_manifest_revalidation():
+    """Manifests expand in memory and one listing per folder picks up added/removed frames"""
+    print("\n🧪 Testing sequence manifests...")
+    root = tempfile.mkdtemp()
+    try:
+        names = [f"plate.{f:04d}.exr" for f in range(1001, 1011)] + [f"matte.{f:04d}.exr" for f in range(1, 4)]
+        for name in names:
+            open(os.path.join(root, name), "w").close()
+        _, sequences = group_names(os.listdir(root))
+        manifests = {seq.key: SequenceManifest(root, seq) for seq in sequences}
+        plate = manifests["plate.####.exr"]
+        assert plate.paths() == [os.path.join(root, f"plate.{f:04d}.exr") for f in range(1001, 1011)]
+        assert revalidate_manifests(manifests.values()) == 0
+        open(os.path.join(root, "plate.1011.exr"), "w").close()
+        os.remove(os.path.join(root, "plate.1005.exr"))
+        assert revalidate_manifests(manifests.values()) == 1
+        assert plate.sequence.frames_text() == "1001-1004,1006-1011", plate.sequence.frames_text()
+        assert manifests["matte.####.exr"].sequence.count == 3
+        assert SequenceManifest.for_key(root, "plate.####.exr").paths() == plate.paths()
+        print(f"✅ {plate.sequence.label()}")
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def test_throughput():
+    """Grouping keeps well ahead of 10M filenames per minute on one core"""
+    print("\n🧪 Testing grouping throughput...")
+    names = [f"sh{s:03d}_comp_v{v:03d}.{f:04d}.exr" for s in range(10) for v in range(5) for f in range(1001, 5001)]
+    start = time.perf_counter()
+    _, sequences = group_names(names)
+    elapsed = time.perf_counter() - start
+    per_minute = len(names) / elapsed * 60
+    assert len(sequences) == 50, len(sequences)
+    print(f"✅ {len(names)} names in {elapsed:.2f}s ({per_minute / 1e6:.1f}M names/minute)")
+    return per_minute >= 10e6
+
+
+def main():
+    tests = [test_grouping_and_ranges, test_mixed_padding, test_manifest_revalidation, test_throughput]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script for the project-structure cache used to build prompt context
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from structure_cache import StructureCache, estimate_tokens, render_tree
+
+
+def render_dirs(root, depth, dir_mtimes):
+    """Minimal renderer: indented directory names, recording listed directories"""
+    lines = []
+    def walk(path, level):
+        if level > depth:
+            return
+        dir_mtimes[path] = os.stat(path).st_mtime_ns
+        for name in sorted(os.listdir(path)):
+            full = os.path.join(path, name)
+            if os.path.isdir(full):
+                lines.append("    " * (level - 1) + name)
+                walk(full, level + 1)
+    walk(root, 1)
+    return "\n".join(lines)
+
+
+def test_snapshot_reused_until_changed():
+    """Repeated lookups reuse one snapshot until a listed directory changes"""
+    print("\n🧪 Testing structure cache reuse and invalidation...")
+    root = tempfile.mkdtemp()
+    try:
+        for shot in ("sh010", "sh020"):
+            os.makedirs(os.path.join(root, shot, "comp", "renders"))
+        # Backdate so the next change is guaranteed to move the mtime
+        old = time.time() - 60
+        for dirpath, _, _ in os.walk(root):
+            os.utime(dirpath, (old, old))
+        calls = []
+        def render(root_path, depth, dir_mtimes):
+            calls.append(depth)
+            return render_dirs(root_path, depth, dir_mtimes)
+        cache = StructureCache(render, recheck=0)
+        first = cache.get(root, 3)
+        for _ in range(200):
+            assert cache.get(root, 3) is first
+        assert calls == [3], calls
+        assert first.tokens == estimate_tokens(first.text) and first.tokens > 0
+        # Another depth is its own snapshot
+        cache.get(root, 1)
+        assert calls == [3, 1], calls
+        # A new folder below a listed directory invalidates the snapshot
+        os.makedirs(os.path.join(root, "sh010", "comp", "plates"))
+        second = cache.get(root, 3)
+        assert second is not first and "plates" in second.text and calls == [3, 1, 3], calls
+        print(f"✅ {cache.hits} hits, {cache.misses} renders, ~{second.tokens} tokens")
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def test_render_tree():
+    """Directory-only tree text, frame folders cut short, node budget respected"""
+    print("\n🧪 Testing directory tree renderer...")
+    root = tempfile.mkdtemp()
+    try:
+        for path in ("sh010/comp/renders", "sh010/plates", "sh020/comp", "assets"):
+            os.makedirs(os.path.join(root, path))
+        frames = os.path.join(root, "sh010", "plates")
+        for i in range(3000):
+            open(os.path.join(frames, f"plate.{i:04d}.exr"), "w").close()
+        open(os.path.join(root, "notes.txt"), "w").close()
+        expected = "\n".join([
+            "├── assets",
+            "├── sh010",
+            "│   ├── comp",
+            "│   │   └── renders",
+            "│   └── plates",
+            "└── sh020",
+            "    └── comp",
+        ])
+        dir_mtimes = {}
+        text = render_tree(root, max_depth=6, dir_mtimes=dir_mtimes, leaf_limit=100)
+        assert text == expected, text
+        assert frames in dir_mtimes and len(dir_mtimes) == 8, dir_mtimes
+        assert render_tree(root, max_depth=1) == "├── assets\n├── sh010\n└── sh020"
+        # The budget keeps whole top levels before deeper ones
+        budget = render_tree(root, max_depth=6, max_nodes=4).splitlines()
+        assert budget[-1] == "... (truncated at 4 folders)" and "│   └── comp" in budget and "renders" not in "\n".join(budget), budget
+        print(f"✅ {len(text.splitlines())} folders rendered, {len(dir_mtimes)} directories tracked")
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    tests = [test_snapshot_reused_until_changed, test_render_tree]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
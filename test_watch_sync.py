@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for applying watcher batches to the Selected Files list
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from file_index import FileIndex
+from scan_index import ScanIndex
+from sequence_engine import group_names, SequenceManifest
+from watch_sync import ChangeBatch, apply_changes
+
+
+def touch(*parts):
+    path = os.path.join(*parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "w").close()
+    return path
+
+
+class SelectedFiles:
+    """The Selected Files list of either app: bare names (FIelOrganizer) or full paths (MT)"""
+
+    def __init__(self, bare_names):
+        self.list_entry = os.path.basename if bare_names else (lambda path: path)
+        self.sequence_entry = (lambda d, key: key) if bare_names else (lambda d, key: os.path.normpath(os.path.join(d, key)))
+        self.rows = []
+        self.file_index = FileIndex()
+
+    def add_row(self, text, path=None, manifest=None):
+        self.file_index.add(path or text, manifest)
+        self.rows.append(text)
+
+    def remove_rows(self, text):
+        count = self.rows.count(text)
+        self.rows = [row for row in self.rows if row != text]
+        return count
+
+    def add_folder(self, folder):
+        for dir_path, _, names in os.walk(folder):
+            singles, sequences = group_names(names)
+            for name in singles:
+                self.add_row(self.list_entry(os.path.join(dir_path, name)), os.path.join(dir_path, name))
+            for seq in sequences:
+                self.add_row(self.sequence_entry(dir_path, seq.key), os.path.join(dir_path, seq.key),
+                             SequenceManifest(dir_path, seq))
+
+    def apply(self, batch):
+        return apply_changes(batch, set(self.rows), self.file_index, self.list_entry, self.sequence_entry,
+                             self.add_row, self.remove_rows)
+
+
+def test_batch_applied():
+    """Deleted files and emptied sequences leave the list; new files, frames and folders join it"""
+    print("🧪 Testing ChangeBatch and apply_changes...")
+    root = tempfile.mkdtemp()
+    db_path = os.path.join(tempfile.mkdtemp(), "index.db")
+    try:
+        plates, shots = os.path.join(root, "plates"), os.path.join(root, "shots")
+        touch(root, "notes.txt")
+        frames = [touch(plates, f"plate.{f}.exr") for f in range(1001, 1004)]
+        touch(shots, "shot.1001.exr")
+        index = ScanIndex(db_path)
+        index.update([root])
+        index.close()
+        lists = [SelectedFiles(bare_names=True), SelectedFiles(bare_names=False)]
+        for selected in lists:
+            selected.add_folder(root)
+            assert len(selected.rows) == 3, selected.rows
+        # What the watcher saw: deletions, a new file, two new frames next to a single one, a new render folder
+        os.remove(os.path.join(root, "notes.txt"))
+        shutil.rmtree(plates)
+        touch(root, "readme.md")
+        touch(shots, "shot.1002.exr")
+        touch(shots, "shot.1003.exr")
+        renders = os.path.join(root, "renders")
+        touch(renders, "beauty.1001.exr")
+        touch(renders, "beauty.1002.exr")
+        touch(renders, "mattes", "cam.abc")
+        # The watcher also reports files inside a new folder; the folder's own listing covers them
+        changes = {"deleted": [os.path.join(root, "notes.txt")], "deleted_dirs": [plates],
+                   "created": [os.path.join(root, "readme.md"), os.path.join(shots, "shot.1002.exr"),
+                               os.path.join(shots, "shot.1003.exr"), os.path.join(root, "gone.tmp"),
+                               os.path.join(renders, "beauty.1002.exr")],
+                   "created_dirs": [renders, os.path.join(renders, "mattes")]}
+        batch = ChangeBatch.from_changes(changes, db_path)
+        assert sorted(batch.deleted) == sorted([os.path.join(root, "notes.txt")] + frames), batch.deleted
+        assert batch.emptied == {(plates, "plate.####.exr")}
+        assert batch.created == [os.path.join(root, "readme.md")]
+        (paths, manifest), = batch.frames.values()
+        assert len(paths) == 2 and manifest.sequence.frames_text() == "1001-1003"
+        # Each new folder is listed once, already grouped into sequences
+        mattes = os.path.join(renders, "mattes")
+        assert [(d, files) for d, files, _ in batch.folders] == [(renders, []), (mattes, [os.path.join(mattes, "cam.abc")])]
+        (beauty_key, beauty), = batch.folders[0][2]
+        assert beauty_key == "beauty.####.exr" and beauty.sequence.frames_text() == "1001-1002"
+        for selected in lists:
+            added, removed = selected.apply(batch)
+            sequence_row = selected.sequence_entry(shots, "shot.####.exr")
+            beauty_row = selected.sequence_entry(renders, beauty_key)
+            assert sorted(selected.rows) == sorted([selected.list_entry(os.path.join(root, "readme.md")), sequence_row, beauty_row,
+                                                    selected.list_entry(os.path.join(mattes, "cam.abc"))]), selected.rows
+            # notes.txt, the plate sequence and the single shot frame the new sequence replaced
+            assert (added, removed) == (4, 3), (added, removed)
+            assert selected.file_index.manifest(sequence_row) is manifest
+            assert selected.file_index.manifest(beauty_row) is beauty
+        # The index was refreshed on the way: the deleted folder is gone, the new one is there
+        index = ScanIndex(db_path)
+        try:
+            assert list(index.iter_entries([plates])) == []
+            assert [row[1] for row in index.iter_entries([renders])] == ["beauty.1001.exr", "beauty.1002.exr", "mattes", "cam.abc"]
+        finally:
+            index.close()
+        print("✅ both list styles updated in memory from a batch prepared off the GUI thread")
+        return True
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        shutil.rmtree(os.path.dirname(db_path), ignore_errors=True)
+
+
+def main():
+    tests = [test_batch_applied]
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            results.append(False)
+    print(f"\n📊 Passed: {sum(results)}/{len(results)}")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
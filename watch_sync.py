@@ -0,0 +1,136 @@
+# watch_sync.py
+import os
+from collections import defaultdict
+from itertools import groupby
+
+from scan_index import ScanIndex, KIND_FILE
+from sequence_engine import sequence_key, group_names, SequenceManifest
+
+
+class ChangeBatch:
+    """One coalesced FolderWatcher batch with its disk work done, ready for the Selected Files list.
+
+    from_changes() runs on the watcher thread: it lists the touched
+    directories and new folders, builds sequence manifests and refreshes the
+    scan index, so apply_changes() on the GUI thread only updates the list
+    in memory.
+    """
+
+    __slots__ = ('deleted', 'emptied', 'created', 'frames', 'folders')
+
+    def __init__(self):
+        self.deleted = []  # file paths gone, including the files of deleted folders
+        self.emptied = set()  # (dir_path, sequence key) with no frame left on disk
+        self.created = []  # new files that are not frames
+        self.frames = {}  # (dir_path, sequence key) -> (new frame paths, SequenceManifest)
+        self.folders = []  # (dir_path, file paths, [(sequence key, SequenceManifest)]) under new folders
+
+    @classmethod
+    def from_changes(cls, changes, db_path=None):
+        """Batch for a FolderWatcher changes dict; db_path is the ScanIndex database"""
+        batch = cls()
+        scan_index = ScanIndex(db_path)
+        try:
+            # Files under deleted folders are still known to the index
+            batch.deleted = list(changes['deleted'])
+            for d in changes['deleted_dirs']:
+                batch.deleted.extend(os.path.join(dir_path, fname) for dir_path, fname, kind, _, _ in scan_index.iter_entries([d])
+                                     if kind == KIND_FILE)
+            remaining_keys = {}
+            for path in batch.deleted:
+                dir_path, fname = os.path.split(path)
+                key = sequence_key(fname)
+                if key is None:
+                    continue
+                if dir_path not in remaining_keys:
+                    try:
+                        with os.scandir(dir_path) as it:
+                            remaining_keys[dir_path] = {sequence_key(e.name) for e in it}
+                    except OSError:
+                        remaining_keys[dir_path] = set()
+                if key not in remaining_keys[dir_path]:
+                    batch.emptied.add((dir_path, key))
+            # Only the outermost new folders are listed; what is inside them comes with that listing
+            created_dirs = []
+            for d in sorted(d for d in changes['created_dirs'] if os.path.isdir(d)):
+                if not created_dirs or not d.startswith(os.path.join(created_dirs[-1], '')):
+                    created_dirs.append(d)
+            inside_new = tuple(os.path.join(d, '') for d in created_dirs)
+            frames = defaultdict(list)
+            for path in changes['created']:
+                if not os.path.isfile(path) or path.startswith(inside_new):
+                    continue
+                dir_path, fname = os.path.split(path)
+                key = sequence_key(fname)
+                if key is None:
+                    batch.created.append(path)
+                else:
+                    frames[(dir_path, key)].append(path)
+            batch.frames = {(dir_path, key): (paths, SequenceManifest.for_key(dir_path, key))
+                            for (dir_path, key), paths in frames.items()}
+            # Refresh the persisted index for the touched directories and the new folders only
+            scan_index.update_changes(changes)
+            # New folders are grouped the way Add Folder groups them, from the index just refreshed
+            for dir_path, rows in groupby(scan_index.iter_entries(created_dirs), key=lambda row: row[0]):
+                singles, sequences = group_names([row[1] for row in rows if row[2] == KIND_FILE])
+                batch.folders.append((dir_path, [os.path.join(dir_path, fname) for fname in singles],
+                                      [(seq.key, SequenceManifest(dir_path, seq)) for seq in sequences]))
+        finally:
+            scan_index.close()
+        return batch
+
+
+def apply_changes(batch, existing, file_index, list_entry, sequence_entry, add_row, remove_rows):
+    """Apply a ChangeBatch to a Selected Files list in memory; returns (rows added, rows removed).
+
+    existing is the set of row texts and is kept up to date. list_entry(path)
+    and sequence_entry(dir_path, key) give the row text of a file or a
+    sequence; add_row(text, path, manifest) adds a row and remove_rows(text)
+    removes the rows showing text, returning how many.
+    """
+    added = removed = 0
+
+    def remove(entry, path):
+        nonlocal removed
+        file_index.discard(path)
+        # A bare-name row stays while a file of that name is left in another folder
+        if entry not in existing or file_index.paths(entry):
+            return
+        existing.discard(entry)
+        removed += remove_rows(entry)
+
+    def add(entry, path, manifest=None):
+        nonlocal added
+        if entry not in existing:
+            existing.add(entry)
+            add_row(entry, path, manifest)
+            added += 1
+        else:
+            file_index.add(path, manifest)
+
+    for path in batch.deleted:
+        remove(list_entry(path), path)
+    # Drop a sequence row once no frame of it is left in the directory
+    for dir_path, key in batch.emptied:
+        remove(sequence_entry(dir_path, key), os.path.join(dir_path, key))
+    for path in batch.created:
+        add(list_entry(path), path)
+    # New frames are grouped so a whole render becomes one sequence update
+    for (dir_path, key), (paths, manifest) in batch.frames.items():
+        rep = sequence_entry(dir_path, key)
+        if rep in existing:
+            continue
+        singles = [e for e in existing
+                   if sequence_key(os.path.basename(e)) == key and e == list_entry(os.path.join(dir_path, os.path.basename(e)))]
+        if len(paths) > 1 or singles:
+            for entry in singles:
+                remove(entry, os.path.join(dir_path, os.path.basename(entry)))
+            add(rep, os.path.join(dir_path, key), manifest)
+        else:
+            add(list_entry(paths[0]), paths[0])
+    for dir_path, paths, sequences in batch.folders:
+        for path in paths:
+            add(list_entry(path), path)
+        for key, manifest in sequences:
+            add(sequence_entry(dir_path, key), os.path.join(dir_path, key), manifest)
+    return added, removed